@@ -0,0 +1,304 @@
+"""
+Local stand-in for the Gemini REST API, used by the offline benchmarks.
+
+Serves the endpoints the consultant uses (`generateContent`,
+`streamGenerateContent`, `countTokens`, `cachedContents`, `models`) with a
+configurable response latency, streaming token rate and error injection, so
+the real SDK and `PromptConsultant` code paths can be measured without
+network access or quota. The OpenAI-compatible endpoints used by the local
+backend (`/v1/chat/completions`, `/v1/models`) are served too.
+
+In-process:
+    with FakeGemini(latency=0.05) as server:
+        consultant = PromptConsultant("fake-key", client=server.client("fake-key"))
+
+Standalone, to drive the CLI end to end:
+    python benchmarks/fake_gemini.py --port 8765 --latency 0.2 --tokens-per-second 200
+    GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:8765 python main.py start
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set
+
+MODELS = [
+    {
+        "name": f"models/{name}",
+        "displayName": name,
+        "inputTokenLimit": 1048576,
+        "outputTokenLimit": 65536,
+        "supportedGenerationMethods": ["generateContent", "countTokens", "createCachedContent"],
+        "thinking": True,
+    }
+    for name in ("gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.5-flash-lite")
+]
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Request handler; the server settings are read from `self.server.fake`.
+    """
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment: avoids delayed-ACK stalls that would
+    # dwarf the client overhead being measured
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("content-length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        fake: FakeGemini = self.server.fake
+        fake._count("get")
+        if self.path.startswith("/v1/models"):
+            return self._send_json({"object": "list", "data": [{"id": "bench-local", "object": "model"}]})
+        if "/cachedContents" in self.path:
+            return self._send_json({"cachedContents": []})
+        path = self.path.split("?")[0]
+        for model in MODELS:
+            if path.endswith(model["name"]):
+                return self._send_json(model)
+        self._send_json({"models": MODELS})
+
+    def do_PATCH(self):
+        fake: FakeGemini = self.server.fake
+        self._read_body()
+        fake._count("update_cached_content")
+        name = self.path.split("?")[0].split("/v1beta/")[-1]
+        if name in fake.deleted_caches:
+            return self._send_json(self._cache_not_found(name), 404)
+        self._send_json({"name": name, "expireTime": "2099-01-01T00:00:00Z"})
+
+    @staticmethod
+    def _cache_not_found(name: str) -> Dict[str, Any]:
+        return {"error": {"code": 404, "message": f"CachedContent not found (or permission denied): {name}", "status": "NOT_FOUND"}}
+
+    def do_POST(self):
+        fake: FakeGemini = self.server.fake
+        body = self._read_body()
+        if ":countTokens" in self.path:
+            fake._count("count_tokens")
+            text = json.dumps(body.get("contents", []))
+            return self._send_json({"totalTokens": len(text) // 4})
+        if "/cachedContents" in self.path:
+            fake._count("cached_contents")
+            return self._send_json({"name": f"cachedContents/bench-{fake.counters['cached_contents']}", "model": body.get("model"), "expireTime": "2099-01-01T00:00:00Z"})
+
+        fake._count("generate")
+        if body.get("cachedContent") in fake.deleted_caches:
+            return self._send_json(self._cache_not_found(body["cachedContent"]), 404)
+        if fake.latency:
+            time.sleep(fake.latency)
+        if fake._should_fail():
+            fake._count("errors")
+            return self._send_json({
+                "error": {
+                    "code": fake.error_code,
+                    "message": "Injected error",
+                    "status": "UNAVAILABLE" if fake.error_code >= 500 else "RESOURCE_EXHAUSTED",
+                    "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{fake.retry_delay}s"}],
+                }
+            }, fake.error_code)
+
+        scripted = fake._next_reply()
+        words = scripted.split(" ") if scripted is not None else [f"word{i}" for i in range(fake.reply_tokens)]
+        if self.path.endswith("/chat/completions"):
+            return self._openai_reply(fake, body, words)
+        # Replies longer than the output cap are cut, like the real API does
+        finish = "STOP"
+        limit = (body.get("generationConfig") or {}).get("maxOutputTokens")
+        if limit and len(words) > limit:
+            words, finish = words[:limit], "MAX_TOKENS"
+        prompt_tokens = len(json.dumps(body.get("contents", []))) // 4
+        usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(words), "totalTokenCount": prompt_tokens + len(words)}
+        if "streamGenerateContent" not in self.path:
+            if fake.tokens_per_second:
+                time.sleep(len(words) / fake.tokens_per_second)
+            return self._send_json({
+                "candidates": [{"content": {"role": "model", "parts": [{"text": " ".join(words)}]}, "finishReason": finish}],
+                "usageMetadata": usage,
+            })
+
+        chunks = []
+        step = fake.tokens_per_chunk
+        for i in range(0, len(words), step):
+            chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": " ".join(words[i:i + step]) + " "}]}}]}
+            if i + step >= len(words):
+                chunk["candidates"][0]["finishReason"] = finish
+                chunk["usageMetadata"] = usage
+            chunks.append(chunk)
+        self._send_events(fake, chunks)
+
+    def _openai_reply(self, fake: "FakeGemini", body: Dict[str, Any], words: list):
+        """
+        Answers a chat completions request, plain or streamed.
+        """
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+        if not body.get("stream"):
+            if fake.tokens_per_second:
+                time.sleep(len(words) / fake.tokens_per_second)
+            return self._send_json({
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        step = fake.tokens_per_chunk
+        chunks = [
+            {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": " ".join(words[i:i + step]) + " "}, "finish_reason": None}]}
+            for i in range(0, len(words), step)
+        ]
+        chunks.append({"object": "chat.completion.chunk", "choices": [], "usage": usage})
+        self._send_events(fake, chunks, done=True)
+
+    def _send_events(self, fake: "FakeGemini", events: list, done: bool = False):
+        """
+        Streams server-sent events with chunked encoding, paced by the token rate.
+        """
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        payloads = [json.dumps(event) for event in events] + (["[DONE]"] if done else [])
+        for payload in payloads:
+            if fake.tokens_per_second:
+                time.sleep(fake.tokens_per_chunk / fake.tokens_per_second)
+            data = b"data: " + payload.encode() + b"\r\n\r\n"
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many concurrent sessions connect at once; the default backlog of 5 would drop connections
+    request_queue_size = 256
+
+class FakeGemini:
+    """
+    A local HTTP server imitating the Gemini API.
+    """
+    def __init__(self, latency: float = 0.0, tokens_per_second: Optional[float] = None, reply_tokens: int = 60, tokens_per_chunk: int = 6, error_rate: float = 0.0, error_code: int = 503, retry_delay: float = 0.01, port: int = 0, seed: int = 0):
+        """
+        Initializes the server settings. The server starts with `start()` or `with`.
+
+        Args:
+            latency: Seconds waited before answering each generation request.
+            tokens_per_second: Generation speed; None sends the whole reply at once.
+            reply_tokens: Number of words in each reply.
+            tokens_per_chunk: Number of words per streamed chunk.
+            error_rate: Fraction of generation requests answered with `error_code`.
+            error_code: HTTP status of the injected errors (e.g. 503 or 429).
+            retry_delay: Retry delay in seconds suggested with the injected errors.
+            port: Port to listen on; 0 picks a free one.
+            seed: Seed of the error injection, for reproducible runs.
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.tokens_per_chunk = max(1, tokens_per_chunk)
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.retry_delay = retry_delay
+        self.port = port
+        self.counters: Dict[str, int] = {}
+        # Cached contents answered as missing, e.g. to imitate an expired cache
+        self.deleted_caches: Set[str] = set()
+        # Texts of the next replies, used in order before the generated ones
+        self.replies: List[str] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[_Server] = None
+
+    @property
+    def url(self) -> str:
+        """The base URL of the running server."""
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def _next_reply(self) -> Optional[str]:
+        with self._lock:
+            return self.replies.pop(0) if self.replies else None
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def start(self) -> "FakeGemini":
+        """
+        Starts serving on a background thread.
+
+        Returns:
+            This server.
+        """
+        self._server = _Server(("127.0.0.1", self.port), _Handler)
+        self._server.fake = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def client(self, api_key: str = "fake-key"):
+        """
+        Creates a Gemini client pointed at this server.
+
+        Args:
+            api_key: Any non-empty key.
+
+        Returns:
+            A `genai.Client` sending its requests to the local server.
+        """
+        from google import genai
+        from google.genai import types
+
+        return genai.Client(api_key=api_key, http_options=types.HttpOptions(base_url=self.url))
+
+    def __enter__(self) -> "FakeGemini":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each generation response.")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Streaming generation speed.")
+    parser.add_argument("--reply-tokens", type=int, default=60, help="Words per reply.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of generation requests that fail.")
+    parser.add_argument("--error-code", type=int, default=503, help="HTTP status of the injected errors.")
+    args = parser.parse_args()
+
+    server = FakeGemini(latency=args.latency, tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens, error_rate=args.error_rate, error_code=args.error_code, port=args.port).start()
+    print(f"Fake Gemini API listening on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup benchmark for the CLI.
+
+Measures, in fresh interpreters:
+  - the cumulative import time of `main` reported by `python -X importtime`;
+  - the wall time of `python main.py --help`.
+
+It also checks that importing `main` does not load any of the modules that must
+stay lazy (the Gemini SDK and the heavy `rich` renderers). The results are
+printed as JSON; the script exits with status 1 if a threshold is exceeded or a
+lazy module is imported eagerly, so it can gate CI.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--max-import-ms 200] [--max-help-ms 800]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("google.genai", "rich.markdown", "rich.live", "rich.table", "src.agent")
+
+def import_time(runs: int) -> dict:
+    """
+    Measures the import time of `main` and collects the modules it loads.
+
+    Args:
+        runs: Number of fresh interpreters to measure.
+
+    Returns:
+        A dictionary with the median import time in milliseconds and the lazy
+        modules found among the imported ones.
+    """
+    samples = []
+    eager = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            name = name.strip()
+            if name == "main":
+                samples.append(int(cumulative) / 1000)
+            if name in LAZY_MODULES:
+                eager.add(name)
+    return {"import_ms": statistics.median(samples), "eager_modules": sorted(eager)}
+
+def help_time(runs: int) -> float:
+    """
+    Measures the wall time of `python main.py --help`.
+
+    Args:
+        runs: Number of runs.
+
+    Returns:
+        The median wall time in milliseconds.
+    """
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", "--help"], cwd=ROOT, capture_output=True, check=True)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs per measurement.")
+    parser.add_argument("--max-import-ms", type=float, default=200.0, help="Maximum median import time of main.")
+    parser.add_argument("--max-help-ms", type=float, default=800.0, help="Maximum median wall time of main.py --help.")
+    args = parser.parse_args()
+
+    results = import_time(args.runs)
+    results["help_ms"] = help_time(args.runs)
+    failures = []
+    if results["import_ms"] > args.max_import_ms:
+        failures.append(f"import time {results['import_ms']:.0f}ms > {args.max_import_ms:.0f}ms")
+    if results["help_ms"] > args.max_help_ms:
+        failures.append(f"--help time {results['help_ms']:.0f}ms > {args.max_help_ms:.0f}ms")
+    if results["eager_modules"]:
+        failures.append(f"modules imported eagerly: {', '.join(results['eager_modules'])}")
+    results["failures"] = failures
+
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Offline benchmark suite for the consultant's client-side overhead.
+
+Every scenario runs the real code paths (`main.py`, `PromptConsultant`,
+`AsyncPromptConsultant`, `ConfigManager`, `TranslationManager`) with the Gemini
+API replaced by the local stand-in in `benchmarks/fake_gemini.py`, so no
+network access or API key is needed:
+
+  startup      import time of `main` and wall time of `main.py --help`
+  turns        per-turn latency of chat and streamed chat with a zero-latency
+               server (i.e. pure client overhead), and with injected errors
+  config       ConfigManager reads, writes and transactions on a temporary file
+  translation  TranslationManager.get throughput and construction cost
+  concurrency  throughput of concurrent async sessions against a server with latency
+
+Results are printed (or written with --output) as JSON. With --baseline, each
+metric is compared with the stored value and the script exits with status 1
+if one is worse by more than --tolerance. Metrics ending in `_per_s` are
+better when higher, all others when lower.
+
+Usage:
+    python benchmarks/suite.py [--only turns,config] [--quick]
+        [--baseline benchmarks/baseline.json] [--save-baseline] [--tolerance 0.5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_gemini import FakeGemini  # noqa: E402
+from benchmarks.startup import help_time, import_time  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+MODEL = "gemini-2.5-flash"
+
+def _percentiles(samples: List[float], prefix: str) -> Dict[str, float]:
+    """
+    Summarizes latency samples in seconds as p50/p95 in milliseconds.
+    """
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {f"{prefix}_p50_ms": statistics.median(ordered) * 1000, f"{prefix}_p95_ms": p95 * 1000}
+
+def _ops_per_second(func: Callable[[], object], number: int) -> float:
+    """
+    Runs a callable `number` times and returns the calls per second.
+    """
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return number / (time.perf_counter() - started)
+
+def _consultant(server: FakeGemini, **kwargs):
+    """
+    Builds a PromptConsultant talking to the fake server.
+    """
+    from src.agent import PromptConsultant
+    from src.resilience import RequestPolicy
+    from src.translation import TranslationManager
+
+    policy = RequestPolicy(timeout=30, backoff_base=0.001, backoff_max=0.01)
+    return PromptConsultant("fake-key", model_name=MODEL, translation_manager=TranslationManager("en"), client=server.client(), request_policy=policy, **kwargs)
+
+def bench_startup(quick: bool) -> Dict[str, float]:
+    """
+    Startup time of the CLI, measured in fresh interpreters.
+    """
+    runs = 3 if quick else 7
+    return {"import_ms": import_time(runs)["import_ms"], "help_ms": help_time(runs)}
+
+def bench_turns(quick: bool) -> Dict[str, float]:
+    """
+    Per-turn latency of the sync consultant against a zero-latency server.
+
+    A new session is started every 5 turns so the history size stays realistic.
+    """
+    turns = 30 if quick else 150
+    results: Dict[str, float] = {}
+    scenarios = [("chat", False, 0.0), ("stream", True, 0.0), ("retry_chat", False, 0.2)]
+    for name, streaming, error_rate in scenarios:
+        with FakeGemini(error_rate=error_rate, retry_delay=0.001) as server:
+            consultant = _consultant(server)
+            consultant.warm_up()
+            consultant.start_consultation("warm-up")
+            samples = []
+            for i in range(turns):
+                if i % 5 == 0:
+                    consultant.start_new_session()
+                started = time.perf_counter()
+                if streaming:
+                    for _ in consultant.chat_stream(f"answer {i}"):
+                        pass
+                else:
+                    consultant.chat(f"answer {i}")
+                samples.append(time.perf_counter() - started)
+        results.update(_percentiles(samples, f"turn_{name}"))
+    return results
+
+def bench_config(quick: bool) -> Dict[str, float]:
+    """
+    ConfigManager write, read and transaction cost on a temporary file.
+    """
+    from src.config import ConfigManager
+
+    writes = 50 if quick else 300
+    with tempfile.TemporaryDirectory() as directory:
+        config = ConfigManager(path=os.path.join(directory, "config.json"))
+        started = time.perf_counter()
+        for i in range(writes):
+            config.set_model(f"model-{i}")
+        write_ms = (time.perf_counter() - started) * 1000 / writes
+
+        def transaction():
+            with config.transaction():
+                config.set_language("en")
+                config.set_api_key("fake-key")
+                config.set_model(MODEL)
+
+        started = time.perf_counter()
+        for _ in range(writes):
+            transaction()
+        transaction_ms = (time.perf_counter() - started) * 1000 / writes
+
+        reads_per_s = _ops_per_second(config.get_model, 20000 if quick else 200000)
+        load_ms = 1000 / _ops_per_second(lambda: ConfigManager(path=config.config_path), writes)
+    return {"config_write_ms": write_ms, "config_transaction_ms": transaction_ms, "config_load_ms": load_ms, "config_reads_per_s": reads_per_s}
+
+def bench_translation(quick: bool) -> Dict[str, float]:
+    """
+    TranslationManager.get throughput and construction cost.
+    """
+    from src.translation import TranslationManager
+
+    number = 50000 if quick else 500000
+    t = TranslationManager("en")
+    return {
+        "translation_get_per_s": _ops_per_second(lambda: t.get("thinking"), number),
+        "translation_format_per_s": _ops_per_second(lambda: t.get("model_saved", model=MODEL), number),
+        "translation_init_per_s": _ops_per_second(lambda: TranslationManager("it"), number // 50),
+    }
+
+def bench_concurrency(quick: bool) -> Dict[str, float]:
+    """
+    Turn throughput of concurrent async sessions against a server answering in 50ms.
+
+    Each session runs the initial consultation and two follow-up turns.
+    """
+    from src.async_agent import AsyncPromptConsultant
+    from src.translation import TranslationManager
+
+    sizes = [1, 16] if quick else [1, 16, 64]
+    results: Dict[str, float] = {}
+    with FakeGemini(latency=0.05) as server:
+        client = server.client()
+        t = TranslationManager("en")
+
+        async def session(idea: str):
+            consultant = AsyncPromptConsultant("fake-key", model_name=MODEL, translation_manager=t, client=client, timeout=60)
+            await consultant.start_consultation(idea)
+            await consultant.chat("first answer")
+            await consultant.chat("second answer")
+
+        async def run(size: int) -> float:
+            started = time.perf_counter()
+            await asyncio.gather(*(session(f"idea {i}") for i in range(size)))
+            return 3 * size / (time.perf_counter() - started)
+
+        async def main():
+            await session("warm-up")
+            for size in sizes:
+                results[f"sessions_{size}_turns_per_s"] = await run(size)
+
+        asyncio.run(main())
+    return results
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "turns": bench_turns,
+    "config": bench_config,
+    "translation": bench_translation,
+    "concurrency": bench_concurrency,
+}
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """
+    Lists the metrics that regressed compared with the baseline.
+
+    Args:
+        results: The metrics of this run.
+        baseline: The stored metrics.
+        tolerance: Allowed relative degradation, e.g. 0.5 for 50%.
+
+    Returns:
+        A description of each regression.
+    """
+    regressions = []
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if name.endswith("_per_s"):
+            change = (reference - value) / reference
+        else:
+            change = (value - reference) / reference
+        if change > tolerance:
+            regressions.append(f"{name}: {value:.2f} vs baseline {reference:.2f} ({change:+.0%} worse)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="Comma-separated benchmarks to run.")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations, for a fast smoke run.")
+    parser.add_argument("--output", help="Write the results to this JSON file instead of stdout.")
+    parser.add_argument("--baseline", help="Compare with this baseline JSON file.")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Store the results as the baseline ({os.path.relpath(DEFAULT_BASELINE, ROOT)} unless --baseline is given).")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative degradation before a metric counts as a regression.")
+    args = parser.parse_args()
+
+    metrics: Dict[str, float] = {}
+    for name in args.only.split(","):
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark: {name}")
+        print(f"Running {name}...", file=sys.stderr)
+        metrics.update(BENCHMARKS[name](args.quick))
+
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "quick": args.quick, "timestamp": time.time()},
+        "metrics": {name: round(value, 3) for name, value in metrics.items()},
+        "regressions": [],
+    }
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump({"meta": report["meta"], "metrics": report["metrics"]}, f, indent=2)
+            f.write("\n")
+    elif args.baseline:
+        with open(baseline_path, "r") as f:
+            report["regressions"] = compare(metrics, json.load(f)["metrics"], args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    sys.exit(1 if report["regressions"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,43 @@
 """
 This script lists available generative AI models using the Google Gemini API.
 
-It retrieves the API key from the ConfigManager and connects to the Gemini client
-to fetch and display the names and display names of the available models.
+It retrieves the API key from the ConfigManager and prints the models from the
+local model registry (`models_cache.json`), fetching the list from the Gemini
+API only when the cache is missing or expired, or when `--refresh` is given.
 """
-import os
-from google import genai
-from src.config import ConfigManager
+import sys
 
-# load_dotenv() # Removed
-config = ConfigManager()
-api_key = config.get_api_key()
+from src.config import ConfigManager
+from src.model_registry import ModelRegistry
 
-if not api_key:
-    print("No API Key found in config.json. Run main.py first to setup.")
-else:
+def main():
     """
     Main execution block to fetch and display available generative AI models.
 
     It initializes the ConfigManager, retrieves the API key, and if available,
-    connects to the Gemini client to list models.
-    Handles cases where the API key is missing or an error occurs during fetching.
+    prints the name, display name, token limits and capabilities of each model.
+    Handles cases where the API key is missing or the model list cannot be fetched.
     """
-    client = genai.Client(api_key=api_key)
-    try:
+    config = ConfigManager()
+    api_key = config.get_api_key()
+
+    if not api_key:
+        print("No API Key found in config.json. Run main.py first to setup.")
+        return
+
+    registry = ModelRegistry.from_settings(config.get_model_registry())
+    if "--refresh" in sys.argv[1:] or registry.is_stale():
         print("Fetching models...")
-        for m in client.models.list():
-            # Debugging: print first model dir
-            # print(dir(m))
-            # Just print name for now to see if it works
-            print(f"- {m.name} ({m.display_name})")
-    except Exception as e:
-        print(f"Error: {e}")
+        if not registry.refresh(api_key):
+            print("Error: could not fetch the model list.")
+            if registry.fetched_at is None:
+                return
+            print("Showing the cached list.")
+
+    for m in registry.models():
+        limits = f"{m.input_token_limit or '?'} in / {m.output_token_limit or '?'} out"
+        flags = [flag for flag, enabled in (("caching", m.supports_caching), ("thinking", m.thinking)) if enabled]
+        print(f"- {m.name} ({m.display_name}) [{limits}]" + (f" {', '.join(flags)}" if flags else ""))
+
+if __name__ == "__main__":
+    main()
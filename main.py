@@ -4,16 +4,31 @@ This script provides a command-line interface (CLI) for an AI Prompt Consultant.
 It allows users to interact with a Gemini-powered AI model to refine their prompts,
 manage API keys, select models, set language preferences, and reset configurations.
 The CLI is built using `typer` and `rich` for a rich interactive experience.
+
+Only the modules needed to parse the command line and run the setup prompts are
+imported at startup. The Gemini SDK and the heavier `rich` renderers are imported
+inside the commands, when a consultation actually starts, so `--help` or an
+immediate `/exit` don't pay for them (see `benchmarks/startup.py`).
 """
 import typer
 from rich.console import Console
 from rich.prompt import Prompt
 import os
 import sys
-from src.agent import PromptConsultant
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
 from src.config import ConfigManager
 from src.translation import TranslationManager
 
+if TYPE_CHECKING:
+    from src.agent import PromptConsultant
+    from src.compare import ComparisonResult
+    from src.library import LibraryEntry, PromptLibrary
+    from src.metrics import MetricsRecorder
+    from src.model_registry import ModelRegistry
+    from src.response_cache import ResponseCache
+    from src.scheduler import QuotaScheduler
+    from src.semantic_cache import SemanticCache
+
 app = typer.Typer(
     name="prompt-consultant",
     help="AI Consultant to help you craft the best prompts.",
@@ -21,10 +36,530 @@ app = typer.Typer(
 )
 console = Console()
 
+def consultant_options(config_manager: ConfigManager, cache: Optional[bool], metrics: Optional["MetricsRecorder"] = None, registry: Optional["ModelRegistry"] = None, api_key: Optional[str] = None, debug: bool = False, batch: bool = False) -> Dict[str, Any]:
+    """
+    Builds the optional PromptConsultant arguments from the configuration.
+
+    Args:
+        config_manager: The ConfigManager holding the saved settings.
+        cache: The value of `--cache/--no-cache`, or None to follow the configuration.
+            It applies to the semantic cache too.
+        metrics: An optional MetricsRecorder receiving the measurements of every turn.
+        registry: An optional ModelRegistry providing the cached model metadata.
+        api_key: The API key used for API embeddings by the semantic cache.
+        debug: If True, the semantic cache prints the similarity of its lookups
+            and the quota scheduler its waits.
+        batch: If True, the calls yield to interactive sessions sharing the quota.
+
+    Returns:
+        Keyword arguments shared by `PromptConsultant` and `AsyncPromptConsultant`.
+    """
+    from src.generation import GenerationPolicy
+    from src.history import HistoryManager
+    from src.resilience import RequestPolicy
+
+    return {
+        "response_cache": open_response_cache(config_manager, cache),
+        "context_cache": config_manager.get_context_cache(),
+        "history_manager": HistoryManager.from_settings(config_manager.get_history_settings()),
+        "metrics": metrics,
+        "request_policy": RequestPolicy.from_settings(config_manager.get_request_policy(), open_quota_scheduler(config_manager, batch, debug)),
+        "model_registry": registry,
+        "backends": config_manager.get_backends(),
+        "semantic_cache": open_semantic_cache(config_manager, cache, api_key, debug),
+        "generation_policy": GenerationPolicy.from_settings(config_manager.get_generation_settings()),
+    }
+
+def open_quota_scheduler(config_manager: ConfigManager, batch: bool = False, debug: bool = False) -> Optional["QuotaScheduler"]:
+    """
+    Opens the quota scheduler if limits are set in the configuration.
+
+    Args:
+        config_manager: The ConfigManager holding the `quota` settings.
+        batch: If True, this process' calls yield to interactive ones.
+        debug: If True, prints every wait for quota.
+
+    Returns:
+        The QuotaScheduler, or None if no limit is set.
+    """
+    settings = config_manager.get_quota()
+    if not settings.get("limits"):
+        return None
+    from src.scheduler import BATCH, INTERACTIVE, QuotaScheduler
+
+    return QuotaScheduler.from_settings(settings, priority=BATCH if batch else INTERACTIVE, debug=debug)
+
+def open_model_registry(config_manager: ConfigManager, api_key: str, debug: bool = False) -> "ModelRegistry":
+    """
+    Loads the cached model list and refreshes it in the background if it has expired.
+
+    Args:
+        config_manager: The ConfigManager holding the `model_registry` settings.
+        api_key: The API key whose models are listed.
+        debug: If True, prints debug information about refreshes.
+
+    Returns:
+        The ModelRegistry, answering from the cache while a refresh runs.
+    """
+    from src.model_registry import ModelRegistry
+
+    registry = ModelRegistry.from_settings(config_manager.get_model_registry(), debug=debug)
+    registry.refresh_in_background(api_key)
+    return registry
+
+def check_model(registry: "ModelRegistry", model: str, t: TranslationManager):
+    """
+    Warns if a model name is not in the cached model list.
+
+    Only the local cache is consulted, so this never waits on the network; the
+    model is used anyway, since the cache may be out of date.
+
+    Args:
+        registry: The ModelRegistry to check against.
+        model: The model name to check.
+        t: The TranslationManager used for the warning.
+    """
+    if registry.validate(model) is False:
+        console.print(t.get("model_unknown", model=model))
+
+def choose_model(registry: "ModelRegistry", t: TranslationManager, manual_label: str, choice_label: str, default: Optional[str] = None) -> str:
+    """
+    Shows the model menu and asks the user to pick a model or enter one manually.
+
+    Args:
+        registry: The ModelRegistry providing the menu and the model metadata.
+        t: The TranslationManager used for the labels.
+        manual_label: Translation key of the manual entry option.
+        choice_label: Translation key of the choice prompt.
+        default: The default choice, if any.
+
+    Returns:
+        The selected model name.
+    """
+    models = registry.menu()
+    for idx, m in enumerate(models, 1):
+        info = registry.get(m)
+        if info and info.input_token_limit:
+            console.print(f"{idx}. {m} [dim]({info.input_token_limit:,} / {info.output_token_limit or 0:,} tokens)[/dim]")
+        else:
+            console.print(f"{idx}. {m}")
+    console.print(f"{len(models)+1}. {t.get(manual_label)}")
+
+    choice = Prompt.ask(t.get(choice_label), choices=[str(i) for i in range(1, len(models)+2)], default=default)
+    if int(choice) <= len(models):
+        return models[int(choice)-1]
+    model = Prompt.ask(t.get("enter_model_name"))
+    check_model(registry, model, t)
+    return model
+
+def finish_metrics(metrics: Optional["MetricsRecorder"], profile: bool, metrics_jsonl: Optional[str], metrics_prom: Optional[str], t: TranslationManager):
+    """
+    Prints the session profile and exports the collected metrics, as requested.
+
+    Args:
+        metrics: The MetricsRecorder of the session, or None if nothing was recorded.
+        profile: If True, prints a per-model latency and token summary.
+        metrics_jsonl: Optional JSONL file the turns are appended to.
+        metrics_prom: Optional Prometheus textfile to write.
+        t: The TranslationManager used for the labels.
+    """
+    if metrics is None:
+        return
+    if profile:
+        from rich.table import Table
+
+        table = Table(title=t.get("profile_title"))
+        for column in ("Model", "Turns (err/cached)", "p50 / p95 (s)", "TTFT p50 / p95 (s)", "Tokens in / out / think", "tok/s"):
+            table.add_column(column, justify="left" if column == "Model" else "right")
+        fmt = lambda value: "-" if value is None else f"{value:.2f}"
+        for model, stats in metrics.summary().items():
+            table.add_row(
+                model,
+                f"{stats['turns']} ({stats['errors']}/{stats['cache_hits']})",
+                f"{fmt(stats['p50'])} / {fmt(stats['p95'])}",
+                f"{fmt(stats['ttft_p50'])} / {fmt(stats['ttft_p95'])}",
+                f"{stats['prompt_tokens']} / {stats['response_tokens']} / {stats['thinking_tokens']}",
+                fmt(stats["tokens_per_second"]),
+            )
+        console.print(table)
+    if metrics_jsonl:
+        metrics.export_jsonl(metrics_jsonl)
+    if metrics_prom:
+        metrics.export_prometheus(metrics_prom)
+
+def open_response_cache(config_manager: ConfigManager, enabled: Optional[bool]) -> Optional["ResponseCache"]:
+    """
+    Opens the response cache if enabled on the command line or in the configuration.
+
+    Args:
+        config_manager: The ConfigManager holding the `response_cache` settings.
+        enabled: The value of `--cache/--no-cache`, or None to follow the configuration.
+
+    Returns:
+        The ResponseCache, or None if caching is disabled.
+    """
+    settings = config_manager.get_response_cache()
+    if enabled is None:
+        enabled = bool(settings.get("enabled", False))
+    if not enabled:
+        return None
+    from src.response_cache import ResponseCache
+
+    return ResponseCache.from_settings(settings)
+
+def open_semantic_cache(config_manager: ConfigManager, enabled: Optional[bool], api_key: Optional[str], debug: bool = False) -> Optional["SemanticCache"]:
+    """
+    Opens the semantic cache of first replies if enabled in the configuration.
+
+    Args:
+        config_manager: The ConfigManager holding the `semantic_cache` settings.
+        enabled: The value of `--cache/--no-cache`; False disables the semantic cache too.
+        api_key: The API key used when embeddings come from the API.
+        debug: If True, prints the similarity of every lookup.
+
+    Returns:
+        The SemanticCache, or None if disabled.
+    """
+    settings = config_manager.get_semantic_cache()
+    if enabled is False or not settings.get("enabled", False):
+        return None
+    from src.client_pool import get_client
+    from src.semantic_cache import SemanticCache
+
+    client = get_client(api_key) if settings.get("embeddings") == "api" and api_key else None
+    return SemanticCache.from_settings(settings, client=client, debug=debug)
+
+def open_prompt_library(config_manager: ConfigManager, debug: bool = False) -> Optional["PromptLibrary"]:
+    """
+    Opens the prompt library unless it is disabled in the configuration.
+
+    Args:
+        config_manager: The ConfigManager holding the `prompt_library` settings.
+        debug: If True, prints why the library couldn't be opened.
+
+    Returns:
+        The PromptLibrary, or None if disabled or unavailable.
+    """
+    settings = config_manager.get_prompt_library()
+    if not settings.get("enabled", True):
+        return None
+    import sqlite3
+    from src.library import PromptLibrary
+
+    try:
+        return PromptLibrary.from_settings(settings)
+    except sqlite3.Error as e:
+        if debug:
+            print(f"[DEBUG] Prompt library unavailable: {e}")
+        return None
+
+def archive_session(library: Optional["PromptLibrary"], session_key: str, idea: Optional[str], consultant: "PromptConsultant", language: str, debug: bool = False):
+    """
+    Stores the session in the prompt library if its last reply holds a final prompt.
+
+    Called after every turn, so the library keeps the latest revision even if
+    the program is interrupted.
+
+    Args:
+        library: The PromptLibrary, or None if disabled.
+        session_key: The identifier of the running session.
+        idea: The session's initial idea.
+        consultant: The session.
+        language: The session language.
+        debug: If True, prints the stored entry id.
+    """
+    if library is None or not idea:
+        return
+    from src.evaluate import extract_final_prompt
+    from src.history import content_text
+    from src.library import session_transcript
+
+    history = consultant.chat_session.get_history()
+    if not history or history[-1].role != "model":
+        return
+    final_prompt = extract_final_prompt(content_text(history[-1]))
+    if not final_prompt:
+        return
+    try:
+        entry_id = library.save(session_key, idea, session_transcript(history), final_prompt, consultant.model_name, language)
+    except Exception as e:
+        # The library is a convenience: never lose the conversation over it
+        if debug:
+            print(f"[DEBUG] Prompt library write failed: {e}")
+        return
+    if debug:
+        print(f"[DEBUG] Session stored in the prompt library as #{entry_id}")
+
+def show_library_entries(entries: "list[LibraryEntry]", t: TranslationManager):
+    """
+    Prints prompt library entries as a table.
+
+    Args:
+        entries: The entries to show.
+        t: The TranslationManager used for the labels.
+    """
+    import time
+    from rich.table import Table
+
+    def clip(text: str, width: int) -> str:
+        text = " ".join(text.split())
+        return text if len(text) <= width else text[:width - 1] + "…"
+
+    table = Table(title=t.get("library_title"))
+    for column in ("#", t.get("library_date"), t.get("library_model"), t.get("library_idea"), t.get("library_prompt")):
+        table.add_column(column, justify="right" if column == "#" else "left")
+    for entry in entries:
+        table.add_row(str(entry.id), time.strftime("%Y-%m-%d", time.localtime(entry.updated)), entry.model, clip(entry.idea, 40), clip(entry.final_prompt, 60))
+    console.print(table)
+
+def prepare_consultant(config_manager: ConfigManager, api_key: str, model: str, debug: bool, t: TranslationManager, cache: Optional[bool], metrics: Optional["MetricsRecorder"], stream: bool, registry: Optional["ModelRegistry"] = None) -> "PromptConsultant":
+    """
+    Builds the consultant and warms up its connection.
+
+    Meant to run on a BackgroundTask while the user is typing: it pays for the
+    SDK import, client and session creation and the first TLS handshake.
+
+    Args:
+        config_manager: The ConfigManager holding the saved settings.
+        api_key: The API key to use.
+        model: The model to use.
+        debug: If True, enables debug mode for the consultant.
+        t: The TranslationManager passed to the consultant.
+        cache: The value of `--cache/--no-cache`.
+        metrics: An optional MetricsRecorder.
+        stream: If True, also preloads the renderers used for streamed replies.
+        registry: An optional ModelRegistry providing the cached model metadata.
+
+    Returns:
+        The ready-to-use PromptConsultant.
+    """
+    from src.agent import PromptConsultant
+
+    if stream:
+        import rich.live, rich.markdown, rich.spinner  # noqa: F401
+    consultant = PromptConsultant(api_key=api_key, model_name=model, debug=debug, translation_manager=t, **consultant_options(config_manager, cache, metrics, registry, api_key, debug))
+    consultant.warm_up()
+    return consultant
+
+def swap_session(consultant: "PromptConsultant", model: Optional[str] = None) -> "PromptConsultant":
+    """
+    Switches the consultant to a new model, or restarts its session, and warms it up.
+
+    Meant to run on a BackgroundTask after `/set-model` and `/set-language`.
+
+    Args:
+        consultant: The consultant to update.
+        model: The new model, or None to just start a new session (e.g. after a language change).
+
+    Returns:
+        The same consultant, ready for the next turn.
+    """
+    if model:
+        consultant.update_model(model)
+    else:
+        consultant.start_new_session()
+    consultant.warm_up()
+    return consultant
+
+def compare_turn(consultant: "PromptConsultant", models: "list[str]", message: str, first_turn: bool, t: TranslationManager) -> Optional["ComparisonResult"]:
+    """
+    Sends a turn to several models at once and shows their replies side by side.
+
+    Each reply is rendered as soon as its model finishes, with its latency and
+    token counts. The user then picks the reply to continue the conversation with.
+
+    Args:
+        consultant: The current session; it is forked once per model and left unchanged.
+        models: The models to compare.
+        message: The user's message, or the initial idea on the first turn.
+        first_turn: If True, the turn starts the consultation.
+        t: The TranslationManager used for the labels.
+
+    Returns:
+        The chosen result, holding the forked consultant to continue with,
+        or None to keep the current session.
+    """
+    from rich.live import Live
+    from rich.markdown import Markdown
+    from rich.panel import Panel
+    from rich.spinner import Spinner
+    from rich.table import Table
+    from src.compare import compare_models
+
+    def view(results: "list[ComparisonResult]") -> Table:
+        grid = Table.grid(expand=True, padding=(0, 1))
+        for _ in results:
+            grid.add_column(ratio=1)
+        panels = []
+        for idx, result in enumerate(results, 1):
+            if not result.done:
+                panels.append(Panel(Spinner("dots", text=t.get("thinking")), title=f"{idx}. {result.model}"))
+                continue
+            tokens = f"{result.prompt_tokens or '-'} → {result.response_tokens or '-'} tok"
+            if result.thinking_tokens:
+                tokens += f" (+{result.thinking_tokens} think)"
+            body = f"[red]{result.reply}[/red]" if result.error else Markdown(result.reply)
+            panels.append(Panel(body, title=f"{idx}. {result.model}", subtitle=f"{result.wall_time:.1f}s · {tokens}", border_style="red" if result.error else "green"))
+        grid.add_row(*panels)
+        return grid
+
+    with Live(console=console, refresh_per_second=12, vertical_overflow="visible") as live:
+        results = compare_models(consultant, models, message, first_turn, on_update=lambda current: live.update(view(current)))
+        live.update(view(results))
+
+    choices = ["0"] + [str(idx) for idx, result in enumerate(results, 1) if not result.error and result.consultant]
+    choice = Prompt.ask(t.get("compare_choose"), choices=choices, default="0")
+    return None if choice == "0" else results[int(choice) - 1]
+
+def fast_consultation(consultant: "PromptConsultant", idea: str, stream: bool, t: TranslationManager) -> bool:
+    """
+    Runs the first turns of a consultation in fast mode.
+
+    The draft prompt and the clarifying questions come back in one call; the
+    user accepts the proposed answers in bulk or goes through them, and one
+    more turn produces the final prompt. If the model answered in free text,
+    its reply is shown and the interview continues as usual.
+
+    Args:
+        consultant: The session.
+        idea: The user's initial idea.
+        stream: If True, the final prompt is streamed.
+        t: The TranslationManager used for the labels.
+
+    Returns:
+        True if the last reply may hold the final prompt. False if the turn
+        answering the questions failed: the session then ends on the draft,
+        which must not be archived as a final prompt.
+    """
+    from rich.markdown import Markdown
+    from src.history import content_text
+
+    with console.status(t.get("thinking"), spinner="dots"):
+        reply, draft = consultant.start_fast_consultation(idea)
+    console.print(t.get("consultant_label").rstrip())
+    console.print(Markdown(reply))
+    if draft is None or not draft.questions:
+        return True
+    answers: List[str] = []
+    yes = t.get("answer_yes")
+    if Prompt.ask(t.get("fast_accept_defaults"), choices=[yes, t.get("answer_no")], default=yes) != yes:
+        console.print(t.get("fast_answer_hint"))
+        for idx, item in enumerate(draft.questions, 1):
+            answers.append(Prompt.ask(f"{idx}. {item.question}", default=item.default_answer or None) or "")
+    message = draft.answers_message(answers)
+    if stream:
+        render_stream(consultant.chat_stream(message), t)
+    else:
+        with console.status(t.get("thinking"), spinner="dots"):
+            response = consultant.chat(message)
+        console.print(f"{t.get('consultant_label')}{response}")
+    # A failed turn, even one cut short mid-stream, leaves the draft as the last reply
+    return content_text(consultant.chat_session.get_history()[-1]) != reply
+
+def evaluate_prompts(prompts: "list[str]", dataset: str, backends: Any, model: str, t: TranslationManager, checks: Optional[str] = None, **options) -> bool:
+    """
+    Evaluates one or two prompt revisions on a dataset and prints the report.
+
+    Args:
+        prompts: The prompts; with two, the report compares A and B.
+        dataset: The JSONL dataset.
+        backends: The BackendRouter used to reach the models.
+        model: The model the prompts are evaluated on.
+        t: The TranslationManager used for the labels.
+        checks: Optional JSON file with the global checks.
+        **options: Further `run_evaluation` arguments (concurrency, rpm, request_policy, judge_model, output_path).
+
+    Returns:
+        True if the evaluation ran, False if the dataset or checks couldn't be read.
+    """
+    from rich.table import Table
+    from src.evaluate import run_evaluation
+
+    try:
+        with console.status(t.get("evaluate_running", model=model), spinner="dots"):
+            summaries = run_evaluation(prompts, dataset, backends, model, checks_path=checks, **options)
+    except (OSError, ValueError) as e:
+        console.print(t.get("evaluate_failed", error=str(e)))
+        return False
+
+    def fmt(value: Any, rate: bool = False) -> str:
+        if value is None:
+            return "-"
+        if rate:
+            return f"{value:.0%}"
+        return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+    rows = [("samples", "samples", False), ("errors", "errors", False), ("pass_rate", "pass rate", True)]
+    check_names = {name for summary in summaries for name in summary["checks"]}
+    rows += [(f"check:{name}", f"  {name}", True) for name in sorted(check_names)]
+    rows += [
+        ("latency_p50", "latency p50 (s)", False),
+        ("latency_p95", "latency p95 (s)", False),
+        ("prompt_tokens_p50", "prompt tokens p50", False),
+        ("response_tokens_p50", "response tokens p50", False),
+        ("response_tokens_p95", "response tokens p95", False),
+        ("total_tokens", "total tokens", False),
+    ]
+
+    table = Table(title=t.get("evaluate_title", model=model))
+    table.add_column("")
+    labels = ["A", "B"] if len(summaries) == 2 else ["A"]
+    for label in labels:
+        table.add_column(label, justify="right")
+    if len(summaries) == 2:
+        table.add_column("Δ", justify="right")
+    for key, label, rate in rows:
+        values = [summary["checks"].get(key[6:]) if key.startswith("check:") else summary[key] for summary in summaries]
+        cells = [fmt(value, rate) for value in values]
+        if len(values) == 2:
+            a, b = values
+            if a is None or b is None:
+                cells.append("-")
+            elif rate:
+                cells.append(f"{(b - a) * 100:+.0f} pt")
+            else:
+                cells.append(f"{b - a:+.2f}" if isinstance(b - a, float) else f"{b - a:+d}")
+        table.add_row(label, *cells)
+    console.print(table)
+    return True
+
+def render_stream(chunks: Iterator[str], t: TranslationManager) -> str:
+    """
+    Renders a streamed consultant reply incrementally as Markdown.
+
+    A spinner is shown until the first chunk arrives; from then on the
+    accumulated text is re-rendered in place as new chunks come in.
+
+    Args:
+        chunks: An iterator of text chunks, as returned by `PromptConsultant.chat_stream`.
+        t: The TranslationManager used for the labels.
+
+    Returns:
+        The complete reply text.
+    """
+    from rich.live import Live
+    from rich.markdown import Markdown
+    from rich.spinner import Spinner
+
+    console.print(t.get("consultant_label").rstrip())
+    text = ""
+    with Live(Spinner("dots", text=t.get("thinking")), console=console, refresh_per_second=12, vertical_overflow="visible") as live:
+        for chunk in chunks:
+            text += chunk
+            live.update(Markdown(text))
+    return text
+
 @app.command()
 def start(
     model: str = typer.Option(None, help="The Gemini model to use. Overrides saved preference."),
     debug: bool = typer.Option(False, help="Enable debug mode."),
+    stream: bool = typer.Option(True, help="Stream replies as they are generated instead of waiting for the full response."),
+    cache: Optional[bool] = typer.Option(None, "--cache/--no-cache", help="Serve identical turns from the on-disk response cache. Defaults to the saved setting."),
+    profile: bool = typer.Option(False, help="Print a latency and token summary of the session on exit."),
+    metrics_jsonl: Optional[str] = typer.Option(None, help="Append per-turn metrics to this JSONL file on exit."),
+    metrics_prom: Optional[str] = typer.Option(None, help="Write session metrics to this Prometheus textfile on exit."),
+    compare: Optional[str] = typer.Option(None, help="Comma-separated models answering the initial idea side by side, e.g. gemini-2.5-flash,gemini-2.5-pro."),
+    fast: bool = typer.Option(False, help="Get the clarifying questions, proposed answers and a draft prompt in one reply instead of an interview."),
     reset: bool = typer.Option(False, help="Reset saved model preference.")
 ):
     """
@@ -37,13 +572,23 @@ def start(
     Args:
         model: The Gemini model to use for the session. Overrides saved preference.
         debug: If True, enables debug mode for the consultant.
+        stream: If True, renders the consultant's replies incrementally as they are generated.
+        cache: Enables or disables the response cache. None follows the configuration.
+        profile: If True, prints a per-session latency and token summary on exit.
+        metrics_jsonl: Optional JSONL file the per-turn metrics are appended to.
+        metrics_prom: Optional Prometheus textfile the session metrics are written to.
+        compare: Optional comma-separated models the initial idea is sent to concurrently.
+        fast: If True, the consultation starts in fast mode (see `src.fast_mode`).
         reset: If True, resets saved model preference, API key, and language.
     """
     config_manager = ConfigManager()
     
     # --- LANGUAGE SELECTION ---
     if reset:
-         config_manager.set_language(None)
+        # Language and API key are cleared in a single write
+        with config_manager.transaction():
+            config_manager.set_language(None)
+            config_manager.set_api_key(None)
     
     language = config_manager.get_language()
     if not language:
@@ -58,9 +603,6 @@ def start(
     t = TranslationManager(language)
 
     # --- API KEY MANAGEMENT ---
-    if reset:
-        config_manager.set_api_key(None)
-    
     api_key = config_manager.get_api_key()
     
     # Fallback/Check: API Key MUST be in config.
@@ -74,48 +616,43 @@ def start(
         console.print(t.get("api_key_saved"))
 
     # --- MODEL SELECTION ---
+    # The menus and name checks read the cached model list; an expired list is
+    # refreshed in the background
+    registry = open_model_registry(config_manager, api_key, debug)
     if reset:
         console.print(t.get("model_reset"))
         model = None
+    elif model:
+        check_model(registry, model, t)
     
     if not model:
         saved_model = config_manager.get_model()
         if saved_model and not reset:
             model = saved_model
             console.print(t.get("model_in_use", model=model))
+            check_model(registry, model, t)
         else:
             console.print(t.get("choose_model"))
-            # Updated Model List
-            models = [
-                "gemini-2.5-flash",
-                "gemini-2.5-pro",
-                "gemini-2.5-flash-lite",
-                "gemini-2.0-flash", 
-                "gemini-3-flash-preview",
-                "gemma-3-27b-it"
-            ]
-            for idx, m in enumerate(models, 1):
-                clean_name = m.split()[0] 
-                console.print(f"{idx}. {m}")
-            
-            console.print(f"{len(models)+1}. {t.get('manual_entry')}")
-
-            choice = Prompt.ask(t.get("enter_number"), choices=[str(i) for i in range(1, len(models)+2)], default="1")
-            
-            if int(choice) <= len(models):
-                model = models[int(choice)-1].split()[0]
-            else:
-                model = Prompt.ask(t.get("enter_model_name"))
-            
+            model = choose_model(registry, t, "manual_entry", "enter_number", default="1")
             config_manager.set_model(model)
             console.print(t.get("model_saved", model=model))
 
+    # --- BACKGROUND WARM-UP ---
+    # The consultant is built (heavy imports included) and connected while the
+    # user reads the banner and types the initial idea
+    from src.metrics import MetricsRecorder
+    from src.prewarm import BackgroundTask
+
+    metrics = MetricsRecorder() if (profile or metrics_jsonl or metrics_prom) else None
+    consultant_task = BackgroundTask(prepare_consultant, config_manager, api_key, model, debug, t, cache, metrics, stream, registry)
+    library_task = BackgroundTask(open_prompt_library, config_manager, debug)
+    # Identifies the running session in the prompt library; its latest final prompt is stored after every turn
+    session_key = os.urandom(16).hex()
+    idea: Optional[str] = None
+
     console.print(t.get("welcome"))
     console.print(t.get("intro"))
     console.print(t.get("commands_help"))
-
-    # Pass TranslationManager to Consultant
-    consultant = PromptConsultant(api_key=api_key, model_name=model, debug=debug, translation_manager=t)
     
     first_turn = True
 
@@ -131,6 +668,11 @@ def start(
         # Exit
         if user_input.lower() in ["exit", "quit", "basta", "esci", "/exit"]:
             console.print(t.get("goodbye"))
+            if debug and consultant_task.done() and consultant_task.result().response_cache:
+                print(f"[DEBUG] Response cache: {consultant_task.result().response_cache.stats()}")
+            finish_metrics(metrics, profile, metrics_jsonl, metrics_prom, t)
+            if library_task.done() and library_task.result():
+                library_task.result().close()
             break
             
         # Set API Key
@@ -138,37 +680,19 @@ def start(
             new_key = Prompt.ask(t.get("api_key_prompt_new"), password=True)
             if new_key:
                 config_manager.set_api_key(new_key)
-                # Re-init client
-                from google import genai
-                consultant.api_key = new_key
-                consultant.client = genai.Client(api_key=new_key)
+                # Re-bind the running session to the shared client for the new key
+                consultant_task.result().set_api_key(new_key)
                 console.print(t.get("api_key_updated"))
             continue
 
         # Set Model
         if user_input.lower().startswith("/set-model"):
             console.print(t.get("available_models"))
-            models = [
-                "gemini-2.5-flash",
-                "gemini-2.5-pro",
-                "gemini-2.5-flash-lite",
-                "gemini-2.0-flash", 
-                "gemini-3-flash-preview",
-                "gemma-3-27b-it"
-            ]
-            for idx, m in enumerate(models, 1):
-                console.print(f"{idx}. {m}")
-            console.print(f"{len(models)+1}. {t.get('manual_selection')}")
-            
-            c = Prompt.ask(t.get("choice"), choices=[str(i) for i in range(1, len(models)+2)])
-            if int(c) <= len(models):
-                new_model = models[int(c)-1]
-            else:
-                new_model = Prompt.ask(t.get("enter_model_name"))
+            new_model = choose_model(registry, t, "manual_selection", "choice")
             
             config_manager.set_model(new_model)
-            # Update running instance
-            consultant.update_model(new_model)
+            # Update running instance in the background while the user types
+            consultant_task = BackgroundTask(swap_session, consultant_task.result(), new_model)
             console.print(t.get("model_updated", model=new_model))
             continue
         
@@ -181,10 +705,11 @@ def start(
             lang_choice = Prompt.ask("Scelta / Choice", choices=["1", "2"], default="1")
             new_lang = "it" if lang_choice == "1" else "en"
             
+            consultant = consultant_task.result()
             config_manager.set_language(new_lang)
             t.load_translations(new_lang)
             consultant.translation_manager = t 
-            consultant.start_new_session() 
+            consultant_task = BackgroundTask(swap_session, consultant)
             
             if new_lang == "it":
                  console.print("[green]Lingua impostata su Italiano![/green]")
@@ -198,11 +723,92 @@ def start(
             if confirm.lower() in ["y", "s"]:
                 config_manager.clear_config()
                 console.print(t.get("reset_done"))
+                finish_metrics(metrics, profile, metrics_jsonl, metrics_prom, t)
                 raise typer.Exit()
             else:
                 console.print(t.get("reset_cancel"))
             continue
 
+        # Compare models
+        if user_input.lower().startswith("/compare"):
+            from src.compare import parse_models
+
+            compare_models = parse_models(user_input[len("/compare"):])
+            if len(compare_models) < 2:
+                console.print(t.get("compare_usage"))
+                continue
+            message = Prompt.ask(t.get("initial_idea") if first_turn else t.get("user_label")).strip()
+            if not message:
+                continue
+            chosen = compare_turn(consultant_task.result(), compare_models, message, first_turn, t)
+            if chosen:
+                config_manager.set_model(chosen.model)
+                consultant_task = BackgroundTask(lambda forked=chosen.consultant: forked)
+                if first_turn:
+                    idea = message
+                first_turn = False
+                console.print(t.get("compare_adopted", model=chosen.model))
+                archive_session(library_task.result(), session_key, idea, chosen.consultant, t.language, debug)
+            continue
+
+        # Search the prompt library
+        if user_input.lower().startswith("/search"):
+            library = library_task.result()
+            if library is None:
+                console.print(t.get("library_disabled"))
+                continue
+            entries = library.search(user_input[len("/search"):].strip())
+            if not entries:
+                console.print(t.get("library_no_results"))
+                continue
+            show_library_entries(entries, t)
+            console.print(t.get("library_reuse_hint"))
+            continue
+
+        # Start from a stored session
+        if user_input.lower().startswith("/reuse"):
+            from rich.markdown import Markdown
+
+            library = library_task.result()
+            if library is None:
+                console.print(t.get("library_disabled"))
+                continue
+            entry_id = user_input[len("/reuse"):].strip().lstrip("#")
+            entry = library.get(int(entry_id)) if entry_id.isdigit() else None
+            if entry is None:
+                console.print(t.get("library_not_found", id=entry_id))
+                continue
+            # The last consultant message holding the prompt keeps the context of the interview
+            replies = [message["text"] for message in entry.transcript or [] if message["role"] == "consultant"]
+            final_reply = replies[-1] if replies and entry.final_prompt in replies[-1] else f"```markdown\n{entry.final_prompt}\n```"
+            consultant = consultant_task.result()
+            consultant.resume_session(entry.idea, final_reply)
+            library.mark_used(entry.id)
+            session_key = os.urandom(16).hex()
+            idea = entry.idea
+            first_turn = False
+            console.print(t.get("library_reused", id=entry.id))
+            console.print(Markdown(f"```markdown\n{entry.final_prompt}\n```"))
+            continue
+
+        # Evaluate the final prompt
+        if user_input.lower().startswith("/evaluate"):
+            from src.evaluate import history_prompts
+
+            args = user_input.split()[1:]
+            ab = "--ab" in args
+            args = [arg for arg in args if arg != "--ab"]
+            if not 1 <= len(args) <= 2:
+                console.print(t.get("evaluate_usage"))
+                continue
+            consultant = consultant_task.result()
+            prompts = history_prompts(consultant.chat_session.get_history())
+            if not prompts or (ab and len(prompts) < 2):
+                console.print(t.get("evaluate_no_prompt"))
+                continue
+            evaluate_prompts(prompts[-2:] if ab else prompts[-1:], args[0], consultant.backends, consultant.model_name, t, checks=args[1] if len(args) > 1 else None, request_policy=consultant.request_policy, api_key=consultant.api_key)
+            continue
+
         # Catch-all for unknown slash commands
         if user_input.startswith("/"):
             console.print(t.get("unknown_command", command=user_input))
@@ -210,6 +816,38 @@ def start(
             continue
 
         # --- AI INTERACTION ---
+        consultant = consultant_task.result()
+        if compare and first_turn:
+            from src.compare import parse_models
+
+            chosen = compare_turn(consultant, parse_models(compare), user_input, first_turn, t)
+            # Only the initial idea is compared; later turns go to the chosen model
+            compare = None
+            if chosen:
+                config_manager.set_model(chosen.model)
+                consultant_task = BackgroundTask(lambda forked=chosen.consultant: forked)
+                first_turn = False
+                idea = user_input
+                console.print(t.get("compare_adopted", model=chosen.model))
+                archive_session(library_task.result(), session_key, idea, chosen.consultant, t.language, debug)
+            continue
+        if first_turn:
+            idea = user_input
+        if fast and first_turn:
+            first_turn = False
+            if fast_consultation(consultant, user_input, stream, t):
+                archive_session(library_task.result(), session_key, idea, consultant, t.language, debug)
+            continue
+        if stream:
+            if first_turn:
+                chunks = consultant.start_consultation_stream(user_input)
+                first_turn = False
+            else:
+                chunks = consultant.chat_stream(user_input)
+            render_stream(chunks, t)
+            archive_session(library_task.result(), session_key, idea, consultant, t.language, debug)
+            continue
+
         with console.status(t.get("thinking"), spinner="dots"):
              if first_turn:
                  response = consultant.start_consultation(user_input)
@@ -218,6 +856,199 @@ def start(
                  response = consultant.chat(user_input)
         
         console.print(f"{t.get('consultant_label')}{response}")
+        archive_session(library_task.result(), session_key, idea, consultant, t.language, debug)
+
+@app.command()
+def batch(
+    input_path: str = typer.Argument(..., metavar="INPUT", help="JSONL file of initial ideas, or '-' to read from stdin."),
+    output: str = typer.Option(..., "--output", "-o", help="JSONL file the results are appended to. Also used as checkpoint."),
+    model: str = typer.Option(None, help="The Gemini model to use. Overrides saved preference."),
+    concurrency: int = typer.Option(8, help="Maximum number of consultations running at the same time."),
+    timeout: float = typer.Option(120.0, help="Deadline in seconds for each consultation turn, retries included."),
+    resume: bool = typer.Option(True, help="Skip ideas already completed in the output file."),
+    cache: Optional[bool] = typer.Option(None, "--cache/--no-cache", help="Serve identical turns from the on-disk response cache. Defaults to the saved setting."),
+    profile: bool = typer.Option(False, help="Print a latency and token summary of the run."),
+    metrics_jsonl: Optional[str] = typer.Option(None, help="Append per-turn metrics to this JSONL file."),
+    metrics_prom: Optional[str] = typer.Option(None, help="Write run metrics to this Prometheus textfile."),
+):
+    """
+    Refines a file of prompt ideas without interaction.
+
+    Each input line is an initial idea, either as plain text or as a JSON object
+    with `idea`, and optionally `id` and scripted `answers`. Results are appended
+    to the output file in completion order.
+
+    Args:
+        input_path: The input JSONL file, or "-" for stdin.
+        output: The output JSONL file.
+        model: The Gemini model to use. Overrides saved preference.
+        concurrency: Maximum number of concurrent consultations.
+        timeout: Deadline in seconds for each consultation turn, retries included.
+        resume: If True, skips records already present in the output file.
+        cache: Enables or disables the response cache. None follows the configuration.
+        profile: If True, prints a latency and token summary of the run.
+        metrics_jsonl: Optional JSONL file the per-turn metrics are appended to.
+        metrics_prom: Optional Prometheus textfile the run metrics are written to.
+    """
+    from src.batch import run_batch
+    from src.metrics import MetricsRecorder
+
+    config_manager = ConfigManager()
+    t = TranslationManager(config_manager.get_language() or "it")
+
+    api_key = config_manager.get_api_key()
+    if not api_key:
+        console.print(t.get("batch_api_key_missing"))
+        raise typer.Exit(code=1)
+    model = model or config_manager.get_model() or "gemini-2.5-flash"
+    registry = open_model_registry(config_manager, api_key)
+    check_model(registry, model, t)
+
+    metrics = MetricsRecorder() if (profile or metrics_jsonl or metrics_prom) else None
+    options = consultant_options(config_manager, cache, metrics, registry, api_key, batch=True)
+    counts = run_batch(input_path, output, api_key, model, t, concurrency=concurrency, timeout=timeout, resume=resume, consultant_options=options)
+    console.print(t.get("batch_done", **counts))
+    finish_metrics(metrics, profile, metrics_jsonl, metrics_prom, t)
+    if counts["failed"]:
+        raise typer.Exit(code=1)
+
+@app.command()
+def evaluate(
+    dataset: str = typer.Argument(..., help="JSONL file of test inputs, as plain text or JSON objects with `input`, and optionally `id` and `checks`."),
+    prompt: List[str] = typer.Option(..., "--prompt", "-p", help="File holding the prompt to evaluate. Give it twice to compare two revisions (A and B)."),
+    checks: Optional[str] = typer.Option(None, help="JSON file with the checks applied to every output."),
+    model: str = typer.Option(None, help="The model the prompt is run on. Overrides saved preference."),
+    judge_model: Optional[str] = typer.Option(None, help="The model grading the `judge` checks. Defaults to --model."),
+    concurrency: int = typer.Option(8, help="Maximum number of samples processed at the same time."),
+    rpm: Optional[float] = typer.Option(None, help="Maximum model requests per minute, judge calls included."),
+    timeout: float = typer.Option(120.0, help="Deadline in seconds for each request attempt; every retry gets a new one."),
+    output: Optional[str] = typer.Option(None, "--output", "-o", help="JSONL file receiving every sample's output and check results."),
+):
+    """
+    Runs a prompt against a dataset of test inputs and scores the outputs.
+
+    The prompt is used as system instruction and each input as user message.
+    Outputs are scored by regex, JSON schema and LLM-judge checks; the report
+    shows pass rates, latency and token usage, side by side for two revisions.
+    A prompt file holding a whole consultant reply is reduced to its final
+    prompt code block.
+
+    Args:
+        dataset: The JSONL dataset.
+        prompt: One or two prompt files.
+        checks: Optional JSON file with the global checks.
+        model: The model the prompt is run on. Overrides saved preference.
+        judge_model: The model grading the judge checks.
+        concurrency: Maximum number of concurrent samples.
+        rpm: Optional cap on model requests per minute.
+        timeout: Deadline in seconds for each request attempt.
+        output: Optional JSONL file the per-sample results are written to.
+    """
+    from src.backends import BackendRouter
+    from src.client_pool import get_client
+    from src.evaluate import extract_final_prompt
+    from src.resilience import RequestPolicy
+
+    config_manager = ConfigManager()
+    t = TranslationManager(config_manager.get_language() or "it")
+
+    if len(prompt) > 2:
+        console.print(t.get("evaluate_too_many"))
+        raise typer.Exit(code=1)
+    api_key = config_manager.get_api_key()
+    if not api_key:
+        console.print(t.get("batch_api_key_missing"))
+        raise typer.Exit(code=1)
+    model = model or config_manager.get_model() or "gemini-2.5-flash"
+    registry = open_model_registry(config_manager, api_key)
+    check_model(registry, model, t)
+
+    prompts = []
+    for path in prompt:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        prompts.append(extract_final_prompt(text) or text.strip())
+
+    policy = RequestPolicy.from_settings({**config_manager.get_request_policy(), "timeout": timeout}, open_quota_scheduler(config_manager, batch=True))
+    backends = BackendRouter(get_client(api_key), config_manager.get_backends())
+    if not evaluate_prompts(prompts, dataset, backends, model, t, checks=checks, concurrency=concurrency, rpm=rpm, request_policy=policy, judge_model=judge_model, output_path=output, api_key=api_key):
+        raise typer.Exit(code=1)
+
+@app.command()
+def serve(
+    host: Optional[str] = typer.Option(None, help="Interface to listen on. Defaults to 127.0.0.1."),
+    port: Optional[int] = typer.Option(None, help="Port to listen on. Defaults to 8090."),
+    model: str = typer.Option(None, help="The default model of new sessions. Overrides saved preference."),
+    concurrency: Optional[int] = typer.Option(None, help="Maximum number of turns calling the model at the same time."),
+    max_sessions: Optional[int] = typer.Option(None, help="Maximum number of sessions kept in memory."),
+    cache: Optional[bool] = typer.Option(None, "--cache/--no-cache", help="Serve identical turns from the on-disk response cache. Defaults to the saved setting."),
+    debug: bool = typer.Option(False, help="Enable debug mode."),
+):
+    """
+    Hosts consultation sessions for several users over HTTP and WebSocket.
+
+    Sessions are created with `POST /sessions` and driven with
+    `POST /sessions/{id}/messages`, or streamed over a WebSocket at
+    `/sessions/{id}/stream`. Limits, the listening address and an optional
+    bearer token are read from the `server` section of `config.json`.
+
+    Args:
+        host: The interface to listen on.
+        port: The port to listen on.
+        model: The default model of new sessions. Overrides saved preference.
+        concurrency: Maximum number of concurrent model turns.
+        max_sessions: Maximum number of sessions kept in memory.
+        cache: Enables or disables the response cache. None follows the configuration.
+        debug: If True, prints every request and enables debug mode for the consultants.
+    """
+    from src.server import run_server
+
+    config_manager = ConfigManager()
+    language = config_manager.get_language() or "it"
+    t = TranslationManager(language)
+
+    api_key = config_manager.get_api_key()
+    if not api_key:
+        console.print(t.get("batch_api_key_missing"))
+        raise typer.Exit(code=1)
+    model = model or config_manager.get_model() or "gemini-2.5-flash"
+    registry = open_model_registry(config_manager, api_key, debug)
+    check_model(registry, model, t)
+
+    settings = config_manager.get_server_settings()
+    library = open_prompt_library(config_manager, debug)
+    options = consultant_options(config_manager, cache, registry=registry, api_key=api_key, debug=debug)
+
+    def on_turn(session):
+        archive_session(library, session.archive_key, session.idea, session.consultant, session.language, debug)
+
+    def ready(addresses):
+        for address in addresses:
+            console.print(t.get("serve_listening", host=address[0], port=address[1]))
+
+    try:
+        run_server(
+            api_key, model, language,
+            host or settings.get("host", "127.0.0.1"),
+            port if port is not None else settings.get("port", 8090),
+            settings=settings,
+            ready=ready,
+            consultant_options=options,
+            registry=registry,
+            on_turn=on_turn if library else None,
+            max_concurrency=concurrency,
+            max_sessions=max_sessions,
+            debug=debug,
+        )
+    except KeyboardInterrupt:
+        console.print(t.get("serve_stopped"))
+    except OSError as e:
+        # e.g. the port is already in use
+        console.print(t.get("serve_failed", error=e))
+        raise typer.Exit(code=1)
+    finally:
+        if library:
+            library.close()
 
 if __name__ == "__main__":
     """
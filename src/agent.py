@@ -4,14 +4,48 @@ This module defines the PromptConsultant class, which acts as an AI agent
 to assist users in crafting and refining prompts for generative AI models.
 
 It leverages the Google Gemini API to facilitate interactive consultation sessions.
+Models served by other backends (e.g. a local llama.cpp server) can be used
+through the backend layer in `src.backends`.
 """
 from google import genai
-from google.genai import types
-from typing import List, Dict
+from google.genai import errors, types
+from typing import TYPE_CHECKING, Any, List, Dict, Iterator, Optional, Tuple
 import os
+import time
 
+from src.backends import GEMINI, BackendRouter, ChatSession, split_model_name
+from src.client_pool import get_client
+from src.context_cache import get_system_prompt_cache
+from src.fast_mode import DRAFT_SCHEMA, FAST_MESSAGE_TEMPLATE, ConsultationDraft
+from src.generation import FINAL, INTERVIEW, THINKING_MODEL_RE, GenerationPolicy, is_truncated
+from src.history import CHARS_PER_TOKEN, HistoryManager, estimate_tokens
+from src.metrics import MetricsRecorder, TurnMetrics
+from src.model_registry import ModelRegistry
+from src.resilience import RequestPolicy, call_with_policy, stream_with_policy
+from src.response_cache import ResponseCache, make_cache_key
 from src.translation import TranslationManager
 
+if TYPE_CHECKING:
+    # Imported on first use: NumPy, if installed, is only loaded when the cache is enabled
+    from src.semantic_cache import SemanticCache
+
+# Prefix of the replies returned in place of a response when a call fails
+ERROR_PREFIX = "Error communicating with Gemini:"
+# Priming message sent with the user's initial idea
+INITIAL_MESSAGE_TEMPLATE = "Ecco la mia idea iniziale per un prompt che voglio scrivere: '{initial_text}'. Per favore analizzala e inizia la consulenza."
+
+def is_error_reply(text: str) -> bool:
+    """
+    Checks whether a reply returned by a consultant is an error message.
+
+    Args:
+        text: The reply returned by `chat` or `start_consultation`.
+
+    Returns:
+        True if the reply reports a failed call instead of a model response.
+    """
+    return bool(text) and text.startswith(ERROR_PREFIX)
+
 class PromptConsultant:
     """
     Manages interaction with a generative AI model for prompt consultation.
@@ -20,7 +54,7 @@ class PromptConsultant:
     and communication with the Google Gemini API to provide interactive
     prompt refinement assistance.
     """
-    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash", debug: bool = False, translation_manager: TranslationManager = None):
+    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash", debug: bool = False, translation_manager: TranslationManager = None, client: Optional[genai.Client] = None, response_cache: Optional[ResponseCache] = None, context_cache: bool = False, history_manager: Optional[HistoryManager] = None, metrics: Optional[MetricsRecorder] = None, request_policy: Optional[RequestPolicy] = None, model_registry: Optional[ModelRegistry] = None, backends: Optional[Dict[str, Dict[str, Any]]] = None, semantic_cache: Optional["SemanticCache"] = None, generation_policy: Optional[GenerationPolicy] = None):
         """
         Initializes the PromptConsultant with necessary configurations.
 
@@ -29,6 +63,26 @@ class PromptConsultant:
             model_name: The name of the Gemini model to use for the consultation.
             debug: If True, enables debug output for the consultant.
             translation_manager: An instance of TranslationManager for i18n support.
+            client: An optional Gemini client to use. Defaults to the process-wide
+                client shared by all consultants using the same API key.
+            response_cache: An optional ResponseCache; replies to identical turns are served from it.
+            context_cache: If True, the system prompt is registered once per model and
+                language with Gemini's context caching and referenced by new sessions.
+            history_manager: An optional HistoryManager keeping the session history
+                within a token budget by summarizing older turns.
+            metrics: An optional MetricsRecorder receiving the measurements of every turn.
+            request_policy: Deadlines, retries, hedging and fallback applied to every call.
+                Defaults to a RequestPolicy with its default settings.
+            model_registry: An optional ModelRegistry; its cached metadata is used to skip
+                context caching for models that don't support it.
+            backends: Optional settings of the non-Gemini backends (the `backends`
+                section of the configuration). Models named `<backend>:<model>`
+                are sent to them; see `src.backends`.
+            semantic_cache: An optional SemanticCache; new consultations whose initial
+                idea is close to a stored one start from its first reply.
+            generation_policy: An optional GenerationPolicy selecting the thinking
+                budget and output cap of each turn by phase (interview or final).
+                Without it every turn uses the model defaults.
 
         Raises:
             ValueError: If the API key is not provided.
@@ -41,7 +95,22 @@ class PromptConsultant:
         self.translation_manager = translation_manager if translation_manager else TranslationManager("it")
         self.model_name = model_name
         self.debug = debug
-        self.client = genai.Client(api_key=self.api_key)
+        self.client = client if client else get_client(self.api_key)
+        self.backends = BackendRouter(self.client, backends)
+        self.response_cache = response_cache
+        self.context_cache = context_cache
+        self.history_manager = history_manager
+        self.metrics = metrics
+        self.request_policy = request_policy if request_policy else RequestPolicy()
+        self.model_registry = model_registry
+        self.semantic_cache = semantic_cache
+        self.generation_policy = generation_policy
+        # Measurements of the last completed turn
+        self.last_turn_metrics: Optional[TurnMetrics] = None
+        # Name of the cached content the current session references, if any
+        self._session_cached_content: Optional[str] = None
+        # Seconds between sending the last streamed message and receiving its first chunk
+        self.last_time_to_first_token: Optional[float] = None
         
         self.start_new_session()
 
@@ -57,27 +126,187 @@ class PromptConsultant:
         self.system_prompt = self.translation_manager.get("system_prompt")
         self._initialize_model()
 
-    def _initialize_model(self):
+    def _generation_config(self) -> types.GenerateContentConfig:
+        """
+        Builds the generation config used for the chat session.
+
+        Returns:
+            The `GenerateContentConfig` with the system instructions and temperature.
+        """
+        return types.GenerateContentConfig(
+            system_instruction=self.system_prompt,
+            temperature=0.7,
+        )
+
+    def _cached_system_prompt(self) -> Optional[str]:
+        """
+        Looks up the context cache holding the system prompt for the current model and language.
+
+        Returns:
+            The cached content name, or None if context caching is off or unavailable.
+        """
+        if not self.context_cache or split_model_name(self.model_name)[0] != GEMINI:
+            return None
+        if self.model_registry and self.model_registry.supports_caching(self.model_name) is False:
+            return None
+        cache = get_system_prompt_cache(self.client, debug=self.debug)
+        return cache.get(self.model_name, self.translation_manager.language, self.system_prompt)
+
+    def _session_config(self) -> types.GenerateContentConfig:
+        """
+        Builds the config the chat session is created with.
+
+        Same as `_generation_config`, except that the system prompt is referenced
+        from the context cache instead of being sent inline when possible.
+
+        Returns:
+            The `GenerateContentConfig` for the chat session.
+        """
+        config = self._generation_config()
+        self._session_cached_content = self._cached_system_prompt()
+        if self._session_cached_content:
+            config = config.model_copy(update={"system_instruction": None, "cached_content": self._session_cached_content})
+        return config
+
+    def _refresh_context_cache(self):
+        """
+        Keeps the session's cached system prompt alive before a turn.
+
+        Extends the cache TTL when it is close to expiring, and rebuilds the
+        session (keeping its history) if the cache had to be recreated or
+        caching is no longer available.
+        """
+        if not self.context_cache:
+            return
+        if self._cached_system_prompt() != self._session_cached_content:
+            self._initialize_model(history=self.chat_session.get_history())
+
+    def _context_cache_lost(self, error: Exception) -> bool:
+        """
+        Checks whether a failed turn reports the session's cached system prompt as missing.
+
+        Args:
+            error: The exception raised by the turn.
+
+        Returns:
+            True if the session references a cached content and the API answered
+            that it was not found (or is no longer accessible).
+        """
+        return (
+            self._session_cached_content is not None
+            and isinstance(error, errors.ClientError)
+            and error.code in (403, 404)
+            and "cach" in str(error).lower()
+        )
+
+    def _recover_context_cache(self, error: Exception) -> bool:
+        """
+        Moves the session to a new cached system prompt after the current one went missing.
+
+        The missing cache is invalidated for every consultant sharing it, then the
+        session is rebuilt (keeping its history) on a new cache or the inline prompt.
+
+        Args:
+            error: The exception raised by the turn.
+
+        Returns:
+            True if the turn should be retried.
+        """
+        if not self._context_cache_lost(error):
+            return False
+        if self.debug:
+            print(f"[DEBUG] Context cache {self._session_cached_content} is gone, rebuilding the session: {error}")
+        get_system_prompt_cache(self.client, debug=self.debug).invalidate(self._session_cached_content)
+        self._initialize_model(history=self.chat_session.get_history())
+        return True
+
+    def _initialize_model(self, history: Optional[List[types.Content]] = None):
         """
         Initializes or re-initializes the generative AI model chat session.
 
         Configures the chat session with the selected model, system instructions,
         and temperature settings. Handles potential errors during model initialization.
+
+        Args:
+            history: Optional prior turns to seed the new chat session with.
         """
         try:
             if self.debug:
                 print(f"[DEBUG] Initializing model: {self.model_name}")
 
-            self.chat_session = self.client.chats.create(
-                model=self.model_name,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_prompt,
-                    temperature=0.7,
-                )
-            )
+            self._chat_config = self._session_config()
+            # Requests are sent statelessly through the backend; the session only keeps the history
+            self.chat_session = ChatSession(history)
         except Exception as e:
             print(f"Error initializing model: {e}")
 
+    def set_api_key(self, new_api_key: str):
+        """
+        Switches the consultant to a different API key.
+
+        The chat session is rebuilt on the shared client for the new key,
+        carrying over the conversation history.
+
+        Args:
+            new_api_key: The new API key to use.
+        """
+        history = self.chat_session.get_history()
+        self.api_key = new_api_key
+        self.client = get_client(new_api_key)
+        self.backends = BackendRouter(self.client, self.backends.settings)
+        self._initialize_model(history=history)
+
+    def warm_up(self):
+        """
+        Opens the connection to the API ahead of the first turn.
+
+        Fetches the current model's metadata (or the model list of a local
+        backend), which establishes the connection in the client's pool so the
+        first real request doesn't pay for it. Failures are ignored.
+        """
+        started = time.perf_counter()
+        try:
+            backend, model = self.backends.resolve(self.model_name)
+            backend.warm_up(model)
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] Warm-up request failed: {e}")
+            return
+        if self.debug:
+            print(f"[DEBUG] Connection warmed up in {time.perf_counter() - started:.3f}s")
+
+    def fork(self, model_name: Optional[str] = None) -> "PromptConsultant":
+        """
+        Creates an independent copy of the session, optionally on another model.
+
+        The copy shares the client, caches, metrics and request policy, and
+        starts from the current history; turns sent to it don't affect this session.
+
+        Args:
+            model_name: The model of the copy. Defaults to the current model.
+
+        Returns:
+            The new consultant.
+        """
+        forked = type(self)(
+            api_key=self.api_key,
+            model_name=model_name or self.model_name,
+            debug=self.debug,
+            translation_manager=self.translation_manager,
+            client=self.client,
+            response_cache=self.response_cache,
+            context_cache=self.context_cache,
+            history_manager=self.history_manager,
+            metrics=self.metrics,
+            request_policy=self.request_policy,
+            model_registry=self.model_registry,
+            backends=self.backends.settings,
+            semantic_cache=self.semantic_cache,
+            generation_policy=self.generation_policy,
+        )
+        forked._initialize_model(history=list(self.chat_session.get_history()))
+        return forked
+
     def update_model(self, new_model_name: str):
         """
         Updates the generative AI model used for the consultation.
@@ -93,6 +322,265 @@ class PromptConsultant:
             print(f"[DEBUG] Switching to model: {self.model_name}")
         self.start_new_session()
 
+    def _summarize_turns(self, contents: List[types.Content]) -> str:
+        """
+        Asks the model for a compact summary of older turns.
+
+        The call goes through the request policy (retries, fallback and quota),
+        and falls back to a locally truncated transcript if it fails.
+
+        Args:
+            contents: The turns to summarize.
+
+        Returns:
+            The summary text.
+        """
+        try:
+            request = self.history_manager.summary_request(contents)
+            messages = [types.Content(role="user", parts=[types.Part(text=request)])]
+            result = call_with_policy(
+                self.request_policy,
+                lambda model: self._generate("generate", model, messages, types.GenerateContentConfig(temperature=0.2)),
+                self.model_name,
+                quota_key=self.api_key,
+                tokens=len(request) // CHARS_PER_TOKEN,
+            )
+            if result.response.text:
+                return result.response.text
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] History summarization failed, using local summary: {e}")
+        return self.history_manager.local_summary(contents)
+
+    def count_tokens(self, contents: List[types.Content]) -> int:
+        """
+        Counts the tokens of a list of contents with the API, for the current model.
+
+        Falls back to the local estimate if the call fails.
+
+        Args:
+            contents: The contents to measure.
+
+        Returns:
+            The number of tokens.
+        """
+        try:
+            backend, model = self.backends.resolve(self.model_name)
+            return backend.count_tokens(model, contents)
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] count_tokens failed, using local estimate: {e}")
+            return estimate_tokens(contents)
+
+    def _compact_history(self):
+        """
+        Folds older interview turns into a summary when the history exceeds its token budget.
+
+        The session is rebuilt with the compacted history; the initial idea and
+        the latest exchanges are kept verbatim.
+        """
+        if self.history_manager is None:
+            return
+        count_tokens = self.count_tokens if self.history_manager.use_count_tokens else None
+        split = self.history_manager.split(self.chat_session.get_history(), count_tokens)
+        if split is None:
+            return
+        head, middle, tail = split
+        if self.debug:
+            print(f"[DEBUG] Compacting {len(middle)} history entries")
+        self._initialize_model(history=self.history_manager.build(head, self._summarize_turns(middle), tail))
+
+    def _turn_cache_key(self, user_text: str, phase: Optional[str] = None) -> Optional[str]:
+        """
+        Computes the response cache key for the next turn.
+
+        Args:
+            user_text: The user's message for the turn.
+            phase: The phase of the turn; its generation settings are part of the key.
+
+        Returns:
+            The cache key, or None if no response cache is configured.
+        """
+        if self.response_cache is None:
+            return None
+        model = self._turn_model(phase)
+        history = [content.model_dump(mode="json", exclude_none=True) for content in self.chat_session.get_history()]
+        config = self._generation_config().model_copy(update=self._phase_config(model, phase)).model_dump(mode="json", exclude_none=True)
+        return make_cache_key(model, config, history, user_text)
+
+    def _replay_cached_turn(self, user_text: str, reply: str):
+        """
+        Appends a turn served from the cache to the session history without calling the API.
+
+        Args:
+            user_text: The user's message for the turn.
+            reply: The cached reply.
+        """
+        self._record_exchange(types.Content(role="user", parts=[types.Part(text=user_text)]), reply)
+
+    def _turn_phase(self, user_text: str) -> Optional[str]:
+        """
+        Predicts the phase of the next turn with the generation policy.
+
+        Args:
+            user_text: The user's message for the turn.
+
+        Returns:
+            INTERVIEW or FINAL, or None without a generation policy.
+        """
+        if self.generation_policy is None:
+            return None
+        return self.generation_policy.phase(self.chat_session.get_history(curated=True), user_text)
+
+    def _turn_model(self, phase: Optional[str]) -> str:
+        """
+        Returns the model answering a turn: the phase's model from the generation policy, if any.
+
+        Args:
+            phase: INTERVIEW, FINAL or None.
+
+        Returns:
+            The model name, optionally prefixed with its backend; `model_name` by default.
+        """
+        if phase is None or self.generation_policy is None:
+            return self.model_name
+        return self.generation_policy.model(self.model_name, phase) or self.model_name
+
+    def _phase_config(self, model_name: str, phase: Optional[str]) -> Dict[str, Any]:
+        """
+        Returns the generation config fields the generation policy sets for a phase.
+
+        The thinking budget is only sent to models the registry reports with
+        thinking support or, for models it doesn't know, to Gemini models of a
+        thinking family (2.5 and later); never to models of other backends.
+        The output cap is kept within the model's output token limit, when known.
+
+        Args:
+            model_name: The model the request is sent to.
+            phase: INTERVIEW, FINAL or None.
+
+        Returns:
+            The fields to merge into the request config; empty without a phase or policy.
+        """
+        if phase is None or self.generation_policy is None:
+            return {}
+        thinking, output_limit = False, None
+        if split_model_name(model_name)[0] == GEMINI:
+            info = self.model_registry.get(model_name) if self.model_registry else None
+            thinking = info.thinking if info and info.thinking is not None else THINKING_MODEL_RE.match(model_name) is not None
+            output_limit = info.output_token_limit if info else None
+        return self.generation_policy.config_update(model_name, phase, thinking, output_limit)
+
+    def _request_config(self, model_name: str, phase: Optional[str] = None) -> types.GenerateContentConfig:
+        """
+        Builds the config of a single request made through the request policy.
+
+        Fallback models can't use the primary model's context cache, so they
+        get the system prompt inline. The policy's deadline is applied as HTTP
+        timeout, so abandoned attempts don't linger.
+
+        Args:
+            model_name: The model the request is sent to.
+            phase: The phase of the turn, selecting the thinking budget and output
+                cap of the generation policy. None leaves the model defaults.
+
+        Returns:
+            The `GenerateContentConfig` for the request.
+        """
+        config = self._chat_config if model_name == self.model_name else self._generation_config()
+        update = self._phase_config(model_name, phase)
+        if update:
+            config = config.model_copy(update=update)
+        if self.request_policy.timeout:
+            config = config.model_copy(update={"http_options": types.HttpOptions(timeout=int(self.request_policy.timeout * 1000))})
+        return config
+
+    def _generate(self, method: str, model_name: str, contents: List[types.Content], config: types.GenerateContentConfig) -> Any:
+        """
+        Sends a request to the backend serving a model.
+
+        Args:
+            method: The LLMBackend method to call: "generate", "generate_stream",
+                "agenerate" or "agenerate_stream".
+            model_name: The model name, optionally prefixed with its backend.
+            contents: The contents of the request.
+            config: The generation config of the request.
+
+        Returns:
+            Whatever the backend method returns (a response, an iterator or an awaitable).
+        """
+        backend, model = self.backends.resolve(model_name)
+        return getattr(backend, method)(model, contents, config)
+
+    def _quota_tokens(self, contents: List[types.Content]) -> int:
+        """
+        Estimates the input tokens of a request for the quota scheduler.
+
+        Args:
+            contents: The contents of the request.
+
+        Returns:
+            The estimated tokens of the contents and the system prompt.
+        """
+        return estimate_tokens(contents) + len(self.system_prompt or "") // CHARS_PER_TOKEN
+
+    def _turn_contents(self, user_content: types.Content) -> List[types.Content]:
+        """
+        Builds the contents sent for a turn: the curated history plus the new message.
+
+        Args:
+            user_content: The user's message for the turn.
+
+        Returns:
+            The full list of contents for the request.
+        """
+        return self.chat_session.get_history(curated=True) + [user_content]
+
+    def _record_exchange(self, user_content: types.Content, reply: str):
+        """
+        Appends a completed exchange to the session history.
+
+        Requests are sent statelessly through the request policy, so the history
+        is only updated once a turn has succeeded, whatever the retries, hedges
+        or fallbacks it took.
+
+        Args:
+            user_content: The user's message for the turn.
+            reply: The text of the model's reply.
+        """
+        model_content = types.Content(role="model", parts=[types.Part(text=reply)])
+        self.chat_session.record_history(user_input=user_content, model_output=[model_content], is_valid=bool(reply))
+
+    def _record_turn(self, started: float, usage: Optional[types.GenerateContentResponseUsageMetadata] = None, **kwargs):
+        """
+        Stores the measurements of a finished turn and forwards them to the MetricsRecorder.
+
+        Args:
+            started: The `time.perf_counter()` value when the turn started.
+            usage: The `usage_metadata` of the (last) response, if any.
+            **kwargs: Any other TurnMetrics field, e.g. `time_to_first_token` or `error`.
+                `model` defaults to the current model.
+        """
+        model = kwargs.pop("model", self.model_name)
+        self.last_turn_metrics = TurnMetrics.from_usage(model, time.perf_counter() - started, usage, **kwargs)
+        if self.metrics is not None:
+            self.metrics.record(self.last_turn_metrics)
+        if self.debug:
+            print(f"[DEBUG] Turn: {self.last_turn_metrics}")
+
+    def _build_initial_message(self, initial_text: str) -> str:
+        """
+        Builds the priming message sent with the user's initial idea.
+
+        Args:
+            initial_text: The user's initial idea or draft prompt.
+
+        Returns:
+            The message that guides the model into consultation interview mode.
+        """
+        # We define a priming message to ensure the model knows to start the interview
+        return INITIAL_MESSAGE_TEMPLATE.format(initial_text=initial_text)
+
     def start_consultation(self, initial_text: str) -> str:
         """
         Initiates a new consultation session with an initial user idea.
@@ -106,9 +594,181 @@ class PromptConsultant:
         Returns:
             The AI's initial response to start the consultation.
         """
-        # We define a priming message to ensure the model knows to start the interview
-        user_message = f"Ecco la mia idea iniziale per un prompt che voglio scrivere: '{initial_text}'. Per favore analizzala e inizia la consulenza."
-        return self.chat(user_message)
+        started = time.perf_counter()
+        cached = self._semantic_lookup(initial_text)
+        if cached is not None:
+            self._record_turn(started, cache_hit=True)
+            return cached
+        reply = self.chat(self._build_initial_message(initial_text))
+        self._semantic_store(initial_text, reply)
+        return reply
+
+    def start_consultation_stream(self, initial_text: str) -> Iterator[str]:
+        """
+        Streaming counterpart of `start_consultation`.
+
+        Args:
+            initial_text: The user's initial idea or draft prompt.
+
+        Yields:
+            Text chunks of the AI's initial response as they are generated.
+        """
+        started = time.perf_counter()
+        cached = self._semantic_lookup(initial_text)
+        if cached is not None:
+            self.last_time_to_first_token = time.perf_counter() - started
+            self._record_turn(started, cache_hit=True, streamed=True)
+            yield cached
+            return
+        parts = []
+        for chunk in self.chat_stream(self._build_initial_message(initial_text)):
+            parts.append(chunk)
+            yield chunk
+        self._semantic_store(initial_text, "".join(parts))
+
+    def start_fast_consultation(self, initial_text: str) -> Tuple[str, Optional[ConsultationDraft]]:
+        """
+        Initiates a consultation in fast mode: one structured reply instead of an interview.
+
+        The model answers with the clarifying questions, a proposed answer to
+        each and a draft prompt (see `src.fast_mode`). The draft is recorded in
+        the history as a Markdown reply, so the answers can be sent with `chat`
+        or `chat_stream` (see `ConsultationDraft.answers_message`) to get the
+        final prompt in one more turn. The response and semantic caches are not used.
+
+        Args:
+            initial_text: The user's initial idea or draft prompt.
+
+        Returns:
+            The reply as recorded in the history, and the parsed draft. The draft
+            is None if the call failed (the reply is then an error message) or the
+            model answered in free text (an ordinary first reply).
+        """
+        started = time.perf_counter()
+        self._refresh_context_cache()
+        user_content, contents = self._fast_contents(initial_text)
+        try:
+            result = call_with_policy(
+                self.request_policy,
+                lambda model: self._generate("generate", model, contents, self._fast_config(model)),
+                self._turn_model(FINAL),
+                quota_key=self.api_key,
+                tokens=self._quota_tokens(contents),
+            )
+        except KeyboardInterrupt:
+            self._record_turn(started, error=True)
+            return f"{ERROR_PREFIX} the request was cancelled.", None
+        except Exception as e:
+            self._record_turn(started, error=True)
+            return f"{ERROR_PREFIX} {str(e)}", None
+        response = result.response
+        reply, draft = self._fast_reply(response.text or "")
+        self._record_exchange(user_content, reply)
+        self._record_turn(started, response.usage_metadata, time_to_first_token=time.perf_counter() - started, retries=result.retries, model=result.model, phase=FINAL)
+        return reply, draft
+
+    def _fast_contents(self, initial_text: str) -> Tuple[types.Content, List[types.Content]]:
+        """
+        Builds the user message of a fast-mode turn and the contents sent with it.
+        """
+        user_content = types.Content(role="user", parts=[types.Part(text=FAST_MESSAGE_TEMPLATE.format(initial_text=initial_text))])
+        return user_content, self._turn_contents(user_content)
+
+    def _fast_config(self, model_name: str) -> types.GenerateContentConfig:
+        """
+        Returns the request config of a fast-mode turn: a final turn with structured output.
+        """
+        structured = {"response_mime_type": "application/json", "response_schema": DRAFT_SCHEMA}
+        return self._request_config(model_name, FINAL).model_copy(update=structured)
+
+    def _fast_reply(self, text: str) -> Tuple[str, Optional[ConsultationDraft]]:
+        """
+        Parses a fast-mode reply into the draft and the Markdown reply recorded in the history.
+
+        Args:
+            text: The model's reply.
+
+        Returns:
+            The reply to record, and the draft, or None if the model answered in free text.
+        """
+        try:
+            draft = ConsultationDraft.parse(text)
+        except ValueError as e:
+            if self.debug:
+                print(f"[DEBUG] Fast mode reply is not a structured draft, continuing as an interview: {e}")
+            return text, None
+        t = self.translation_manager
+        return draft.to_markdown(t.get("fast_questions"), t.get("fast_default_answer")), draft
+
+    def _semantic_lookup(self, initial_text: str) -> Optional[str]:
+        """
+        Starts the session from the first reply to a similar idea, if the semantic cache has one.
+
+        Only a session without history is seeded. The stored reply is recorded
+        as the answer to this session's own initial message.
+
+        Args:
+            initial_text: The user's initial idea.
+
+        Returns:
+            The stored first reply, or None on a miss.
+        """
+        if self.semantic_cache is None or self.chat_session.get_history():
+            return None
+        from src.semantic_cache import scope_key
+
+        try:
+            hit = self.semantic_cache.lookup(initial_text, scope_key(self.model_name, self.system_prompt))
+        except Exception as e:
+            # The embeddings API may be unreachable: just ask the model
+            if self.debug:
+                print(f"[DEBUG] Semantic cache lookup failed: {e}")
+            return None
+        if hit is None:
+            return None
+        if self.debug:
+            print(f"[DEBUG] Semantic cache hit ({hit.similarity:.3f}) for: {hit.idea}")
+        self._replay_cached_turn(self._build_initial_message(initial_text), hit.reply)
+        return hit.reply
+
+    def _semantic_store(self, initial_text: str, reply: str):
+        """
+        Stores the first reply of a consultation in the semantic cache.
+
+        Failed turns and replies from fallback models are not stored.
+
+        Args:
+            initial_text: The user's initial idea.
+            reply: The first reply.
+        """
+        metrics = self.last_turn_metrics
+        if self.semantic_cache is None or not reply or metrics is None or metrics.error or metrics.model != self._turn_model(metrics.phase):
+            return
+        from src.semantic_cache import scope_key
+
+        try:
+            self.semantic_cache.put(initial_text, scope_key(self.model_name, self.system_prompt), reply)
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] Semantic cache write failed: {e}")
+
+    def resume_session(self, initial_text: str, final_reply: str):
+        """
+        Starts a new session from a consultation finished earlier.
+
+        The session is seeded with the initial idea and the reply holding the
+        final prompt, so the next message refines that prompt instead of
+        starting a new interview. No request is sent.
+
+        Args:
+            initial_text: The initial idea of the earlier consultation.
+            final_reply: The consultant reply holding its final prompt.
+        """
+        self.system_prompt = self.translation_manager.get("system_prompt")
+        self._initialize_model(history=[
+            types.Content(role="user", parts=[types.Part(text=self._build_initial_message(initial_text))]),
+            types.Content(role="model", parts=[types.Part(text=final_reply)]),
+        ])
 
     def chat(self, user_text: str) -> str:
         """
@@ -124,8 +784,151 @@ class PromptConsultant:
             The AI's generated response as a string.
             Returns an error message if communication with Gemini fails.
         """
+        started = time.perf_counter()
+        self._compact_history()
+        phase = self._turn_phase(user_text)
+        cache_key = self._turn_cache_key(user_text, phase)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self._replay_cached_turn(user_text, cached)
+                self._record_turn(started, cache_hit=True, phase=phase)
+                return cached
+        self._refresh_context_cache()
+        user_content = types.Content(role="user", parts=[types.Part(text=user_text)])
+        contents = self._turn_contents(user_content)
+        turn_model = self._turn_model(phase)
+        recovered = False
+        try:
+            while True:
+                try:
+                    result = call_with_policy(
+                        self.request_policy,
+                        lambda model: self._generate("generate", model, contents, self._request_config(model, phase)),
+                        turn_model,
+                        quota_key=self.api_key,
+                        tokens=self._quota_tokens(contents),
+                    )
+                except Exception as e:
+                    # The cached system prompt expired or was deleted: retry once on a new one
+                    if recovered or not self._recover_context_cache(e):
+                        raise
+                    recovered = True
+                    continue
+                if phase != INTERVIEW or not is_truncated(result.response):
+                    break
+                # The model wrote more than an interview reply (usually the prompt): redo it as a final turn
+                if self.debug:
+                    print("[DEBUG] Interview reply hit the output cap, retrying as a final turn")
+                phase = FINAL
+                turn_model = self._turn_model(phase)
+        except KeyboardInterrupt:
+            # Ctrl-C abandons the stuck call; the session is left as before the turn
+            self._record_turn(started, error=True, phase=phase)
+            return f"{ERROR_PREFIX} the request was cancelled."
+        except Exception as e:
+            self._record_turn(started, error=True, phase=phase)
+            return f"{ERROR_PREFIX} {str(e)}"
+        response = result.response
+        self._record_exchange(user_content, response.text or "")
+        # Without streaming the first token arrives with the whole response
+        self._record_turn(started, response.usage_metadata, time_to_first_token=time.perf_counter() - started, retries=result.retries, model=result.model, phase=phase)
+        if result.model != turn_model and self.debug:
+            print(f"[DEBUG] Answered by fallback model {result.model}")
+        if cache_key and response.text and result.model == turn_model:
+            self.response_cache.put(cache_key, response.text)
+        return response.text
+
+    def chat_stream(self, user_text: str) -> Iterator[str]:
+        """
+        Sends a user message to the active chat session and yields the
+        AI's response incrementally as chunks arrive.
+
+        The time elapsed until the first non-empty chunk is stored in
+        `last_time_to_first_token`. The full reply is recorded in the chat
+        history once the stream has completed successfully.
+
+        Args:
+            user_text: The user's message to send to the AI.
+
+        Yields:
+            Text chunks of the AI's response.
+            Yields an error message if communication with Gemini fails.
+        """
+        self.last_time_to_first_token = None
+        started = time.perf_counter()
+        self._compact_history()
+        phase = self._turn_phase(user_text)
+        cache_key = self._turn_cache_key(user_text, phase)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self._replay_cached_turn(user_text, cached)
+                self.last_time_to_first_token = time.perf_counter() - started
+                self._record_turn(started, cache_hit=True, streamed=True, phase=phase)
+                yield cached
+                return
+        self._refresh_context_cache()
+        user_content = types.Content(role="user", parts=[types.Part(text=user_text)])
+        contents = self._turn_contents(user_content)
+        request = contents
+        parts = []
+        usage = None
+        turn_model = self._turn_model(phase)
+        model, retries = turn_model, 0
+        recovered = False
         try:
-            response = self.chat_session.send_message(user_text)
-            return response.text
+            while True:
+                chunks = stream_with_policy(
+                    self.request_policy,
+                    lambda model: self._generate("generate_stream", model, request, self._request_config(model, phase)),
+                    turn_model,
+                    quota_key=self.api_key,
+                    tokens=self._quota_tokens(request),
+                )
+                truncated = False
+                try:
+                    for chunk, model, retries in chunks:
+                        usage = chunk.usage_metadata or usage
+                        truncated = is_truncated(chunk)
+                        # Chunks carrying only thoughts or metadata have no text
+                        if not chunk.text:
+                            continue
+                        if self.last_time_to_first_token is None:
+                            self.last_time_to_first_token = time.perf_counter() - started
+                            if self.debug:
+                                print(f"[DEBUG] Time to first token: {self.last_time_to_first_token:.3f}s")
+                        parts.append(chunk.text)
+                        yield chunk.text
+                except Exception as e:
+                    # The cached system prompt expired or was deleted: retry once on a new one,
+                    # unless part of the reply was already shown
+                    if parts or recovered or not self._recover_context_cache(e):
+                        raise
+                    recovered = True
+                    continue
+                if phase != INTERVIEW or not truncated:
+                    break
+                # Part of the reply is already shown: complete it as a final turn
+                if self.debug:
+                    print("[DEBUG] Interview reply hit the output cap, continuing as a final turn")
+                phase = FINAL
+                turn_model = self._turn_model(phase)
+                request = contents + [
+                    types.Content(role="model", parts=[types.Part(text="".join(parts))]),
+                    types.Content(role="user", parts=[types.Part(text=self.translation_manager.get("continue_message"))]),
+                ]
+        except KeyboardInterrupt:
+            # Ctrl-C abandons the reply; the session is left as before the turn
+            self._record_turn(started, error=True, streamed=True, model=model, retries=retries, phase=phase)
+            yield f"{ERROR_PREFIX} the request was cancelled."
+            return
         except Exception as e:
-            return f"Error communicating with Gemini: {str(e)}"
+            self._record_turn(started, error=True, streamed=True, model=model, retries=retries, phase=phase)
+            yield f"{ERROR_PREFIX} {str(e)}"
+            return
+        reply = "".join(parts)
+        self._record_exchange(user_content, reply)
+        self._record_turn(started, usage, time_to_first_token=self.last_time_to_first_token, streamed=True, model=model, retries=retries, phase=phase)
+        if cache_key and parts and model == turn_model:
+            self.response_cache.put(cache_key, reply)
@@ -0,0 +1,496 @@
+"""
+This module defines the AsyncPromptConsultant class, an asyncio counterpart of
+PromptConsultant built on the async API of the backends (`client.aio` for Gemini).
+
+Many consultants can run concurrently in a single event loop. They share the
+pooled Gemini client from `src.client_pool`, so hundreds of sessions reuse the
+same HTTP connections instead of each paying for its own client and TLS handshake.
+Async connections are kept per event loop, so a process may run several loops
+one after the other (e.g. one `asyncio.run()` per evaluation).
+
+Example:
+    consultants = [AsyncPromptConsultant(api_key, timeout=60) for _ in ideas]
+    replies = await asyncio.gather(*(c.start_consultation(i) for c, i in zip(consultants, ideas)))
+"""
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Optional, Tuple
+
+from google import genai
+from google.genai import types
+
+from src.agent import ERROR_PREFIX, PromptConsultant
+from src.context_cache import get_system_prompt_cache
+from src.fast_mode import ConsultationDraft
+from src.generation import FINAL, INTERVIEW, GenerationPolicy, is_truncated
+from src.history import CHARS_PER_TOKEN, HistoryManager
+from src.metrics import MetricsRecorder
+from src.model_registry import ModelRegistry
+from src.resilience import RequestPolicy, acall_with_policy, astream_with_policy
+from src.response_cache import ResponseCache
+from src.translation import TranslationManager
+
+if TYPE_CHECKING:
+    from src.semantic_cache import SemanticCache
+
+class AsyncPromptConsultant(PromptConsultant):
+    """
+    Asynchronous prompt consultant.
+
+    Exposes the same session management as PromptConsultant, but `chat`,
+    `start_consultation` and their streaming variants are coroutines /
+    async generators. Each instance supports a per-call timeout and can be
+    cancelled from another task via `cancel()` without affecting other sessions.
+    """
+    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash", debug: bool = False, translation_manager: TranslationManager = None, client: Optional[genai.Client] = None, response_cache: Optional[ResponseCache] = None, context_cache: bool = False, history_manager: Optional[HistoryManager] = None, metrics: Optional[MetricsRecorder] = None, request_policy: Optional[RequestPolicy] = None, model_registry: Optional[ModelRegistry] = None, backends: Optional[Dict[str, Dict[str, Any]]] = None, semantic_cache: Optional["SemanticCache"] = None, generation_policy: Optional[GenerationPolicy] = None, timeout: Optional[float] = None):
+        """
+        Initializes the AsyncPromptConsultant.
+
+        Args:
+            api_key: The API key for authenticating with the Google Gemini API.
+            model_name: The name of the Gemini model to use for the consultation.
+            debug: If True, enables debug output for the consultant.
+            translation_manager: An instance of TranslationManager for i18n support.
+            client: An optional Gemini client to use. Defaults to the shared pooled client.
+            response_cache: An optional ResponseCache; replies to identical turns are served from it.
+            context_cache: If True, new sessions reference the system prompt from Gemini's context cache.
+            history_manager: An optional HistoryManager keeping the history within a token budget.
+            metrics: An optional MetricsRecorder receiving the measurements of every turn.
+            request_policy: Per-attempt deadlines, retries, hedging and fallback applied to every call.
+            model_registry: An optional ModelRegistry used to skip context caching where unsupported.
+            backends: Optional settings of the non-Gemini backends, see `src.backends`.
+            semantic_cache: An optional SemanticCache; new consultations whose initial
+                idea is close to a stored one start from its first reply.
+            generation_policy: An optional GenerationPolicy selecting the thinking
+                budget and output cap of each turn by phase.
+            timeout: Default deadline in seconds for each whole turn, retries included.
+                None means no deadline.
+
+        Raises:
+            ValueError: If the API key is not provided.
+        """
+        self.timeout = timeout
+        self._pending: Optional[asyncio.Future] = None
+        self._cancelled = False
+        super().__init__(api_key=api_key, model_name=model_name, debug=debug, translation_manager=translation_manager, client=client, response_cache=response_cache, context_cache=context_cache, history_manager=history_manager, metrics=metrics, request_policy=request_policy, model_registry=model_registry, backends=backends, semantic_cache=semantic_cache, generation_policy=generation_policy)
+
+    def fork(self, model_name: Optional[str] = None) -> "AsyncPromptConsultant":
+        """
+        Creates an independent copy of the session, keeping the turn deadline.
+
+        Args:
+            model_name: The model of the copy. Defaults to the current model.
+
+        Returns:
+            The new consultant.
+        """
+        forked = super().fork(model_name)
+        forked.timeout = self.timeout
+        return forked
+
+    def _session_config(self) -> types.GenerateContentConfig:
+        """
+        Builds the config the chat session is created with, with the system prompt inline.
+
+        Looking up the context cache may call the API, so it is left to
+        `_arefresh_context_cache`, which runs it off the event loop before each turn.
+
+        Returns:
+            The `GenerateContentConfig` for the chat session.
+        """
+        self._session_cached_content = None
+        return self._generation_config()
+
+    async def _arefresh_context_cache(self):
+        """
+        Asynchronous counterpart of `_refresh_context_cache`.
+
+        Looks up (or creates) the cached system prompt in a worker thread and
+        points the session at it, so a slow cache call doesn't stall the other
+        sessions of the event loop.
+        """
+        if not self.context_cache:
+            return
+        cached = await asyncio.to_thread(self._cached_system_prompt)
+        if cached == self._session_cached_content:
+            return
+        config = self._generation_config()
+        if cached:
+            config = config.model_copy(update={"system_instruction": None, "cached_content": cached})
+        self._chat_config = config
+        self._session_cached_content = cached
+
+    async def _arecover_context_cache(self, error: Exception) -> bool:
+        """
+        Asynchronous counterpart of `_recover_context_cache`.
+
+        Args:
+            error: The exception raised by the turn.
+
+        Returns:
+            True if the turn should be retried.
+        """
+        if not self._context_cache_lost(error):
+            return False
+        if self.debug:
+            print(f"[DEBUG] Context cache {self._session_cached_content} is gone, rebuilding the session: {error}")
+        get_system_prompt_cache(self.client, debug=self.debug).invalidate(self._session_cached_content)
+        await self._arefresh_context_cache()
+        return True
+
+    async def _acompact_history(self, deadline: Optional[float]):
+        """
+        Asynchronous counterpart of `_compact_history`, summarizing through `acall_with_policy`.
+
+        Args:
+            deadline: Absolute deadline of the current turn, or None.
+        """
+        if self.history_manager is None:
+            return
+        # The local estimate avoids a blocking count_tokens call inside the event loop
+        split = self.history_manager.split(self.chat_session.get_history())
+        if split is None:
+            return
+        head, middle, tail = split
+        try:
+            request = self.history_manager.summary_request(middle)
+            messages = [types.Content(role="user", parts=[types.Part(text=request)])]
+            result = await self._await(
+                acall_with_policy(
+                    self.request_policy,
+                    lambda model: self._generate("agenerate", model, messages, types.GenerateContentConfig(temperature=0.2)),
+                    self.model_name,
+                    quota_key=self.api_key,
+                    tokens=len(request) // CHARS_PER_TOKEN,
+                ),
+                deadline,
+            )
+            summary = result.response.text or self.history_manager.local_summary(middle)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] History summarization failed, using local summary: {e}")
+            summary = self.history_manager.local_summary(middle)
+        self._initialize_model(history=self.history_manager.build(head, summary, tail))
+
+    def cancel(self):
+        """
+        Cancels the turn currently in flight for this session, if any.
+
+        The interrupted call returns an error message; the chat history is left
+        as it was before the turn, so the session can keep going.
+        """
+        self._cancelled = True
+        if self._pending is not None and not self._pending.done():
+            self._pending.cancel()
+
+    async def _await(self, awaitable, deadline: Optional[float]):
+        """
+        Awaits a single SDK call as a cancellable task, honouring the turn deadline.
+
+        Args:
+            awaitable: The SDK coroutine to run.
+            deadline: Absolute `time.monotonic()` deadline, or None.
+
+        Returns:
+            The result of the awaitable.
+
+        Raises:
+            asyncio.TimeoutError: If the deadline expires.
+            asyncio.CancelledError: If the call or the calling task is cancelled.
+        """
+        self._pending = asyncio.ensure_future(awaitable)
+        try:
+            if deadline is None:
+                return await self._pending
+            return await asyncio.wait_for(self._pending, max(deadline - time.monotonic(), 0))
+        finally:
+            self._pending = None
+
+    def _deadline(self, timeout: Optional[float]) -> Optional[float]:
+        """
+        Converts a relative timeout into an absolute deadline.
+
+        Args:
+            timeout: Timeout in seconds for this call; falls back to the instance default.
+
+        Returns:
+            The absolute deadline, or None if no timeout applies.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        return None if timeout is None else time.monotonic() + timeout
+
+    async def start_consultation(self, initial_text: str, timeout: Optional[float] = None) -> str:
+        """
+        Initiates a new consultation session with an initial user idea.
+
+        Args:
+            initial_text: The user's initial idea or draft prompt.
+            timeout: Optional deadline in seconds overriding the instance default.
+
+        Returns:
+            The AI's initial response to start the consultation.
+        """
+        started = time.perf_counter()
+        # Embedding may call the API: kept off the event loop
+        cached = await asyncio.to_thread(self._semantic_lookup, initial_text) if self.semantic_cache else None
+        if cached is not None:
+            self._record_turn(started, cache_hit=True)
+            return cached
+        reply = await self.chat(self._build_initial_message(initial_text), timeout=timeout)
+        if self.semantic_cache:
+            await asyncio.to_thread(self._semantic_store, initial_text, reply)
+        return reply
+
+    async def start_consultation_stream(self, initial_text: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of `start_consultation`.
+
+        Args:
+            initial_text: The user's initial idea or draft prompt.
+            timeout: Optional deadline in seconds overriding the instance default.
+
+        Yields:
+            Text chunks of the AI's initial response.
+        """
+        started = time.perf_counter()
+        cached = await asyncio.to_thread(self._semantic_lookup, initial_text) if self.semantic_cache else None
+        if cached is not None:
+            self.last_time_to_first_token = time.perf_counter() - started
+            self._record_turn(started, cache_hit=True, streamed=True)
+            yield cached
+            return
+        parts = []
+        async for chunk in self.chat_stream(self._build_initial_message(initial_text), timeout=timeout):
+            parts.append(chunk)
+            yield chunk
+        if self.semantic_cache:
+            await asyncio.to_thread(self._semantic_store, initial_text, "".join(parts))
+
+    async def start_fast_consultation(self, initial_text: str, timeout: Optional[float] = None) -> Tuple[str, Optional[ConsultationDraft]]:
+        """
+        Asynchronous counterpart of `PromptConsultant.start_fast_consultation`.
+
+        Args:
+            initial_text: The user's initial idea or draft prompt.
+            timeout: Optional deadline in seconds overriding the instance default.
+
+        Returns:
+            The reply as recorded in the history, and the parsed draft. The draft
+            is None if the call failed, timed out or was cancelled (the reply is
+            then an error message) or the model answered in free text.
+        """
+        self._cancelled = False
+        deadline = self._deadline(timeout)
+        started = time.perf_counter()
+        try:
+            await self._arefresh_context_cache()
+            user_content, contents = self._fast_contents(initial_text)
+            result = await self._await(
+                acall_with_policy(
+                    self.request_policy,
+                    lambda model: self._generate("agenerate", model, contents, self._fast_config(model)),
+                    self._turn_model(FINAL),
+                    quota_key=self.api_key,
+                    tokens=self._quota_tokens(contents),
+                ),
+                deadline,
+            )
+        except asyncio.TimeoutError:
+            self._record_turn(started, error=True)
+            return f"{ERROR_PREFIX} the request timed out.", None
+        except asyncio.CancelledError:
+            if not self._cancelled:
+                raise
+            self._record_turn(started, error=True)
+            return f"{ERROR_PREFIX} the request was cancelled.", None
+        except Exception as e:
+            self._record_turn(started, error=True)
+            return f"{ERROR_PREFIX} {str(e)}", None
+        response = result.response
+        reply, draft = self._fast_reply(response.text or "")
+        self._record_exchange(user_content, reply)
+        self._record_turn(started, response.usage_metadata, time_to_first_token=time.perf_counter() - started, retries=result.retries, model=result.model, phase=FINAL)
+        return reply, draft
+
+    async def chat(self, user_text: str, timeout: Optional[float] = None) -> str:
+        """
+        Sends a user message to the active chat session and awaits the response.
+
+        Args:
+            user_text: The user's message to send to the AI.
+            timeout: Optional deadline in seconds overriding the instance default.
+
+        Returns:
+            The AI's generated response as a string.
+            Returns an error message if the call fails, times out or is cancelled.
+        """
+        self._cancelled = False
+        deadline = self._deadline(timeout)
+        started = time.perf_counter()
+        phase = None
+        try:
+            await self._acompact_history(deadline)
+            phase = self._turn_phase(user_text)
+            cache_key = self._turn_cache_key(user_text, phase)
+            if cache_key:
+                cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+                if cached is not None:
+                    self._replay_cached_turn(user_text, cached)
+                    self._record_turn(started, cache_hit=True, phase=phase)
+                    return cached
+            await self._arefresh_context_cache()
+            user_content = types.Content(role="user", parts=[types.Part(text=user_text)])
+            contents = self._turn_contents(user_content)
+            turn_model = self._turn_model(phase)
+            recovered = False
+            while True:
+                try:
+                    result = await self._await(
+                        acall_with_policy(
+                            self.request_policy,
+                            lambda model: self._generate("agenerate", model, contents, self._request_config(model, phase)),
+                            turn_model,
+                            quota_key=self.api_key,
+                            tokens=self._quota_tokens(contents),
+                        ),
+                        deadline,
+                    )
+                except Exception as e:
+                    # The cached system prompt expired or was deleted: retry once on a new one
+                    if recovered or not await self._arecover_context_cache(e):
+                        raise
+                    recovered = True
+                    continue
+                if phase != INTERVIEW or not is_truncated(result.response):
+                    break
+                # The model wrote more than an interview reply (usually the prompt): redo it as a final turn
+                if self.debug:
+                    print("[DEBUG] Interview reply hit the output cap, retrying as a final turn")
+                phase = FINAL
+                turn_model = self._turn_model(phase)
+            response = result.response
+            self._record_exchange(user_content, response.text or "")
+            self._record_turn(started, response.usage_metadata, time_to_first_token=time.perf_counter() - started, retries=result.retries, model=result.model, phase=phase)
+            if cache_key and response.text and result.model == turn_model:
+                await asyncio.to_thread(self.response_cache.put, cache_key, response.text)
+            return response.text
+        except asyncio.TimeoutError:
+            self._record_turn(started, error=True, phase=phase)
+            return f"{ERROR_PREFIX} the request timed out."
+        except asyncio.CancelledError:
+            # Only swallow cancellations requested through cancel(); propagate task cancellation
+            if not self._cancelled:
+                raise
+            self._record_turn(started, error=True, phase=phase)
+            return f"{ERROR_PREFIX} the request was cancelled."
+        except Exception as e:
+            self._record_turn(started, error=True, phase=phase)
+            return f"{ERROR_PREFIX} {str(e)}"
+
+    async def chat_stream(self, user_text: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Sends a user message and yields the response incrementally as chunks arrive.
+
+        The time elapsed until the first non-empty chunk is stored in
+        `last_time_to_first_token`. The deadline applies to the whole stream.
+
+        Args:
+            user_text: The user's message to send to the AI.
+            timeout: Optional deadline in seconds overriding the instance default.
+
+        Yields:
+            Text chunks of the AI's response.
+            Yields an error message if the call fails, times out or is cancelled.
+        """
+        self._cancelled = False
+        self.last_time_to_first_token = None
+        deadline = self._deadline(timeout)
+        started = time.perf_counter()
+        parts = []
+        usage = None
+        model, retries, phase = self.model_name, 0, None
+        try:
+            await self._acompact_history(deadline)
+            phase = self._turn_phase(user_text)
+            cache_key = self._turn_cache_key(user_text, phase)
+            if cache_key:
+                cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+                if cached is not None:
+                    self._replay_cached_turn(user_text, cached)
+                    self.last_time_to_first_token = time.perf_counter() - started
+                    self._record_turn(started, cache_hit=True, streamed=True, phase=phase)
+                    yield cached
+                    return
+            await self._arefresh_context_cache()
+            user_content = types.Content(role="user", parts=[types.Part(text=user_text)])
+            contents = self._turn_contents(user_content)
+            request = contents
+            turn_model = model = self._turn_model(phase)
+            recovered = False
+            while True:
+                iterator = astream_with_policy(
+                    self.request_policy,
+                    lambda model: self._generate("agenerate_stream", model, request, self._request_config(model, phase)),
+                    turn_model,
+                    quota_key=self.api_key,
+                    tokens=self._quota_tokens(request),
+                )
+                truncated = False
+                retry = False
+                while not self._cancelled:
+                    try:
+                        chunk, model, retries = await self._await(iterator.__anext__(), deadline)
+                    except StopAsyncIteration:
+                        break
+                    except Exception as e:
+                        # The cached system prompt expired or was deleted: retry once on a new one,
+                        # unless part of the reply was already sent
+                        if parts or recovered or not await self._arecover_context_cache(e):
+                            raise
+                        recovered = retry = True
+                        break
+                    usage = chunk.usage_metadata or usage
+                    truncated = is_truncated(chunk)
+                    if not chunk.text:
+                        continue
+                    if self.last_time_to_first_token is None:
+                        self.last_time_to_first_token = time.perf_counter() - started
+                        if self.debug:
+                            print(f"[DEBUG] Time to first token: {self.last_time_to_first_token:.3f}s")
+                    parts.append(chunk.text)
+                    yield chunk.text
+                await iterator.aclose()
+                if retry:
+                    continue
+                if self._cancelled or phase != INTERVIEW or not truncated:
+                    break
+                # Part of the reply is already sent: complete it as a final turn
+                if self.debug:
+                    print("[DEBUG] Interview reply hit the output cap, continuing as a final turn")
+                phase = FINAL
+                turn_model = self._turn_model(phase)
+                request = contents + [
+                    types.Content(role="model", parts=[types.Part(text="".join(parts))]),
+                    types.Content(role="user", parts=[types.Part(text=self.translation_manager.get("continue_message"))]),
+                ]
+            if self._cancelled:
+                self._record_turn(started, error=True, streamed=True, model=model, retries=retries, phase=phase)
+                return
+            reply = "".join(parts)
+            self._record_exchange(user_content, reply)
+            self._record_turn(started, usage, time_to_first_token=self.last_time_to_first_token, streamed=True, model=model, retries=retries, phase=phase)
+            if cache_key and parts and model == turn_model:
+                await asyncio.to_thread(self.response_cache.put, cache_key, reply)
+        except asyncio.TimeoutError:
+            self._record_turn(started, error=True, streamed=True, model=model, retries=retries, phase=phase)
+            yield f"{ERROR_PREFIX} the request timed out."
+        except asyncio.CancelledError:
+            if not self._cancelled:
+                raise
+            self._record_turn(started, error=True, streamed=True, model=model, retries=retries, phase=phase)
+            yield f"{ERROR_PREFIX} the request was cancelled."
+        except Exception as e:
+            self._record_turn(started, error=True, streamed=True, model=model, retries=retries, phase=phase)
+            yield f"{ERROR_PREFIX} {str(e)}"
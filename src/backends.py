@@ -0,0 +1,433 @@
+"""
+This module provides the LLM backend layer behind PromptConsultant.
+
+A backend generates replies (plain, streamed, sync and async), counts tokens
+and lists its models. Two implementations are available:
+
+- GeminiBackend, on top of a `genai.Client`;
+- OpenAICompatibleBackend, for local OpenAI-compatible servers such as
+  llama.cpp (`llama-server`), vLLM or Ollama.
+
+The backend is chosen by the model name: `local:qwen2.5-7b-instruct` is sent
+to the backend named `local`, unprefixed names go to Gemini. Backends are
+declared in the `backends` section of the configuration; a `local` backend
+pointing at `http://127.0.0.1:8080/v1` (llama.cpp's default) is always available.
+
+Conversations are kept as `types.Content` lists whatever the backend, so the
+history, caches and metrics work the same way for every model, and a session
+can switch backend between turns (e.g. interview on a local model, final
+prompt on Gemini).
+"""
+import json
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from google import genai
+from google.genai import errors, types
+
+from src.client_pool import get_async_client, loop_local
+from src.history import estimate_tokens
+from src.model_registry import ModelInfo
+
+GEMINI = "gemini"
+DEFAULT_BACKENDS = {"local": {"type": "openai", "base_url": "http://127.0.0.1:8080/v1"}}
+
+def split_model_name(model_name: str) -> Tuple[str, str]:
+    """
+    Splits a model name into backend name and backend-specific model name.
+
+    Args:
+        model_name: A model name, optionally prefixed with `<backend>:`.
+
+    Returns:
+        The backend name (GEMINI if there is no prefix) and the model name.
+    """
+    backend, sep, model = model_name.partition(":")
+    if not sep:
+        return GEMINI, model_name
+    return backend, model
+
+class ChatSession:
+    """
+    The history of a conversation, independent of the backend answering it.
+
+    Keeps both the comprehensive history (every turn) and the curated one
+    (turns with a valid reply), like the SDK's chat sessions.
+    """
+    def __init__(self, history: Optional[List[types.Content]] = None):
+        """
+        Initializes the session.
+
+        Args:
+            history: Optional prior turns to seed the session with.
+        """
+        self._comprehensive_history: List[types.Content] = list(history or [])
+        self._curated_history: List[types.Content] = list(history or [])
+
+    def record_history(self, user_input: types.Content, model_output: List[types.Content], is_valid: bool):
+        """
+        Appends a finished exchange.
+
+        Args:
+            user_input: The user's message.
+            model_output: The model's reply contents; an empty reply is recorded
+                as an empty model content so the history keeps alternating.
+            is_valid: Whether the exchange belongs in the curated history.
+        """
+        contents = [user_input] + (model_output or [types.Content(role="model", parts=[])])
+        self._comprehensive_history.extend(contents)
+        if is_valid:
+            self._curated_history.extend(contents)
+
+    def get_history(self, curated: bool = False) -> List[types.Content]:
+        """
+        Returns the history.
+
+        Args:
+            curated: If True, returns only the exchanges with a valid reply.
+
+        Returns:
+            The list of contents.
+        """
+        return self._curated_history if curated else self._comprehensive_history
+
+class LLMBackend:
+    """
+    Interface of a model provider.
+
+    Model names passed to the methods are backend-specific (without prefix).
+    Responses are returned as `types.GenerateContentResponse` whatever the provider.
+    """
+    name = ""
+    # Whether the system prompt can be stored with Gemini's context caching
+    supports_context_cache = False
+
+    def generate(self, model: str, contents: List[types.Content], config: types.GenerateContentConfig) -> types.GenerateContentResponse:
+        """
+        Generates a reply.
+
+        Args:
+            model: The model name.
+            contents: The conversation, ending with the user's message.
+            config: The generation config (system instruction, temperature, limits, timeout).
+
+        Returns:
+            The response.
+        """
+        raise NotImplementedError
+
+    def generate_stream(self, model: str, contents: List[types.Content], config: types.GenerateContentConfig) -> Iterator[types.GenerateContentResponse]:
+        """
+        Generates a reply as a stream of partial responses. Same arguments as `generate`.
+        """
+        raise NotImplementedError
+
+    async def agenerate(self, model: str, contents: List[types.Content], config: types.GenerateContentConfig) -> types.GenerateContentResponse:
+        """
+        Asynchronous counterpart of `generate`.
+        """
+        raise NotImplementedError
+
+    async def agenerate_stream(self, model: str, contents: List[types.Content], config: types.GenerateContentConfig) -> AsyncIterator[types.GenerateContentResponse]:
+        """
+        Asynchronous counterpart of `generate_stream`: resolves to an async iterator.
+        """
+        raise NotImplementedError
+
+    def count_tokens(self, model: str, contents: List[types.Content]) -> int:
+        """
+        Counts the tokens of a list of contents. Defaults to the local estimate.
+
+        Args:
+            model: The model name.
+            contents: The contents to measure.
+
+        Returns:
+            The number of tokens.
+        """
+        return estimate_tokens(contents)
+
+    def list_models(self) -> List[ModelInfo]:
+        """
+        Lists the models served by the backend, with names prefixed by the backend name.
+
+        Returns:
+            The ModelInfo of each model.
+        """
+        raise NotImplementedError
+
+    def warm_up(self, model: str):
+        """
+        Opens the connection ahead of the first request. Errors are raised to the caller.
+
+        Args:
+            model: The model about to be used.
+        """
+
+class GeminiBackend(LLMBackend):
+    """
+    Backend for the Google Gemini API.
+    """
+    name = GEMINI
+    supports_context_cache = True
+
+    def __init__(self, client: genai.Client):
+        """
+        Initializes the backend.
+
+        Args:
+            client: The Gemini client to send requests with.
+        """
+        self.client = client
+
+    def generate(self, model, contents, config):
+        return self.client.models.generate_content(model=model, contents=contents, config=config)
+
+    def generate_stream(self, model, contents, config):
+        return self.client.models.generate_content_stream(model=model, contents=contents, config=config)
+
+    async def agenerate(self, model, contents, config):
+        return await get_async_client(self.client).models.generate_content(model=model, contents=contents, config=config)
+
+    async def agenerate_stream(self, model, contents, config):
+        return await get_async_client(self.client).models.generate_content_stream(model=model, contents=contents, config=config)
+
+    def count_tokens(self, model, contents):
+        return self.client.models.count_tokens(model=model, contents=contents).total_tokens
+
+    def list_models(self):
+        return [ModelInfo.from_model(model) for model in self.client.models.list()]
+
+    def warm_up(self, model):
+        self.client.models.get(model=model)
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Backend for servers implementing the OpenAI chat completions API.
+
+    Works with llama.cpp's `llama-server`, vLLM, Ollama and similar local
+    servers. Errors are raised as the SDK's `errors.APIError`, so the request
+    policy retries and falls back exactly as with Gemini.
+    """
+    supports_context_cache = False
+
+    def __init__(self, name: str, base_url: str, api_key: Optional[str] = None, timeout: float = 120.0):
+        """
+        Initializes the backend. No connection is made until the first request.
+
+        Args:
+            name: The backend name, used as model prefix.
+            base_url: The API root, e.g. `http://127.0.0.1:8080/v1`.
+            api_key: Optional bearer token.
+            timeout: Default request timeout in seconds.
+        """
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._http = httpx.Client(base_url=self.base_url, headers=headers, timeout=timeout)
+        self._http_options = {"base_url": self.base_url, "headers": headers, "timeout": timeout}
+        # Async connections belong to the event loop that opened them: one client per loop
+        self._ahttp_clients: Dict[Any, httpx.AsyncClient] = {}
+        self._ahttp_lock = threading.Lock()
+
+    def _ahttp(self) -> httpx.AsyncClient:
+        """
+        Returns the async HTTP client of the running event loop.
+        """
+        with self._ahttp_lock:
+            return loop_local(self._ahttp_clients, lambda: httpx.AsyncClient(**self._http_options))
+
+    @staticmethod
+    def _text(content: types.Content) -> str:
+        return "".join(part.text or "" for part in content.parts or [] if not part.thought)
+
+    def _payload(self, model: str, contents: List[types.Content], config: types.GenerateContentConfig, stream: bool) -> Dict[str, Any]:
+        """
+        Converts a Gemini-style request into a chat completions request body.
+        """
+        messages = []
+        if config.system_instruction:
+            system = config.system_instruction
+            messages.append({"role": "system", "content": system if isinstance(system, str) else self._text(system)})
+        for content in contents:
+            messages.append({"role": "assistant" if content.role == "model" else "user", "content": self._text(content)})
+        payload: Dict[str, Any] = {"model": model, "messages": messages, "stream": stream}
+        if config.temperature is not None:
+            payload["temperature"] = config.temperature
+        if config.max_output_tokens:
+            payload["max_tokens"] = config.max_output_tokens
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    @staticmethod
+    def _timeout(config: types.GenerateContentConfig) -> Any:
+        """
+        Returns the request timeout set through `http_options`, or httpx's "use the client default".
+        """
+        if config.http_options and config.http_options.timeout:
+            return config.http_options.timeout / 1000
+        return httpx.USE_CLIENT_DEFAULT
+
+    @staticmethod
+    def _response(text: str, usage: Optional[Dict[str, Any]], finish_reason: Optional[str] = None) -> types.GenerateContentResponse:
+        """
+        Builds a GenerateContentResponse from a completion's text and usage.
+        """
+        candidate = types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))
+        if finish_reason:
+            candidate.finish_reason = types.FinishReason.MAX_TOKENS if finish_reason == "length" else types.FinishReason.STOP
+        usage_metadata = None
+        if usage:
+            usage_metadata = types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=usage.get("prompt_tokens"),
+                candidates_token_count=usage.get("completion_tokens"),
+                total_token_count=usage.get("total_tokens"),
+            )
+        return types.GenerateContentResponse(candidates=[candidate], usage_metadata=usage_metadata)
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response, body: Optional[bytes] = None):
+        """
+        Raises `errors.APIError` (ClientError or ServerError) for an error status.
+        """
+        if response.status_code < 400:
+            return
+        raw = body if body is not None else response.content
+        try:
+            details = json.loads(raw)
+        except ValueError:
+            details = {"error": {"message": raw.decode("utf-8", "replace")}}
+        if isinstance(details, dict) and isinstance(details.get("error"), str):
+            details = {"error": {"message": details["error"]}}
+        error_class = errors.ServerError if response.status_code >= 500 else errors.ClientError
+        raise error_class(response.status_code, details, response)
+
+    def _chunk(self, line: str) -> Optional[types.GenerateContentResponse]:
+        """
+        Parses one server-sent event line of a streamed completion.
+
+        Returns:
+            The partial response, or None for keep-alives, `[DONE]` and empty deltas.
+        """
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if not data or data == "[DONE]":
+            return None
+        event = json.loads(data)
+        choices = event.get("choices") or [{}]
+        text = (choices[0].get("delta") or {}).get("content") or ""
+        if not text and not event.get("usage"):
+            return None
+        return self._response(text, event.get("usage"), choices[0].get("finish_reason"))
+
+    def generate(self, model, contents, config):
+        response = self._http.post("/chat/completions", json=self._payload(model, contents, config, False), timeout=self._timeout(config))
+        self._raise_for_status(response)
+        body = response.json()
+        choice = (body.get("choices") or [{}])[0]
+        return self._response((choice.get("message") or {}).get("content") or "", body.get("usage"), choice.get("finish_reason"))
+
+    def generate_stream(self, model, contents, config):
+        with self._http.stream("POST", "/chat/completions", json=self._payload(model, contents, config, True), timeout=self._timeout(config)) as response:
+            if response.status_code >= 400:
+                self._raise_for_status(response, response.read())
+            for line in response.iter_lines():
+                chunk = self._chunk(line)
+                if chunk is not None:
+                    yield chunk
+
+    async def agenerate(self, model, contents, config):
+        response = await self._ahttp().post("/chat/completions", json=self._payload(model, contents, config, False), timeout=self._timeout(config))
+        self._raise_for_status(response)
+        body = response.json()
+        choice = (body.get("choices") or [{}])[0]
+        return self._response((choice.get("message") or {}).get("content") or "", body.get("usage"), choice.get("finish_reason"))
+
+    async def agenerate_stream(self, model, contents, config):
+        async def chunks():
+            async with self._ahttp().stream("POST", "/chat/completions", json=self._payload(model, contents, config, True), timeout=self._timeout(config)) as response:
+                if response.status_code >= 400:
+                    self._raise_for_status(response, await response.aread())
+                async for line in response.aiter_lines():
+                    chunk = self._chunk(line)
+                    if chunk is not None:
+                        yield chunk
+        return chunks()
+
+    def list_models(self):
+        response = self._http.get("/models")
+        self._raise_for_status(response)
+        return [
+            ModelInfo(name=f"{self.name}:{model['id']}", display_name=model["id"], supported_actions=["generateContent"])
+            for model in response.json().get("data", [])
+        ]
+
+    def warm_up(self, model):
+        self._raise_for_status(self._http.get("/models"))
+
+_local_backends: Dict[Tuple[str, str, Optional[str]], OpenAICompatibleBackend] = {}
+_lock = threading.Lock()
+
+def get_local_backend(name: str, settings: Dict[str, Any]) -> OpenAICompatibleBackend:
+    """
+    Returns the shared OpenAI-compatible backend for the given settings, creating it on first use.
+
+    Consultants using the same server share its connection pools.
+
+    Args:
+        name: The backend name.
+        settings: The backend settings (`base_url`, optional `api_key` and `timeout`).
+
+    Returns:
+        The backend.
+    """
+    key = (name, settings["base_url"], settings.get("api_key"))
+    with _lock:
+        backend = _local_backends.get(key)
+        if backend is None:
+            backend = OpenAICompatibleBackend(name, settings["base_url"], api_key=settings.get("api_key"), timeout=float(settings.get("timeout", 120.0)))
+            _local_backends[key] = backend
+        return backend
+
+class BackendRouter:
+    """
+    Resolves model names to backends.
+    """
+    def __init__(self, client: genai.Client, settings: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Initializes the router.
+
+        Args:
+            client: The Gemini client used for unprefixed model names.
+            settings: The `backends` section of the configuration, mapping backend
+                names to settings with `type` ("openai"), `base_url`, and optional
+                `api_key` and `timeout`. Merged over DEFAULT_BACKENDS.
+        """
+        self.gemini = GeminiBackend(client)
+        self.settings = {**DEFAULT_BACKENDS, **(settings or {})}
+
+    def resolve(self, model_name: str) -> Tuple[LLMBackend, str]:
+        """
+        Finds the backend serving a model.
+
+        Args:
+            model_name: The model name, optionally prefixed with `<backend>:`.
+
+        Returns:
+            The backend and the model name to pass to it.
+
+        Raises:
+            ValueError: If the prefix names an unknown backend.
+        """
+        name, model = split_model_name(model_name)
+        if name == GEMINI:
+            return self.gemini, model
+        settings = self.settings.get(name)
+        if settings is None:
+            raise ValueError(f"Unknown backend '{name}' in model name '{model_name}'.")
+        if settings.get("type", "openai") != "openai":
+            raise ValueError(f"Unsupported type '{settings['type']}' for backend '{name}'.")
+        return get_local_backend(name, settings), model
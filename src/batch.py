@@ -0,0 +1,240 @@
+"""
+This module implements headless batch refinement of prompt ideas.
+
+Ideas are read from a JSONL file (or stdin) and run through
+AsyncPromptConsultant sessions with bounded concurrency. Each finished
+consultation is appended to an output JSONL file as soon as it completes,
+so the output doubles as a checkpoint: re-running the same batch skips every
+idea already recorded there.
+
+Input lines are either plain text (the initial idea) or JSON objects:
+    {"id": "seo-1", "idea": "A prompt to write SEO articles", "answers": ["Bloggers", "Friendly tone"]}
+`id` and `answers` are optional. Without an `id`, one is derived from the content.
+Invalid lines (malformed JSON, no `idea`) are recorded as failed results
+without stopping the batch. They are only reported once: a resumed run skips
+them like completed ideas, until the line itself is changed.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.agent import is_error_reply
+from src.async_agent import AsyncPromptConsultant
+from src.translation import TranslationManager
+
+def parse_record(line: str) -> Optional[Dict]:
+    """
+    Parses one input line into a batch record.
+
+    Args:
+        line: A raw input line, either plain text or a JSON object.
+
+    Returns:
+        A dictionary with `id`, `idea` and `answers`, or None for blank lines.
+
+    Raises:
+        ValueError: If a line is malformed JSON, has no `idea` or its `answers` aren't a list.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        data = json.loads(line)
+    else:
+        data = {"idea": line}
+    if not data.get("idea"):
+        raise ValueError(f"Batch record without 'idea': {line}")
+    answers = data.get("answers") or []
+    if not isinstance(answers, list):
+        raise ValueError(f"Batch record with 'answers' not a list: {line}")
+    record_id = data.get("id")
+    if record_id is None:
+        digest = hashlib.sha256(json.dumps([data["idea"], answers], ensure_ascii=False).encode("utf-8"))
+        record_id = digest.hexdigest()[:16]
+    return {"id": str(record_id), "idea": data["idea"], "answers": list(answers)}
+
+def read_records(lines: Iterable[str]) -> List[Dict]:
+    """
+    Parses all input lines into batch records, skipping blank lines.
+
+    A line that can't be parsed becomes a record with an `error`, so it is
+    reported in the output instead of aborting the whole batch. Its id is
+    derived from the line, so a corrected line is a new record.
+
+    Args:
+        lines: The input lines.
+
+    Returns:
+        The list of parsed records, in input order.
+    """
+    records = []
+    for number, line in enumerate(lines, start=1):
+        try:
+            record = parse_record(line)
+        except ValueError as e:
+            record_id = hashlib.sha256(line.strip().encode("utf-8")).hexdigest()[:16]
+            record = {"id": record_id, "idea": None, "answers": [], "error": f"Invalid input on line {number}: {e}"}
+        if record is not None:
+            records.append(record)
+    return records
+
+def load_completed_ids(output_path: str) -> Set[str]:
+    """
+    Reads the ids of the records already completed in an output file.
+
+    Args:
+        output_path: The output JSONL file of a previous (possibly interrupted) run.
+
+    Returns:
+        The set of completed record ids: successful records and invalid input
+        lines, which would fail the same way again. Records whose consultation
+        failed are not included, so they are retried on resume.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            if result.get("ok") or result.get("invalid"):
+                completed.add(result["id"])
+    return completed
+
+class BatchRunner:
+    """
+    Runs batch consultations concurrently and streams the results to a JSONL file.
+    """
+    def __init__(self, api_key: str, model_name: str, translation_manager: TranslationManager, concurrency: int = 8, timeout: Optional[float] = None, consultant_options: Optional[Dict[str, Any]] = None):
+        """
+        Initializes the BatchRunner.
+
+        Args:
+            api_key: The API key for authenticating with the Google Gemini API.
+            model_name: The name of the Gemini model to use.
+            translation_manager: The TranslationManager providing the system prompt.
+            concurrency: Maximum number of consultations running at the same time.
+            timeout: Deadline in seconds for each consultation turn, retries
+                included. None means no deadline.
+            consultant_options: Extra keyword arguments for every AsyncPromptConsultant,
+                such as `response_cache` or `history_manager`.
+        """
+        self.api_key = api_key
+        self.model_name = model_name
+        self.translation_manager = translation_manager
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.consultant_options = consultant_options or {}
+
+    async def run_record(self, record: Dict) -> Dict:
+        """
+        Runs a single scripted consultation: the initial idea followed by each answer.
+
+        Stops at the first failed turn. Records that failed to parse are
+        reported without calling the model.
+
+        Args:
+            record: A record as returned by `read_records`.
+
+        Returns:
+            The result dictionary written to the output file.
+        """
+        if record.get("error"):
+            return {"id": record["id"], "idea": None, "model": self.model_name, "ok": False, "invalid": True, "error": record["error"], "turns": [], "final": None}
+        # Building a consultant may touch the caches on disk: kept off the event loop
+        consultant = await asyncio.to_thread(
+            AsyncPromptConsultant,
+            api_key=self.api_key,
+            model_name=self.model_name,
+            translation_manager=self.translation_manager,
+            timeout=self.timeout,
+            **self.consultant_options,
+        )
+        turns = []
+        reply = await consultant.start_consultation(record["idea"])
+        turns.append({"user": record["idea"], "consultant": reply})
+        for answer in record["answers"]:
+            if is_error_reply(reply):
+                break
+            reply = await consultant.chat(answer)
+            turns.append({"user": answer, "consultant": reply})
+        ok = not is_error_reply(reply)
+        return {
+            "id": record["id"],
+            "idea": record["idea"],
+            "model": self.model_name,
+            "ok": ok,
+            "error": None if ok else reply,
+            "turns": turns,
+            "final": reply if ok else None,
+        }
+
+    async def run(self, records: List[Dict], output_path: str) -> Dict[str, int]:
+        """
+        Runs all records with bounded concurrency, appending each result on completion.
+
+        Args:
+            records: The records to process.
+            output_path: The output JSONL file, opened in append mode.
+
+        Returns:
+            Counters with the number of `ok` and `failed` records.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for record in records:
+            queue.put_nowait(record)
+        counts = {"ok": 0, "failed": 0}
+
+        with open(output_path, "a", encoding="utf-8") as out:
+            async def worker():
+                while True:
+                    try:
+                        record = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    result = await self.run_record(record)
+                    counts["ok" if result["ok"] else "failed"] += 1
+                    # Flush per line so an interruption loses at most the in-flight records
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out.flush()
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(records)))))
+        return counts
+
+def run_batch(input_path: str, output_path: str, api_key: str, model_name: str, translation_manager: TranslationManager, concurrency: int = 8, timeout: Optional[float] = None, resume: bool = True, consultant_options: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """
+    Reads the input records and runs them, skipping completed ones when resuming.
+
+    Args:
+        input_path: Path of the input JSONL file, or "-" to read from stdin.
+        output_path: Path of the output JSONL file.
+        api_key: The API key for authenticating with the Google Gemini API.
+        model_name: The name of the Gemini model to use.
+        translation_manager: The TranslationManager providing the system prompt.
+        concurrency: Maximum number of consultations running at the same time.
+        timeout: Deadline in seconds for each consultation turn, retries included.
+        resume: If True, skips records already completed in the output file.
+        consultant_options: Extra keyword arguments for every AsyncPromptConsultant.
+
+    Returns:
+        Counters with the number of `ok`, `failed` and `skipped` records.
+    """
+    if input_path == "-":
+        records = read_records(sys.stdin)
+    else:
+        with open(input_path, "r", encoding="utf-8") as f:
+            records = read_records(f)
+
+    completed = load_completed_ids(output_path) if resume else set()
+    pending = [r for r in records if r["id"] not in completed]
+
+    runner = BatchRunner(api_key, model_name, translation_manager, concurrency=concurrency, timeout=timeout, consultant_options=consultant_options)
+    counts = asyncio.run(runner.run(pending, output_path)) if pending else {"ok": 0, "failed": 0}
+    counts["skipped"] = len(records) - len(pending)
+    return counts
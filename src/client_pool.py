@@ -0,0 +1,105 @@
+"""
+This module provides a process-wide pool of Google Gemini clients.
+
+A `genai.Client` owns the underlying HTTP connection pools (sync and async),
+so sharing one client per API key lets every consultant in the process reuse
+the same TLS connections instead of opening new ones per session.
+
+Async connections belong to the event loop that opened them and fail with
+"Event loop is closed" once that loop is gone, e.g. on the second
+`asyncio.run()` of a process (a second /evaluate, a batch run after another).
+The async side of the pool is therefore kept per event loop: see
+`get_async_client`.
+"""
+import asyncio
+import copy
+import threading
+import weakref
+from typing import Callable, Dict, MutableMapping, TypeVar
+
+from google import genai
+from google.genai._api_client import AsyncHttpxClient
+from google.genai.client import AsyncClient
+
+T = TypeVar("T")
+
+_clients: Dict[str, genai.Client] = {}
+_async_clients: "weakref.WeakKeyDictionary[genai.Client, Dict[asyncio.AbstractEventLoop, AsyncClient]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+def get_client(api_key: str) -> genai.Client:
+    """
+    Returns the shared Gemini client for the given API key, creating it on first use.
+
+    Args:
+        api_key: The API key for authenticating with the Google Gemini API.
+
+    Returns:
+        The `genai.Client` shared by all callers using this API key.
+
+    Raises:
+        ValueError: If the API key is not provided.
+    """
+    if not api_key:
+        raise ValueError("API Key is required to create a Gemini client.")
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = genai.Client(api_key=api_key)
+            _clients[api_key] = client
+        return client
+
+def loop_local(clients: MutableMapping[asyncio.AbstractEventLoop, T], factory: Callable[[], T]) -> T:
+    """
+    Returns the entry of the running event loop, creating it with `factory` on first use.
+
+    Entries of closed loops are dropped. The caller holds the lock guarding `clients`.
+
+    Args:
+        clients: Per-loop entries, e.g. async HTTP clients.
+        factory: Builds the entry of a new loop.
+
+    Returns:
+        The entry of the running loop.
+
+    Raises:
+        RuntimeError: If no event loop is running.
+    """
+    loop = asyncio.get_running_loop()
+    for closed in [other for other in clients if other.is_closed()]:
+        del clients[closed]
+    entry = clients.get(loop)
+    if entry is None:
+        entry = clients[loop] = factory()
+    return entry
+
+def _new_async_client(client: genai.Client) -> AsyncClient:
+    """
+    Builds an async API over the settings of `client` with a transport of its own.
+    """
+    api_client = copy.copy(client._api_client)
+    api_client._async_httpx_client = AsyncHttpxClient(**api_client._async_httpx_client_args)
+    api_client._aiohttp_sessions = {}
+    return AsyncClient(api_client)
+
+def get_async_client(client: genai.Client) -> AsyncClient:
+    """
+    Returns the async API of a client for the running event loop.
+
+    The first event loop using a client gets `client.aio`; every other loop
+    gets its own transport over the same settings, so sessions of one loop
+    still share their connections.
+
+    Args:
+        client: The Gemini client.
+
+    Returns:
+        The `AsyncClient` to use from the running loop.
+
+    Raises:
+        RuntimeError: If no event loop is running.
+    """
+    with _lock:
+        first = client not in _async_clients
+        loops = _async_clients.setdefault(client, {})
+        return loop_local(loops, (lambda: client.aio) if first else (lambda: _new_async_client(client)))
@@ -0,0 +1,94 @@
+"""
+This module compares models on the same conversation turn.
+
+Each model gets its own fork of the current session (same history, same
+system prompt) and the forks answer the next turn concurrently, so comparing
+N models takes about as long as the slowest one instead of N sequential
+sessions. The forks are kept, so the caller can continue the conversation
+with the reply it prefers.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from src.agent import ERROR_PREFIX, PromptConsultant, is_error_reply
+
+@dataclass
+class ComparisonResult:
+    """
+    The reply of one model to the compared turn.
+    """
+    model: str
+    consultant: Optional[PromptConsultant] = None
+    reply: str = ""
+    wall_time: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    response_tokens: Optional[int] = None
+    thinking_tokens: Optional[int] = None
+    done: bool = False
+
+    @property
+    def error(self) -> bool:
+        """True if the model failed to answer."""
+        return self.done and is_error_reply(self.reply)
+
+def parse_models(spec: str) -> List[str]:
+    """
+    Parses a comma-separated list of model names, dropping blanks and duplicates.
+
+    Args:
+        spec: The list, e.g. "gemini-2.5-flash, gemini-2.5-pro".
+
+    Returns:
+        The model names, in order.
+    """
+    models: List[str] = []
+    for name in spec.split(","):
+        name = name.strip()
+        if name and name not in models:
+            models.append(name)
+    return models
+
+def compare_models(consultant: PromptConsultant, models: List[str], user_text: str, first_turn: bool = False, on_update: Optional[Callable[[List[ComparisonResult]], None]] = None) -> List[ComparisonResult]:
+    """
+    Sends the same turn to several models concurrently, each on a fork of the session.
+
+    Args:
+        consultant: The session to fork. It is not modified.
+        models: The models to compare.
+        user_text: The user's message, or the initial idea if `first_turn` is True.
+        first_turn: If True, the turn starts the consultation.
+        on_update: Optional callback receiving all results (in the order of
+            `models`) when the turn is sent and every time a model finishes.
+
+    Returns:
+        The results, in the order of `models`. Each holds the forked consultant,
+        ready to continue the conversation.
+    """
+    results = [ComparisonResult(model=model) for model in models]
+
+    def run(result: ComparisonResult) -> ComparisonResult:
+        started = time.perf_counter()
+        try:
+            # Forked in the worker, so sessions needing a context cache lookup are built concurrently too
+            fork = result.consultant = consultant.fork(result.model)
+            result.reply = fork.start_consultation(user_text) if first_turn else fork.chat(user_text)
+            metrics = fork.last_turn_metrics
+            if metrics is not None:
+                result.prompt_tokens = metrics.prompt_tokens
+                result.response_tokens = metrics.response_tokens
+                result.thinking_tokens = metrics.thinking_tokens
+        except Exception as e:
+            result.reply = f"{ERROR_PREFIX} {str(e)}"
+        result.wall_time = time.perf_counter() - started
+        result.done = True
+        return result
+
+    if on_update:
+        on_update(results)
+    with ThreadPoolExecutor(max_workers=len(results) or 1, thread_name_prefix="compare") as pool:
+        for _ in as_completed([pool.submit(run, result) for result in results]):
+            if on_update:
+                on_update(results)
+    return results
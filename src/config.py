@@ -2,11 +2,29 @@
 This module provides the ConfigManager class for handling application configuration,
 including API keys, selected models, and language preferences.
 
-Configurations are stored and retrieved from a `config.json` file.
+Configurations are stored and retrieved from a `config.json` file, which may be
+shared by several processes (interactive sessions, batch runs):
+
+- Writes are atomic: the new content is written to a temporary file, fsynced
+  and renamed over `config.json`, so readers never see a partial file.
+- Each write holds an advisory lock on `config.json.lock` and is applied on top
+  of the latest content on disk, so concurrent processes don't lose each
+  other's updates.
+- Several changes can be grouped in a single write with `transaction()`.
+- Reads reload the file only when its modification time, size or inode changed.
 """
 import json
 import os
-from typing import Optional
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 CONFIG_FILE = "config.json"
 
@@ -17,11 +35,22 @@ class ConfigManager:
     This includes loading, saving, and retrieving various configuration parameters
     such as API keys, model names, and language settings from a JSON file.
     """
-    def __init__(self):
+    def __init__(self, path: Optional[str] = None):
         """
         Initializes the ConfigManager by loading the configuration from `config.json`.
+
+        Args:
+            path: Path of the configuration file. Defaults to `config.json` in the project root.
         """
-        self.config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), CONFIG_FILE)
+        self.config_path = path or os.path.join(os.path.dirname(os.path.dirname(__file__)), CONFIG_FILE)
+        self.lock_path = self.config_path + ".lock"
+        # Changes not yet written to disk, and whether the file is to be cleared first
+        self._pending: Dict[str, Any] = {}
+        self._clear_pending = False
+        self._depth = 0
+        self._lock = threading.RLock()
+        # (mtime, size, inode) of the file the configuration was last read from
+        self._signature: Optional[Tuple[int, int, int]] = None
         self.config = self._load_config()
 
     def _load_config(self) -> dict:
@@ -36,12 +65,102 @@ class ConfigManager:
         """
         if not os.path.exists(self.config_path):
             self._create_empty_config()
-            return {}
+        return self._read_config()
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        """
+        Returns the modification time, size and inode of `config.json`, or None if it doesn't exist.
+        """
+        try:
+            st = os.stat(self.config_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _read_config(self) -> dict:
+        """
+        Reads `config.json` and records its signature.
+
+        Returns:
+            The configuration on disk, or an empty dictionary if the file is missing or invalid.
+        """
+        self._signature = self._file_signature()
         try:
             with open(self.config_path, "r") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+                config = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
             return {}
+        return config if isinstance(config, dict) else {}
+
+    def _get(self, key: str, default: Any = None) -> Any:
+        """
+        Reads a setting, reloading the file first if another process changed it.
+
+        Changes pending in an open transaction take precedence over the file.
+
+        Args:
+            key: The configuration key.
+            default: The value returned if the key is not set.
+
+        Returns:
+            The value of the setting.
+        """
+        with self._lock:
+            if self._file_signature() != self._signature:
+                config = {} if self._clear_pending else self._read_config()
+                if self._clear_pending:
+                    self._signature = self._file_signature()
+                config.update(self._pending)
+                self.config = config
+            return self.config.get(key, default)
+
+    def _set(self, key: str, value: Any):
+        """
+        Changes a setting and saves it, or defers the write if a transaction is open.
+
+        Args:
+            key: The configuration key.
+            value: The new value.
+        """
+        with self._lock:
+            self._pending[key] = value
+            self.config[key] = value
+            if not self._depth:
+                self._save_config()
+
+    @contextmanager
+    def transaction(self) -> Iterator["ConfigManager"]:
+        """
+        Groups several changes into a single write.
+
+        Changes made inside the block are visible to this ConfigManager right
+        away and written to disk together when the outermost block exits. If the
+        block raises, they are discarded. Other threads using this ConfigManager
+        wait until the transaction ends.
+
+        Example:
+            with config_manager.transaction():
+                config_manager.set_language(None)
+                config_manager.set_api_key(None)
+
+        Yields:
+            This ConfigManager.
+        """
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                if self._depth == 1:
+                    self._pending.clear()
+                    self._clear_pending = False
+                    self.config = self._read_config()
+                raise
+            else:
+                if self._depth == 1:
+                    self._save_config()
+            finally:
+                self._depth -= 1
 
     def get_model(self) -> Optional[str]:
         """
@@ -50,7 +169,7 @@ class ConfigManager:
         Returns:
             The model name as a string, or None if not set.
         """
-        return self.config.get("model")
+        return self._get("model")
 
     def set_model(self, model_name: str):
         """
@@ -59,8 +178,7 @@ class ConfigManager:
         Args:
             model_name: The name of the model to set.
         """
-        self.config["model"] = model_name
-        self._save_config()
+        self._set("model", model_name)
 
     def get_language(self) -> Optional[str]:
         """
@@ -69,7 +187,7 @@ class ConfigManager:
         Returns:
             The language code (e.g., "en", "it") as a string, or None if not set.
         """
-        return self.config.get("language")
+        return self._get("language")
 
     def set_language(self, language: str):
         """
@@ -78,8 +196,7 @@ class ConfigManager:
         Args:
             language: The language code (e.g., "en", "it") to set.
         """
-        self.config["language"] = language
-        self._save_config()
+        self._set("language", language)
 
     def get_api_key(self) -> Optional[str]:
         """
@@ -88,7 +205,7 @@ class ConfigManager:
         Returns:
             The API key as a string, or None if not set.
         """
-        return self.config.get("api_key")
+        return self._get("api_key")
 
     def set_api_key(self, api_key: str):
         """
@@ -97,27 +214,228 @@ class ConfigManager:
         Args:
             api_key: The API key to set.
         """
-        self.config["api_key"] = api_key
-        self._save_config()
+        self._set("api_key", api_key)
+
+    def get_response_cache(self) -> dict:
+        """
+        Retrieves the response cache settings.
+
+        The section may contain `enabled`, `path`, `max_entries`, `max_bytes`
+        and `ttl_seconds`. The cache is disabled unless `enabled` is true.
+
+        Returns:
+            The response cache settings, or an empty dictionary if not set.
+        """
+        return self._get("response_cache") or {}
+
+    def get_context_cache(self) -> bool:
+        """
+        Retrieves whether the system prompt should be stored with Gemini's context caching.
+
+        Returns:
+            True if context caching is enabled, False otherwise (the default).
+        """
+        return bool(self._get("context_cache", False))
+
+    def get_history_settings(self) -> dict:
+        """
+        Retrieves the history compaction settings.
+
+        The section may contain `token_budget` (0 disables compaction),
+        `keep_recent_turns` and `count_tokens`.
+
+        Returns:
+            The history settings, or an empty dictionary if not set.
+        """
+        return self._get("history") or {}
+
+    def get_generation_settings(self) -> dict:
+        """
+        Retrieves the per-phase generation settings.
+
+        The section may contain `enabled`, the `interview` and `final` phase
+        settings (`thinking_budget`, `max_output_tokens`, `temperature`),
+        per-model overrides in `models`, `interview_turns` and `detailed_idea_chars`.
+
+        Returns:
+            The generation settings, or an empty dictionary if not set.
+        """
+        return self._get("generation") or {}
+
+    def get_request_policy(self) -> dict:
+        """
+        Retrieves the request policy settings.
+
+        The section may contain `timeout`, `max_retries`, `backoff_base`,
+        `backoff_max`, `hedge`, `hedge_after`, `hedge_min_samples` and
+        `fallback_models`.
+
+        Returns:
+            The request policy settings, or an empty dictionary if not set.
+        """
+        return self._get("request_policy") or {}
+
+    def get_backends(self) -> dict:
+        """
+        Retrieves the settings of the non-Gemini model backends.
+
+        Maps backend names (used as model prefix, e.g. `local:qwen2.5-7b`) to
+        settings with `type` ("openai"), `base_url`, and optional `api_key`
+        and `timeout`.
+
+        Returns:
+            The backend settings, or an empty dictionary if not set.
+        """
+        return self._get("backends") or {}
+
+    def get_model_registry(self) -> dict:
+        """
+        Retrieves the model registry settings.
+
+        The section may contain `path` and `ttl_seconds` (how long the fetched
+        model list is used before being refreshed).
+
+        Returns:
+            The model registry settings, or an empty dictionary if not set.
+        """
+        return self._get("model_registry") or {}
+
+    def get_prompt_library(self) -> dict:
+        """
+        Retrieves the prompt library settings.
+
+        The section may contain `enabled` (finished sessions are stored unless
+        it is false) and `path`.
+
+        Returns:
+            The prompt library settings, or an empty dictionary if not set.
+        """
+        return self._get("prompt_library") or {}
+
+    def get_semantic_cache(self) -> dict:
+        """
+        Retrieves the semantic cache settings.
+
+        The section may contain `enabled`, `threshold`, `max_entries`,
+        `ttl_seconds`, `path`, `embeddings` ("local" or "api"),
+        `embedding_model` and `dimensions`. The cache is disabled unless
+        `enabled` is true.
+
+        Returns:
+            The semantic cache settings, or an empty dictionary if not set.
+        """
+        return self._get("semantic_cache") or {}
+
+    def get_quota(self) -> dict:
+        """
+        Retrieves the quota scheduler settings.
+
+        The section may contain `limits` (model name, or "default", mapped to
+        `rpm` and `tpm`), `burst_seconds`, `batch_reserve`, `output_tokens`
+        and `path`. Calls are not scheduled unless `limits` is set.
+
+        Returns:
+            The quota settings, or an empty dictionary if not set.
+        """
+        return self._get("quota") or {}
+
+    def get_server_settings(self) -> dict:
+        """
+        Retrieves the settings of the `serve` command.
+
+        The section may contain `host`, `port`, `token` and the server limits
+        (`max_sessions`, `idle_timeout`, `max_concurrency`, `max_queue`,
+        `max_connections`, `max_session_bytes`, `max_message_bytes`,
+        `send_timeout`, `timeout`).
+
+        Returns:
+            The server settings, or an empty dictionary if not set.
+        """
+        return self._get("server") or {}
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """
+        Holds the advisory lock shared by every process writing `config.json`.
+        """
+        with open(self.lock_path, "a+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _write_atomic(self, config: dict):
+        """
+        Replaces `config.json` with the given configuration in a single rename.
+
+        Args:
+            config: The configuration to write.
+        """
+        directory = os.path.dirname(self.config_path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".config.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(config, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        # Make the rename itself durable (not supported on Windows)
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
 
     def _save_config(self):
         """
-        Saves the current configuration dictionary to the `config.json` file.
+        Writes the pending changes to the `config.json` file.
+
+        The changes are applied to the latest content on disk under the file
+        lock, so settings saved meanwhile by other processes are kept.
         """
-        with open(self.config_path, "w") as f:
-            json.dump(self.config, f, indent=4)
+        with self._lock, self._file_lock():
+            config = {} if self._clear_pending else self._read_config()
+            config.update(self._pending)
+            self._write_atomic(config)
+            self._signature = self._file_signature()
+            self.config = config
+            self._pending.clear()
+            self._clear_pending = False
 
     def _create_empty_config(self):
         """
-        Creates an empty `config.json` file, effectively resetting the configuration.
+        Creates an empty `config.json` file, unless another process created it meanwhile.
         """
-        with open(self.config_path, "w") as f:
-            json.dump({}, f, indent=4)
+        with self._lock, self._file_lock():
+            if not os.path.exists(self.config_path):
+                self._write_atomic({})
             
     def clear_config(self):
         """
         Resets the configuration to an empty state by clearing the internal
         config dictionary and writing an empty JSON object to `config.json`.
         """
-        self.config = {}
-        self._create_empty_config()
+        with self._lock:
+            self._pending.clear()
+            self._clear_pending = True
+            self.config = {}
+            if not self._depth:
+                self._save_config()
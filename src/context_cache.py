@@ -0,0 +1,240 @@
+"""
+This module provides the SystemPromptCache class, which registers the
+consultant's system prompt with Gemini's explicit context caching API.
+
+The long system prompt is uploaded once per (model, language) as a cached
+content resource and new chat sessions reference it by name instead of
+resending it as `system_instruction` on every turn. Cache TTLs are extended
+automatically while in use. Models (or prompts) the API refuses to cache,
+for instance because the prompt is below the model's minimum cacheable size,
+are remembered and fall back to the inline system instruction. Other failures
+(rate limits, server or network errors) only skip caching for `retry_seconds`.
+
+The class only relies on `client.caches`, so it can be exercised against a
+local stand-in client or a stub server configured through `HttpOptions(base_url=...)`.
+"""
+import hashlib
+import re
+import threading
+import time
+import weakref
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from google import genai
+from google.genai import errors, types
+
+DISPLAY_NAME_PREFIX = "prompt-consultant"
+# Client errors meaning the model or the prompt can't be cached, as opposed to a bad request of ours
+UNSUPPORTED_RE = re.compile(r"cach|not supported|unsupported|too small|min_total_token_count", re.IGNORECASE)
+
+def is_unsupported_error(error: Exception) -> bool:
+    """
+    Checks whether a cache creation error means caching is unavailable for the model or prompt.
+
+    Args:
+        error: The exception raised by `caches.create`.
+
+    Returns:
+        True for a 400 or 404 saying caching is unsupported; False for transient
+        errors such as rate limits, server errors or network failures.
+    """
+    return isinstance(error, errors.ClientError) and error.code in (400, 404) and UNSUPPORTED_RE.search(str(error)) is not None
+
+class SystemPromptCache:
+    """
+    Tracks the cached-content resources holding the system prompt for each model and language.
+    """
+    def __init__(self, client: genai.Client, ttl_seconds: int = 3600, refresh_margin_seconds: int = 300, retry_seconds: float = 60, debug: bool = False):
+        """
+        Initializes the SystemPromptCache.
+
+        Args:
+            client: The Gemini client used to create and update cached contents.
+            ttl_seconds: Lifetime requested for each cached content, extended while in use.
+            refresh_margin_seconds: A cache expiring within this many seconds is extended before use.
+            retry_seconds: How long the prompt is sent inline after a transient cache creation failure.
+            debug: If True, prints cache creation, refresh and fallback events.
+        """
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_seconds = retry_seconds
+        self.debug = debug
+        # (model, language, prompt digest) -> (cached content name, expiry timestamp)
+        self._entries: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+        self._unsupported: Set[Tuple[str, str]] = set()
+        # (model, prompt digest) -> time before which creation isn't retried
+        self._retry_at: Dict[Tuple[str, str], float] = {}
+        # Guards the dictionaries; API calls are made under the per-key locks only
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+
+    def _display_name(self, model_name: str, language: str, digest: str) -> str:
+        """
+        Builds the display name identifying a cached system prompt across processes.
+
+        Args:
+            model_name: The model the cache belongs to.
+            language: The language of the system prompt.
+            digest: The digest of the system prompt text.
+
+        Returns:
+            The display name used for the cached content.
+        """
+        return f"{DISPLAY_NAME_PREFIX}-{model_name}-{language}-{digest[:12]}"
+
+    def _find_existing(self, model_name: str, display_name: str) -> Optional[Tuple[str, float]]:
+        """
+        Looks for a live cached content created earlier, possibly by another process.
+
+        Args:
+            model_name: The model the cache belongs to.
+            display_name: The display name to look for.
+
+        Returns:
+            The cached content name and its expiry timestamp, or None if not found.
+        """
+        try:
+            for cached in self.client.caches.list():
+                if cached.display_name != display_name or not (cached.model or "").endswith(model_name):
+                    continue
+                if isinstance(cached.expire_time, datetime):
+                    return cached.name, cached.expire_time.timestamp()
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] Could not list cached contents: {e}")
+        return None
+
+    def get(self, model_name: str, language: str, system_prompt: str) -> Optional[str]:
+        """
+        Returns the name of the cached content holding the system prompt, creating
+        or extending it as needed.
+
+        API calls for one (model, language, prompt) are serialized, so it is
+        created once; while it is being extended, callers keep using the
+        current, still valid, cache. Other keys are not held up.
+
+        Args:
+            model_name: The model the chat session uses.
+            language: The language of the system prompt.
+            system_prompt: The system prompt text.
+
+        Returns:
+            The cached content name, or None if the prompt should be sent inline.
+        """
+        digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        key = (model_name, language, digest)
+        with self._lock:
+            if (model_name, digest) in self._unsupported or self._retry_at.get((model_name, digest), 0) > time.time():
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] - time.time() > self.refresh_margin_seconds:
+                return entry[0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        if not key_lock.acquire(blocking=entry is None or entry[1] <= time.time()):
+            # Another thread is extending it and it hasn't expired yet
+            return entry[0]
+        try:
+            return self._refresh(key, entry, system_prompt)
+        finally:
+            key_lock.release()
+
+    def _refresh(self, key: Tuple[str, str, str], entry: Optional[Tuple[str, float]], system_prompt: str) -> Optional[str]:
+        """
+        Finds, extends or creates the cached content of a key. Called with the key's lock held.
+
+        Args:
+            key: The (model, language, prompt digest) key.
+            entry: The entry known when the lock was requested, if any.
+            system_prompt: The system prompt text.
+
+        Returns:
+            The cached content name, or None if the prompt should be sent inline.
+        """
+        model_name, language, digest = key
+        with self._lock:
+            # Another thread may have refreshed it while we were waiting
+            current = self._entries.get(key)
+            if current is not None and current != entry and current[1] - time.time() > self.refresh_margin_seconds:
+                return current[0]
+        if entry is None:
+            entry = self._find_existing(model_name, self._display_name(model_name, language, digest))
+        now = time.time()
+        if entry is not None and entry[1] - now > self.refresh_margin_seconds:
+            with self._lock:
+                self._entries[key] = entry
+            return entry[0]
+        if entry is not None:
+            try:
+                self.client.caches.update(
+                    name=entry[0],
+                    config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"),
+                )
+                with self._lock:
+                    self._entries[key] = (entry[0], now + self.ttl_seconds)
+                if self.debug:
+                    print(f"[DEBUG] Extended context cache {entry[0]}")
+                return entry[0]
+            except Exception as e:
+                # Expired or deleted in the meantime: create a new one
+                if self.debug:
+                    print(f"[DEBUG] Could not extend context cache {entry[0]}: {e}")
+                with self._lock:
+                    self._entries.pop(key, None)
+        try:
+            cached = self.client.caches.create(
+                model=model_name,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_prompt,
+                    display_name=self._display_name(model_name, language, digest),
+                    ttl=f"{self.ttl_seconds}s",
+                ),
+            )
+        except Exception as e:
+            with self._lock:
+                if is_unsupported_error(e):
+                    self._unsupported.add((model_name, digest))
+                else:
+                    self._retry_at[(model_name, digest)] = time.time() + self.retry_seconds
+            if self.debug:
+                print(f"[DEBUG] Context caching unavailable for {model_name}, sending system prompt inline: {e}")
+            return None
+        with self._lock:
+            self._entries[key] = (cached.name, now + self.ttl_seconds)
+        if self.debug:
+            print(f"[DEBUG] Created context cache {cached.name} for {model_name} ({language})")
+        return cached.name
+
+    def invalidate(self, name: str):
+        """
+        Forgets a cached content, e.g. after the API reported it as missing.
+
+        Args:
+            name: The cached content name to forget.
+        """
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry[0] == name:
+                    del self._entries[key]
+
+_shared: "weakref.WeakKeyDictionary[genai.Client, SystemPromptCache]" = weakref.WeakKeyDictionary()
+_shared_lock = threading.Lock()
+
+def get_system_prompt_cache(client: genai.Client, debug: bool = False) -> SystemPromptCache:
+    """
+    Returns the SystemPromptCache shared by all consultants using the given client.
+
+    Args:
+        client: The Gemini client the cache belongs to.
+        debug: If True, enables debug output when the cache is created.
+
+    Returns:
+        The process-wide SystemPromptCache for this client.
+    """
+    with _shared_lock:
+        cache = _shared.get(client)
+        if cache is None:
+            cache = SystemPromptCache(client, debug=debug)
+            _shared[client] = cache
+        return cache
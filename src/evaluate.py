@@ -0,0 +1,600 @@
+"""
+This module implements the evaluation harness for the final prompts produced
+by the consultant.
+
+The final prompt is taken from the last Markdown code block of a consultant
+reply and used as system instruction; every sample of a dataset is sent as
+user message through a pool of async workers, with a requests-per-minute cap.
+Each output is then scored by a list of pluggable checks:
+
+- `regex`: the output matches (or, with `"negate": true`, doesn't match) a pattern;
+- `json_schema`: the output is JSON valid against a schema (validated with
+  the `jsonschema` package when installed, otherwise with a built-in subset:
+  type, enum, required, properties, items, additionalProperties);
+- `judge`: another model grades the output against written criteria.
+
+Datasets are JSONL files, one sample per line, either plain text (the input)
+or a JSON object: {"id": "s1", "input": "...", "checks": [...]}. Sample checks
+are added to the global ones. Checks are declared as JSON objects, e.g.
+{"type": "regex", "pattern": "^# ", "name": "heading"}.
+
+Two prompt revisions can be evaluated on the same dataset for an A/B comparison.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.genai import types
+
+from src.backends import BackendRouter
+from src.history import CHARS_PER_TOKEN, estimate_tokens
+from src.metrics import percentile
+from src.resilience import RequestPolicy, acall_with_policy
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+CODE_BLOCK = re.compile(r"```([\w+-]*)[^\n]*\n(.*?)```", re.DOTALL)
+
+def extract_final_prompt(text: str) -> Optional[str]:
+    """
+    Extracts the final prompt from a consultant reply.
+
+    The system prompt asks for the final prompt in a Markdown code block; the
+    last `markdown`/`md` block wins, then the last block of any language.
+
+    Args:
+        text: The consultant reply.
+
+    Returns:
+        The prompt, or None if the reply has no code block.
+    """
+    blocks = CODE_BLOCK.findall(text or "")
+    if not blocks:
+        return None
+    markdown = [body for language, body in blocks if language.lower() in ("markdown", "md")]
+    return (markdown or [body for _, body in blocks])[-1].strip()
+
+def find_final_prompts(replies: Iterable[str]) -> List[str]:
+    """
+    Lists the successive final prompt revisions found in a conversation.
+
+    Args:
+        replies: The consultant replies, oldest first.
+
+    Returns:
+        The distinct prompts, oldest first.
+    """
+    prompts: List[str] = []
+    for reply in replies:
+        prompt = extract_final_prompt(reply)
+        if prompt and prompt not in prompts:
+            prompts.append(prompt)
+    return prompts
+
+def history_prompts(history: List[types.Content]) -> List[str]:
+    """
+    Lists the final prompt revisions proposed in a chat history.
+
+    Args:
+        history: The session history, as returned by `ChatSession.get_history`.
+
+    Returns:
+        The distinct prompts, oldest first.
+    """
+    return find_final_prompts(
+        "".join(part.text or "" for part in content.parts or [])
+        for content in history if content.role == "model"
+    )
+
+def parse_sample(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses one dataset line into a sample.
+
+    Args:
+        line: A raw line, either plain text or a JSON object with `input`.
+
+    Returns:
+        A dictionary with `id`, `input` and `checks` (the sample's own Check
+        objects), or None for blank lines.
+
+    Raises:
+        ValueError: If a JSON line is malformed, has no string `input` or declares an invalid check.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    data = json.loads(line) if line.startswith("{") else {"input": line}
+    if not data.get("input"):
+        raise ValueError(f"Dataset sample without 'input': {line}")
+    if not isinstance(data["input"], str):
+        raise ValueError(f"Dataset sample with 'input' not a string: {line}")
+    specs = data.get("checks") or []
+    if not isinstance(specs, list):
+        raise ValueError(f"Dataset sample with 'checks' not a list: {line}")
+    sample_id = data.get("id")
+    if sample_id is None:
+        sample_id = hashlib.sha256(data["input"].encode("utf-8")).hexdigest()[:16]
+    return {"id": str(sample_id), "input": data["input"], "checks": [build_check(spec) for spec in specs]}
+
+def read_dataset(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads a JSONL dataset, skipping blank lines.
+
+    Every line, checks included, is validated here, so a bad sample stops the
+    evaluation before any model call.
+
+    Args:
+        path: The dataset file.
+
+    Returns:
+        The samples, in file order.
+
+    Raises:
+        ValueError: If a line is invalid; the message starts with its line number.
+    """
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            try:
+                sample = parse_sample(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: {e}") from e
+            if sample is not None:
+                samples.append(sample)
+    return samples
+
+@dataclass
+class CheckResult:
+    """
+    Outcome of a check on one output.
+    """
+    name: str
+    passed: bool
+    detail: str = ""
+
+class Check:
+    """
+    Base class of the output checks.
+    """
+    def __init__(self, name: Optional[str] = None):
+        """
+        Args:
+            name: Label used in the report. Defaults to the check type.
+        """
+        self.name = name or self.__class__.__name__
+
+    async def run(self, sample: Dict[str, Any], output: str, evaluator: "Evaluator") -> CheckResult:
+        """
+        Scores one output.
+
+        Args:
+            sample: The dataset sample.
+            output: The model output for the sample.
+            evaluator: The running Evaluator, giving access to the model for judges.
+
+        Returns:
+            The check result.
+        """
+        raise NotImplementedError
+
+class RegexCheck(Check):
+    """
+    Passes if the output matches a regular expression (searched anywhere, multiline).
+    """
+    def __init__(self, pattern: str, negate: bool = False, ignore_case: bool = False, name: Optional[str] = None):
+        super().__init__(name or f"regex:{pattern}")
+        self.pattern = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+        self.negate = negate
+
+    async def run(self, sample, output, evaluator):
+        matched = self.pattern.search(output) is not None
+        return CheckResult(self.name, matched != self.negate)
+
+def _json_payload(output: str) -> str:
+    """
+    Strips a Markdown code fence around a JSON output, if any.
+    """
+    match = CODE_BLOCK.search(output)
+    return match.group(2) if match else output
+
+_JSON_TYPES = {"object": dict, "array": list, "string": str, "boolean": bool, "null": type(None), "number": (int, float), "integer": int}
+
+def _validate(value: Any, schema: Dict[str, Any], path: str = "$") -> Optional[str]:
+    """
+    Validates a value against the subset of JSON Schema used when `jsonschema` is not installed.
+
+    Returns:
+        A description of the first violation, or None if the value is valid.
+    """
+    expected = schema.get("type")
+    if expected:
+        kinds = expected if isinstance(expected, list) else [expected]
+        # bool is a subclass of int, but not a JSON number
+        if not any(isinstance(value, _JSON_TYPES[k]) and not (k in ("number", "integer") and isinstance(value, bool)) for k in kinds):
+            return f"{path}: expected {expected}"
+    if "enum" in schema and value not in schema["enum"]:
+        return f"{path}: not one of {schema['enum']}"
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                return f"{path}: missing '{key}'"
+        properties = schema.get("properties", {})
+        for key, item in value.items():
+            if key in properties:
+                error = _validate(item, properties[key], f"{path}.{key}")
+                if error:
+                    return error
+            elif schema.get("additionalProperties") is False:
+                return f"{path}: unexpected '{key}'"
+    if isinstance(value, list) and isinstance(schema.get("items"), dict):
+        for idx, item in enumerate(value):
+            error = _validate(item, schema["items"], f"{path}[{idx}]")
+            if error:
+                return error
+    return None
+
+class JSONSchemaCheck(Check):
+    """
+    Passes if the output (optionally inside a code fence) is JSON valid against a schema.
+    """
+    def __init__(self, schema: Dict[str, Any], name: Optional[str] = None):
+        super().__init__(name or "json_schema")
+        self.schema = schema
+
+    async def run(self, sample, output, evaluator):
+        try:
+            value = json.loads(_json_payload(output))
+        except ValueError as e:
+            return CheckResult(self.name, False, f"invalid JSON: {e}")
+        if jsonschema is not None:
+            try:
+                jsonschema.validate(value, self.schema)
+            except jsonschema.ValidationError as e:
+                return CheckResult(self.name, False, e.message)
+            return CheckResult(self.name, True)
+        error = _validate(value, self.schema)
+        return CheckResult(self.name, error is None, error or "")
+
+JUDGE_TEMPLATE = """You are grading the output of an AI assistant.
+
+Criteria:
+{criteria}
+
+Input given to the assistant:
+<input>
+{input}
+</input>
+
+Assistant output:
+<output>
+{output}
+</output>
+
+Does the output satisfy the criteria? Answer with a JSON object: {{"pass": true or false, "reason": "one sentence"}}"""
+
+JUDGE_SCHEMA = {
+    "type": "object",
+    "properties": {"pass": {"type": "boolean"}, "reason": {"type": "string"}},
+    "required": ["pass", "reason"],
+}
+
+class JudgeCheck(Check):
+    """
+    Asks a model (LLM-as-judge) whether the output meets written criteria.
+    """
+    def __init__(self, criteria: str, model: Optional[str] = None, name: Optional[str] = None):
+        super().__init__(name or "judge")
+        self.criteria = criteria
+        self.model = model
+
+    async def run(self, sample, output, evaluator):
+        config = types.GenerateContentConfig(temperature=0.0, response_mime_type="application/json", response_schema=JUDGE_SCHEMA)
+        contents = [types.Content(role="user", parts=[types.Part(text=JUDGE_TEMPLATE.format(criteria=self.criteria, input=sample["input"], output=output))])]
+        try:
+            response, _ = await evaluator.generate(self.model or evaluator.judge_model, contents, config)
+        except Exception as e:
+            return CheckResult(self.name, False, f"judge failed: {e}")
+        text = response.text or ""
+        try:
+            verdict = json.loads(_json_payload(text))
+            return CheckResult(self.name, bool(verdict.get("pass")), str(verdict.get("reason", "")))
+        except (ValueError, AttributeError):
+            # Backends without structured output: look for a plain verdict
+            passed = re.search(r'"?pass"?\s*:\s*true|\bPASS\b', text, re.IGNORECASE) is not None
+            return CheckResult(self.name, passed, text.strip()[:200])
+
+CHECK_TYPES = {"regex": RegexCheck, "json_schema": JSONSchemaCheck, "judge": JudgeCheck}
+
+def build_check(spec: Dict[str, Any]) -> Check:
+    """
+    Builds a check from its JSON declaration.
+
+    Args:
+        spec: A dictionary with `type` and the check's arguments.
+
+    Returns:
+        The check.
+
+    Raises:
+        ValueError: If the declaration isn't an object, the type is unknown, an
+            argument is missing or a regular expression doesn't compile.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"Invalid check {spec!r}: expected an object with 'type'")
+    spec = dict(spec)
+    check_type = spec.pop("type", None)
+    if check_type not in CHECK_TYPES:
+        raise ValueError(f"Unknown check type '{check_type}'. Available: {', '.join(CHECK_TYPES)}")
+    try:
+        return CHECK_TYPES[check_type](**spec)
+    except (TypeError, re.error) as e:
+        raise ValueError(f"Invalid '{check_type}' check {spec}: {e}")
+
+def load_checks(path: Optional[str]) -> List[Check]:
+    """
+    Loads the global checks from a JSON file holding a list of check declarations.
+
+    Args:
+        path: The file, or None for no checks.
+
+    Returns:
+        The checks.
+    """
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [build_check(spec) for spec in json.load(f)]
+
+class RateLimiter:
+    """
+    Spaces out requests to stay under a requests-per-minute cap.
+    """
+    def __init__(self, rpm: Optional[float]):
+        """
+        Args:
+            rpm: Maximum requests per minute. None or 0 disables the limit.
+        """
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """
+        Waits for the next request slot.
+
+        Returns:
+            The time waited, in seconds.
+        """
+        if not self.interval:
+            return 0.0
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return max(wait, 0.0)
+
+@dataclass
+class SampleResult:
+    """
+    The output and scores of one sample under one prompt.
+    """
+    id: str
+    output: str = ""
+    error: Optional[str] = None
+    latency: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    response_tokens: Optional[int] = None
+    checks: List[CheckResult] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        """True if the call succeeded and every check passed."""
+        return self.error is None and all(check.passed for check in self.checks)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "passed": self.passed,
+            "output": self.output,
+            "error": self.error,
+            "latency": self.latency,
+            "prompt_tokens": self.prompt_tokens,
+            "response_tokens": self.response_tokens,
+            "checks": [{"name": c.name, "passed": c.passed, "detail": c.detail} for c in self.checks],
+        }
+
+def summarize(results: List[SampleResult]) -> Dict[str, Any]:
+    """
+    Aggregates the results of one prompt.
+
+    Args:
+        results: The per-sample results.
+
+    Returns:
+        Counters, pass rates (overall and per check) and latency and token distributions.
+    """
+    latencies = [r.latency for r in results if r.error is None and r.latency is not None]
+    prompt_tokens = [r.prompt_tokens for r in results if r.prompt_tokens is not None]
+    response_tokens = [r.response_tokens for r in results if r.response_tokens is not None]
+    per_check: Dict[str, List[bool]] = {}
+    for result in results:
+        for check in result.checks:
+            per_check.setdefault(check.name, []).append(check.passed)
+    return {
+        "samples": len(results),
+        "errors": sum(1 for r in results if r.error is not None),
+        "pass_rate": sum(r.passed for r in results) / len(results) if results else None,
+        "checks": {name: sum(passed) / len(passed) for name, passed in per_check.items()},
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "prompt_tokens_p50": percentile(prompt_tokens, 50),
+        "response_tokens_p50": percentile(response_tokens, 50),
+        "response_tokens_p95": percentile(response_tokens, 95),
+        "total_tokens": sum(prompt_tokens) + sum(response_tokens),
+    }
+
+class Evaluator:
+    """
+    Runs prompts against a dataset with bounded concurrency and a rate limit, and scores the outputs.
+    """
+    def __init__(self, backends: BackendRouter, model_name: str, checks: Optional[List[Check]] = None, concurrency: int = 8, rpm: Optional[float] = None, request_policy: Optional[RequestPolicy] = None, judge_model: Optional[str] = None, temperature: Optional[float] = None, api_key: Optional[str] = None):
+        """
+        Initializes the Evaluator.
+
+        Args:
+            backends: The BackendRouter used to reach the models.
+            model_name: The model the prompts are evaluated on.
+            checks: The checks applied to every output.
+            concurrency: Maximum number of samples processed at the same time.
+            rpm: Maximum model requests per minute, judge calls and retries included. None means no limit.
+            request_policy: Deadlines, retries and fallback for every call.
+            judge_model: Default model of the judge checks. Defaults to `model_name`.
+            temperature: Optional sampling temperature of the evaluated calls.
+            api_key: The API key of the calls, identifying their quota when the
+                request policy has a QuotaScheduler.
+        """
+        self.backends = backends
+        self.model_name = model_name
+        self.checks = checks or []
+        self.concurrency = max(1, concurrency)
+        self.limiter = RateLimiter(rpm)
+        self.request_policy = request_policy if request_policy else RequestPolicy()
+        self.judge_model = judge_model or model_name
+        self.temperature = temperature
+        self.api_key = api_key
+
+    async def generate(self, model_name: str, contents: List[types.Content], config: types.GenerateContentConfig) -> Tuple[types.GenerateContentResponse, float]:
+        """
+        Sends one request through the request policy, rate limiting every attempt.
+
+        Retries, hedged requests and fallbacks each take a slot of the rate
+        limit, so they don't push the evaluation over its RPM cap.
+
+        Args:
+            model_name: The model, optionally prefixed with its backend.
+            contents: The request contents.
+            config: The generation config.
+
+        Returns:
+            The response and the latency in seconds (rate-limit waits excluded).
+        """
+        if self.request_policy.timeout:
+            config = config.model_copy(update={"http_options": types.HttpOptions(timeout=int(self.request_policy.timeout * 1000))})
+        waited = 0.0
+
+        async def call(model: str):
+            nonlocal waited
+            waited += await self.limiter.acquire()
+            backend, name = self.backends.resolve(model)
+            return await backend.agenerate(name, contents, config)
+
+        tokens = estimate_tokens(contents) + len(config.system_instruction or "") // CHARS_PER_TOKEN
+        started = time.perf_counter()
+        result = await acall_with_policy(self.request_policy, call, model_name, quota_key=self.api_key, tokens=tokens)
+        return result.response, max(time.perf_counter() - started - waited, 0.0)
+
+    async def run_sample(self, prompt: str, sample: Dict[str, Any]) -> SampleResult:
+        """
+        Runs and scores one sample.
+
+        Args:
+            prompt: The prompt under evaluation, used as system instruction.
+            sample: The dataset sample.
+
+        Returns:
+            The sample result.
+        """
+        result = SampleResult(id=sample["id"])
+        config = types.GenerateContentConfig(system_instruction=prompt, temperature=self.temperature)
+        contents = [types.Content(role="user", parts=[types.Part(text=sample["input"])])]
+        try:
+            response, result.latency = await self.generate(self.model_name, contents, config)
+        except Exception as e:
+            result.error = str(e)
+            return result
+        result.output = response.text or ""
+        if response.usage_metadata:
+            result.prompt_tokens = response.usage_metadata.prompt_token_count
+            result.response_tokens = response.usage_metadata.candidates_token_count
+        checks = self.checks + sample["checks"]
+        outcomes = await asyncio.gather(*(check.run(sample, result.output, self) for check in checks), return_exceptions=True)
+        for check, outcome in zip(checks, outcomes):
+            if isinstance(outcome, Exception):
+                # A crashing check fails this sample only, not the whole evaluation
+                result.error = result.error or f"check '{check.name}' failed: {outcome}"
+                outcome = CheckResult(check.name, False, f"error: {outcome}")
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            result.checks.append(outcome)
+        return result
+
+    async def run(self, prompt: str, samples: List[Dict[str, Any]]) -> List[SampleResult]:
+        """
+        Runs every sample with bounded concurrency.
+
+        Args:
+            prompt: The prompt under evaluation.
+            samples: The dataset samples.
+
+        Returns:
+            The results, in dataset order.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for idx, sample in enumerate(samples):
+            queue.put_nowait((idx, sample))
+        results: List[Optional[SampleResult]] = [None] * len(samples)
+
+        async def worker():
+            while True:
+                try:
+                    idx, sample = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results[idx] = await self.run_sample(prompt, sample)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(samples)))))
+        return results
+
+def run_evaluation(prompts: List[str], dataset_path: str, backends: BackendRouter, model_name: str, checks_path: Optional[str] = None, concurrency: int = 8, rpm: Optional[float] = None, request_policy: Optional[RequestPolicy] = None, judge_model: Optional[str] = None, output_path: Optional[str] = None, api_key: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Evaluates one or more prompt revisions on a dataset.
+
+    Args:
+        prompts: The prompts to evaluate (two for an A/B comparison).
+        dataset_path: The JSONL dataset.
+        backends: The BackendRouter used to reach the models.
+        model_name: The model the prompts are evaluated on.
+        checks_path: Optional JSON file with the global checks.
+        concurrency: Maximum number of samples processed at the same time.
+        rpm: Maximum model requests per minute.
+        request_policy: Deadlines, retries and fallback for every call.
+        judge_model: Default model of the judge checks.
+        output_path: Optional JSONL file receiving every sample result.
+        api_key: The API key of the calls, for the quota scheduler.
+
+    Returns:
+        One summary per prompt, as returned by `summarize`.
+    """
+    samples = read_dataset(dataset_path)
+    evaluator = Evaluator(backends, model_name, load_checks(checks_path), concurrency=concurrency, rpm=rpm, request_policy=request_policy, judge_model=judge_model, api_key=api_key)
+
+    async def main() -> List[List[SampleResult]]:
+        # Revisions run one after the other so they don't compete for the rate limit
+        return [await evaluator.run(prompt, samples) for prompt in prompts]
+
+    all_results = asyncio.run(main())
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as out:
+            for revision, results in enumerate(all_results):
+                for result in results:
+                    out.write(json.dumps({"prompt": revision, **result.to_dict()}, ensure_ascii=False) + "\n")
+    return [summarize(results) for results in all_results]
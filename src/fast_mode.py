@@ -0,0 +1,141 @@
+"""
+This module implements the fast consultation mode.
+
+Instead of interviewing the user over several round trips, the first call
+asks the model for structured output (a JSON `response_schema`) holding, in one
+response, the clarifying questions, a proposed answer to each and a draft of
+the final prompt. The user accepts the proposed answers in bulk or overrides
+some of them, and one follow-up turn turns the draft into the final prompt:
+a consultation takes 1-2 calls instead of 3-5, each resending the growing history.
+
+Backends without structured output answer in free text; the reply is then
+kept as an ordinary first turn and the interview continues as usual.
+"""
+import json
+from dataclasses import dataclass, field
+from typing import List
+
+# Priming message sent with the user's initial idea in fast mode
+FAST_MESSAGE_TEMPLATE = (
+    "Ecco la mia idea iniziale per un prompt che voglio scrivere: '{initial_text}'. "
+    "Modalità rapida: invece di intervistarmi un passo alla volta, rispondi in un'unica volta con "
+    "le domande di chiarimento davvero necessarie (al massimo 5; nessuna se l'idea è già abbastanza dettagliata), "
+    "per ognuna la risposta che proporresti in mancanza di indicazioni, e una bozza completa del prompt finale "
+    "costruita su quelle risposte. Scrivi le domande, le risposte e la bozza nella lingua della consulenza."
+)
+# Follow-up message carrying the user's answers to the fast-mode questions
+ANSWERS_MESSAGE_TEMPLATE = (
+    "Ecco le mie risposte alle domande:\n\n{answers}\n\n"
+    "Ora scrivi il prompt finale ottimizzato partendo dalla bozza, nel formato previsto."
+)
+
+DRAFT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "analysis": {"type": "string"},
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"question": {"type": "string"}, "default_answer": {"type": "string"}},
+                "required": ["question", "default_answer"],
+            },
+        },
+        "draft_prompt": {"type": "string"},
+    },
+    "required": ["analysis", "questions", "draft_prompt"],
+}
+
+@dataclass
+class DraftQuestion:
+    """
+    A clarifying question of a fast-mode draft and the answer the model proposes.
+    """
+    question: str
+    default_answer: str = ""
+
+@dataclass
+class ConsultationDraft:
+    """
+    The structured first reply of a fast-mode consultation.
+    """
+    draft_prompt: str
+    questions: List[DraftQuestion] = field(default_factory=list)
+    analysis: str = ""
+
+    @classmethod
+    def parse(cls, text: str) -> "ConsultationDraft":
+        """
+        Parses the JSON reply of a fast-mode request.
+
+        Args:
+            text: The reply text. Text around the JSON object (e.g. a code fence) is ignored.
+
+        Returns:
+            The parsed draft.
+
+        Raises:
+            ValueError: If the reply isn't a JSON object matching `DRAFT_SCHEMA`.
+        """
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            raise ValueError("the reply holds no JSON object")
+        data = json.loads(text[start:end + 1])
+        if not isinstance(data, dict) or not isinstance(data.get("draft_prompt"), str) or not data["draft_prompt"].strip():
+            raise ValueError("the reply holds no draft prompt")
+        questions = data.get("questions") or []
+        if not isinstance(questions, list):
+            raise ValueError("'questions' is not a list")
+        return cls(
+            draft_prompt=data["draft_prompt"].strip(),
+            questions=[
+                DraftQuestion(str(item["question"]).strip(), str(item.get("default_answer") or "").strip())
+                for item in questions
+                if isinstance(item, dict) and str(item.get("question") or "").strip()
+            ],
+            analysis=str(data.get("analysis") or "").strip(),
+        )
+
+    def to_markdown(self, questions_label: str, default_label: str) -> str:
+        """
+        Renders the draft as a consultant reply.
+
+        This is the text shown to the user and recorded in the session history,
+        so later turns see an ordinary reply. The draft sits in a code block
+        like a final prompt would: callers archiving final prompts must wait
+        for the turn that answers the questions.
+
+        Args:
+            questions_label: The heading of the questions.
+            default_label: The label of the proposed answers.
+
+        Returns:
+            The Markdown text, with the draft prompt in a `markdown` code block.
+        """
+        parts = [self.analysis] if self.analysis else []
+        parts.append(f"```markdown\n{self.draft_prompt}\n```")
+        if self.questions:
+            lines = [f"**{questions_label}**", ""]
+            for idx, item in enumerate(self.questions, start=1):
+                lines.append(f"{idx}. {item.question}")
+                if item.default_answer:
+                    lines.append(f"   *{default_label}: {item.default_answer}*")
+            parts.append("\n".join(lines))
+        return "\n\n".join(parts)
+
+    def answers_message(self, answers: List[str]) -> str:
+        """
+        Builds the follow-up message asking for the final prompt.
+
+        Args:
+            answers: The answer to each question, in order. Missing or empty
+                answers fall back to the proposed ones.
+
+        Returns:
+            The message to send as the next turn.
+        """
+        lines = []
+        for idx, item in enumerate(self.questions):
+            answer = answers[idx].strip() if idx < len(answers) and answers[idx].strip() else item.default_answer
+            lines.append(f"{idx + 1}. {item.question}\n   {answer}")
+        return ANSWERS_MESSAGE_TEMPLATE.format(answers="\n".join(lines))
@@ -0,0 +1,177 @@
+"""
+This module selects the generation settings of each consultation turn.
+
+A consultation alternates two kinds of turns: interview turns, where the
+consultant analyzes the idea and asks a few clarifying questions, and final
+turns, where it builds or revises the final prompt. Interview replies are short
+and need little reasoning, so they get a small thinking budget and a tight
+output cap; final turns get a larger budget and cap.
+
+The phase of a turn is predicted from the session history before the call:
+
+- once a reply holds a final prompt (a Markdown code block), every later turn
+  revises it and is a final turn;
+- the turn answering the `interview_turns`-th round of questions (1 by
+  default: the questions of the reply to the initial idea) is expected to
+  produce the prompt, and it and every later turn are final turns. With 0,
+  the first turn is already final;
+- an initial idea longer than `detailed_idea_chars` is detailed enough for the
+  model to write the prompt straight away.
+
+The model may still write the prompt during an interview turn. If that reply
+is cut by the interview output cap, the turn is completed with the final settings.
+
+Settings are given per phase, with per-model overrides, e.g.
+{"interview": {"thinking_budget": 512, "max_output_tokens": 2048},
+ "models": {"gemini-2.5-pro": {"interview": {"thinking_budget": 128}}}}.
+Each phase may set `thinking_budget` (-1 lets the model decide, null leaves the
+model default), `max_output_tokens` and `temperature`. On Gemini 2.5 models the
+thinking tokens count towards `max_output_tokens`. The thinking budget is only
+sent to models known to support thinking: other models reject the field.
+
+A phase may also set `model` to answer its turns with another model than the
+session's, e.g. {"interview": {"model": "local:qwen2.5-7b-instruct"}} runs the
+questions on a local server and the final prompt on Gemini, in the same session.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from google.genai import types
+
+INTERVIEW = "interview"
+FINAL = "final"
+PHASES = (INTERVIEW, FINAL)
+DEFAULT_PHASES = {
+    INTERVIEW: {"thinking_budget": 512, "max_output_tokens": 2048},
+    FINAL: {"thinking_budget": 4096, "max_output_tokens": 8192},
+}
+CODE_BLOCK_RE = re.compile(r"^\s*```", re.MULTILINE)
+# Gemini models that think, for when the model registry doesn't know the model
+THINKING_MODEL_RE = re.compile(r"^(models/)?gemini-(2\.5|[3-9])")
+
+def is_truncated(response: Any) -> bool:
+    """
+    Checks whether a response (or the last chunk of a stream) was cut by the output cap.
+
+    Args:
+        response: A GenerateContentResponse.
+
+    Returns:
+        True if the first candidate finished with MAX_TOKENS.
+    """
+    candidates = getattr(response, "candidates", None)
+    return bool(candidates) and candidates[0].finish_reason == types.FinishReason.MAX_TOKENS
+
+class GenerationPolicy:
+    """
+    Per-phase generation settings, with per-model overrides.
+    """
+    def __init__(self, phases: Optional[Dict[str, Dict[str, Any]]] = None, models: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None, interview_turns: int = 1, detailed_idea_chars: int = 600):
+        """
+        Initializes the GenerationPolicy.
+
+        Args:
+            phases: Settings of the "interview" and "final" phases, merged over the defaults.
+            models: Per-model settings, mapping model names to phase settings
+                merged over `phases`.
+            interview_turns: Rounds of questions after which the model is
+                expected to write the prompt.
+            detailed_idea_chars: Length of the initial message above which the
+                first turn is already final.
+        """
+        self.phases = {phase: {**DEFAULT_PHASES[phase], **((phases or {}).get(phase) or {})} for phase in PHASES}
+        self.models = models or {}
+        self.interview_turns = max(0, interview_turns)
+        self.detailed_idea_chars = detailed_idea_chars
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["GenerationPolicy"]:
+        """
+        Builds a GenerationPolicy from the `generation` section of the configuration.
+
+        Args:
+            settings: A dictionary that may contain `enabled`, `interview`,
+                `final`, `models`, `interview_turns` and `detailed_idea_chars`.
+
+        Returns:
+            A configured GenerationPolicy, or None if `enabled` is false (every
+            turn then uses the model defaults).
+        """
+        if not settings.get("enabled", True):
+            return None
+        return cls(
+            phases={phase: settings[phase] for phase in PHASES if phase in settings},
+            models=settings.get("models"),
+            interview_turns=settings.get("interview_turns", 1),
+            detailed_idea_chars=settings.get("detailed_idea_chars", 600),
+        )
+
+    def phase(self, history: List[types.Content], user_text: str) -> str:
+        """
+        Predicts the phase of the next turn.
+
+        Args:
+            history: The session history before the turn.
+            user_text: The user's message for the turn.
+
+        Returns:
+            INTERVIEW or FINAL.
+        """
+        replies = ["".join(part.text or "" for part in content.parts or []) for content in history if content.role == "model"]
+        if any(CODE_BLOCK_RE.search(reply) for reply in replies):
+            return FINAL
+        if not replies and len(user_text) > self.detailed_idea_chars:
+            return FINAL
+        # Only replies asking something end a round of questions (not e.g. the acknowledgement of a history summary)
+        rounds = sum(1 for reply in replies if "?" in reply)
+        return FINAL if rounds >= self.interview_turns else INTERVIEW
+
+    def settings(self, model: str, phase: str) -> Dict[str, Any]:
+        """
+        Returns the settings of a phase for a model.
+
+        Args:
+            model: The model name, optionally prefixed with its backend.
+            phase: INTERVIEW or FINAL.
+
+        Returns:
+            The phase settings, with the model's overrides applied.
+        """
+        return {**self.phases[phase], **((self.models.get(model) or {}).get(phase) or {})}
+
+    def model(self, model: str, phase: str) -> Optional[str]:
+        """
+        Returns the model answering the turns of a phase, if the policy sets one.
+
+        Args:
+            model: The session's model, optionally prefixed with its backend.
+            phase: INTERVIEW or FINAL.
+
+        Returns:
+            The `model` setting of the phase, or None to use the session's model.
+        """
+        return self.settings(model, phase).get("model") or None
+
+    def config_update(self, model: str, phase: str, thinking: Optional[bool] = None, output_limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Builds the `GenerateContentConfig` fields of a phase for a model.
+
+        Args:
+            model: The model name, optionally prefixed with its backend.
+            phase: INTERVIEW or FINAL.
+            thinking: Whether the model supports thinking. The thinking budget
+                is only applied when True: other models reject it.
+            output_limit: The model's maximum output tokens, if known; caps `max_output_tokens`.
+
+        Returns:
+            The fields to merge into the request config.
+        """
+        settings = self.settings(model, phase)
+        update: Dict[str, Any] = {}
+        if settings.get("max_output_tokens"):
+            update["max_output_tokens"] = min(settings["max_output_tokens"], output_limit or settings["max_output_tokens"])
+        if settings.get("temperature") is not None:
+            update["temperature"] = settings["temperature"]
+        if settings.get("thinking_budget") is not None and thinking is True:
+            update["thinking_config"] = types.ThinkingConfig(thinking_budget=settings["thinking_budget"])
+        return update
@@ -0,0 +1,200 @@
+"""
+This module provides the HistoryManager class, which keeps the conversation
+history of a consultation session within a token budget.
+
+Every turn resends the whole history, so long sessions get slower and more
+expensive turn after turn. Once the history exceeds the budget, the older
+interview turns are folded into a compact summary, while the initial idea
+(with the first reply) and the latest exchanges are always kept verbatim.
+The system prompt is sent separately as system instruction and is never touched.
+
+When the kept parts alone exceed the budget (e.g. long final prompts), folding
+can't bring the history back under it; the turns are then folded in batches of
+`keep_recent_turns` rather than on every turn, so the summarization call isn't
+repeated each turn for little gain.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.genai import types
+
+# Rough characters-per-token ratio used by the local estimator
+CHARS_PER_TOKEN = 4
+SUMMARY_INSTRUCTION = (
+    "Summarize the following part of a prompt engineering interview in a compact bullet list. "
+    "Keep every requirement, constraint, preference and example the user gave, and the questions "
+    "already answered. Write in the same language as the conversation. Do not add anything else.\n\n"
+)
+SUMMARY_ACK = "OK."
+# First line of the user entry carrying the summary in a compacted history
+SUMMARY_HEADER = "[Summary of the earlier interview]"
+
+def content_text(content: types.Content) -> str:
+    """
+    Extracts the visible text of a history entry, skipping thoughts.
+
+    Args:
+        content: A history entry.
+
+    Returns:
+        The concatenated text parts.
+    """
+    return "".join(part.text for part in (content.parts or []) if part.text and not part.thought)
+
+def estimate_tokens(contents: List[types.Content]) -> int:
+    """
+    Estimates the number of tokens of a list of contents without calling the API.
+
+    Args:
+        contents: The history entries to measure.
+
+    Returns:
+        The estimated token count.
+    """
+    return sum(len(content_text(content)) for content in contents) // CHARS_PER_TOKEN
+
+class HistoryManager:
+    """
+    Decides when a session history must be compacted and builds the compacted history.
+    """
+    def __init__(self, token_budget: int = 8000, keep_recent_turns: int = 2, use_count_tokens: bool = False):
+        """
+        Initializes the HistoryManager.
+
+        Args:
+            token_budget: Maximum size of the history, in tokens, before compaction.
+            keep_recent_turns: Number of latest user/model exchanges always kept verbatim.
+            use_count_tokens: If True, the history is measured with the API's `count_tokens`
+                instead of the local estimator. Exact, but costs a round trip per turn.
+        """
+        self.token_budget = token_budget
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.use_count_tokens = use_count_tokens
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["HistoryManager"]:
+        """
+        Builds a HistoryManager from the `history` section of the configuration.
+
+        Args:
+            settings: A dictionary that may contain `token_budget`, `keep_recent_turns` and `count_tokens`.
+
+        Returns:
+            A configured HistoryManager, or None if `token_budget` is 0 (compaction disabled).
+        """
+        token_budget = settings.get("token_budget", 8000)
+        if not token_budget:
+            return None
+        return cls(
+            token_budget=token_budget,
+            keep_recent_turns=settings.get("keep_recent_turns", 2),
+            use_count_tokens=bool(settings.get("count_tokens", False)),
+        )
+
+    def split(self, history: List[types.Content], count_tokens: Optional[Callable[[List[types.Content]], int]] = None) -> Optional[Tuple[List[types.Content], List[types.Content], List[types.Content]]]:
+        """
+        Splits an over-budget history into the parts to keep and the part to summarize.
+
+        Args:
+            history: The current session history.
+            count_tokens: Function measuring contents in tokens. Defaults to `estimate_tokens`.
+
+        Returns:
+            A `(head, middle, tail)` tuple where `head` is the initial idea and
+            its reply, `middle` the turns to fold into a summary and `tail` the
+            latest exchanges; or None if the history is within budget or there
+            is nothing new to fold.
+        """
+        # Turns start at user entries; a streamed reply may span several model entries
+        turn_starts = [i for i, content in enumerate(history) if content.role == "user"]
+        if len(turn_starts) <= 1 + self.keep_recent_turns:
+            return None
+        if (count_tokens or estimate_tokens)(history) <= self.token_budget:
+            return None
+        head_end, tail_start = turn_starts[1], turn_starts[-self.keep_recent_turns]
+        head, middle, tail = history[:head_end], history[head_end:tail_start], history[tail_start:]
+        new_turns = sum(1 for content in middle if content.role == "user" and not self.is_summary(content))
+        if not new_turns:
+            # Only the previous summary is left to fold
+            return None
+        if new_turns < self.keep_recent_turns and (count_tokens or estimate_tokens)(head + tail) > self.token_budget:
+            # Still over budget after compaction: wait for a batch of turns to fold
+            return None
+        return head, middle, tail
+
+    @staticmethod
+    def is_summary(content: types.Content) -> bool:
+        """
+        Checks whether a history entry is the summary inserted by `build`.
+
+        Args:
+            content: A history entry.
+
+        Returns:
+            True for the user entry carrying the summary of earlier turns.
+        """
+        return content.role == "user" and content_text(content).startswith(SUMMARY_HEADER)
+
+    def summary_request(self, contents: List[types.Content]) -> str:
+        """
+        Builds the request asking the model to summarize the folded turns.
+
+        Args:
+            contents: The turns to summarize.
+
+        Returns:
+            The summarization prompt including the transcript.
+        """
+        return SUMMARY_INSTRUCTION + self._transcript(contents)
+
+    def local_summary(self, contents: List[types.Content], max_chars_per_turn: int = 300) -> str:
+        """
+        Builds a summary without calling the model, by truncating each folded turn.
+
+        Used as fallback when the summarization call fails.
+
+        Args:
+            contents: The turns to summarize.
+            max_chars_per_turn: Maximum characters kept from each turn.
+
+        Returns:
+            The truncated transcript.
+        """
+        return self._transcript(contents, max_chars_per_turn)
+
+    def build(self, head: List[types.Content], summary: str, tail: List[types.Content]) -> List[types.Content]:
+        """
+        Assembles the compacted history.
+
+        The summary is inserted as a user/model exchange between the kept parts.
+
+        Args:
+            head: The initial idea and its reply.
+            summary: The summary of the folded turns.
+            tail: The latest exchanges.
+
+        Returns:
+            The compacted history.
+        """
+        return head + [
+            types.Content(role="user", parts=[types.Part(text=f"{SUMMARY_HEADER}\n{summary}")]),
+            types.Content(role="model", parts=[types.Part(text=SUMMARY_ACK)]),
+        ] + tail
+
+    def _transcript(self, contents: List[types.Content], max_chars_per_turn: Optional[int] = None) -> str:
+        """
+        Renders history entries as a plain-text transcript.
+
+        Args:
+            contents: The history entries.
+            max_chars_per_turn: Optional truncation length for each entry.
+
+        Returns:
+            One `role: text` line per entry.
+        """
+        lines = []
+        for content in contents:
+            text = content_text(content).strip()
+            if max_chars_per_turn is not None and len(text) > max_chars_per_turn:
+                text = text[:max_chars_per_turn] + "..."
+            lines.append(f"{content.role}: {text}")
+        return "\n".join(lines)
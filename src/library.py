@@ -0,0 +1,299 @@
+"""
+This module provides the PromptLibrary class, a local archive of finished
+consultations backed by SQLite.
+
+Every session that produced a final prompt is stored with its initial idea,
+the questions and answers of the interview, the model and the language, so a
+later session can start from it instead of redoing the interview. Entries are
+deduplicated by a hash of their normalized final prompt, and searched through
+an FTS5 full-text index ranked by BM25, which keeps lookups in the millisecond
+range with tens of thousands of sessions. SQLite builds without FTS5 fall back
+to a (slower) substring scan.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+LIBRARY_FILE = "prompt_library.sqlite3"
+# Columns of LibraryEntry, in order, followed by the transcript
+_COLUMNS = "s.id, s.idea, s.final_prompt, s.model, s.language, s.created, s.updated, s.uses, s.transcript"
+
+def prompt_hash(final_prompt: str) -> str:
+    """
+    Computes the deduplication key of a final prompt.
+
+    Whitespace and case differences don't produce a new entry.
+
+    Args:
+        final_prompt: The final prompt.
+
+    Returns:
+        A hex SHA-256 digest.
+    """
+    normalized = " ".join(final_prompt.split()).lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def fts_query(text: str, prefix: bool = False) -> Optional[str]:
+    """
+    Turns free text into an FTS5 query matching entries containing every word.
+
+    Args:
+        text: The user's search terms.
+        prefix: If True, each word also matches the longer words it starts.
+
+    Returns:
+        The FTS5 query, or None if the text has no searchable word.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' if prefix else f'"{word}"' for word in words)
+
+def session_transcript(history: List[Any]) -> List[Dict[str, str]]:
+    """
+    Converts a session history into the stored interview transcript.
+
+    The first user message (the initial idea wrapped in the priming message)
+    is left out, since the idea is stored on its own.
+
+    Args:
+        history: The session history, as returned by `ChatSession.get_history`.
+
+    Returns:
+        The messages, as {"role": "user" | "consultant", "text": ...}.
+    """
+    from src.history import content_text
+
+    transcript = [
+        {"role": "consultant" if content.role == "model" else "user", "text": content_text(content)}
+        for content in history
+    ]
+    return transcript[1:] if transcript and transcript[0]["role"] == "user" else transcript
+
+@dataclass
+class LibraryEntry:
+    """
+    A stored consultation.
+    """
+    id: int
+    idea: str
+    final_prompt: str
+    model: str
+    language: str
+    created: float
+    updated: float
+    uses: int = 0
+    transcript: Optional[List[Dict[str, str]]] = None
+
+class PromptLibrary:
+    """
+    SQLite-backed archive of finished consultations with full-text search.
+
+    Safe to share between threads of a process; several processes can use the
+    same file, relying on SQLite's own locking.
+    """
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initializes the PromptLibrary, creating the database if needed.
+
+        Args:
+            path: Path of the SQLite file. Defaults to `prompt_library.sqlite3` next to `config.json`.
+        """
+        self.path = path or os.path.join(os.path.dirname(os.path.dirname(__file__)), LIBRARY_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id INTEGER PRIMARY KEY, session_key TEXT UNIQUE, hash TEXT NOT NULL UNIQUE, "
+            "idea TEXT NOT NULL, transcript TEXT NOT NULL, qa TEXT NOT NULL, final_prompt TEXT NOT NULL, "
+            "model TEXT NOT NULL, language TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL, "
+            "uses INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        self.fts = True
+        try:
+            # External-content index over the plain text of each entry (`qa` is the
+            # transcript without its JSON keys): the text is stored once, in `sessions`
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5("
+                "idea, final_prompt, qa, content='sessions', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+            self._conn.executescript(
+                "CREATE TRIGGER IF NOT EXISTS sessions_ai AFTER INSERT ON sessions BEGIN "
+                "INSERT INTO sessions_fts (rowid, idea, final_prompt, qa) VALUES (new.id, new.idea, new.final_prompt, new.qa); END;"
+                "CREATE TRIGGER IF NOT EXISTS sessions_ad AFTER DELETE ON sessions BEGIN "
+                "INSERT INTO sessions_fts (sessions_fts, rowid, idea, final_prompt, qa) VALUES ('delete', old.id, old.idea, old.final_prompt, old.qa); END;"
+                "CREATE TRIGGER IF NOT EXISTS sessions_au AFTER UPDATE OF idea, final_prompt, qa ON sessions BEGIN "
+                "INSERT INTO sessions_fts (sessions_fts, rowid, idea, final_prompt, qa) VALUES ('delete', old.id, old.idea, old.final_prompt, old.qa); "
+                "INSERT INTO sessions_fts (rowid, idea, final_prompt, qa) VALUES (new.id, new.idea, new.final_prompt, new.qa); END;"
+            )
+        except sqlite3.OperationalError:
+            self.fts = False
+        self._conn.commit()
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "PromptLibrary":
+        """
+        Builds a PromptLibrary from the `prompt_library` section of the configuration.
+
+        Args:
+            settings: A dictionary that may contain `path`.
+
+        Returns:
+            A configured PromptLibrary.
+        """
+        return cls(path=settings.get("path"))
+
+    def save(self, session_key: str, idea: str, transcript: List[Dict[str, str]], final_prompt: str, model: str, language: str) -> int:
+        """
+        Stores or updates a session.
+
+        A session is saved again every time its final prompt is revised; the
+        entry keyed by `session_key` is updated in place. If another session
+        already holds the same final prompt, that entry is refreshed instead
+        of storing a duplicate.
+
+        Args:
+            session_key: A stable identifier of the running session.
+            idea: The user's initial idea.
+            transcript: The interview, as a list of {"role", "text"} messages.
+            final_prompt: The final prompt.
+            model: The model that produced it.
+            language: The session language.
+
+        Returns:
+            The id of the entry holding the session.
+        """
+        now = time.time()
+        digest = prompt_hash(final_prompt)
+        data = json.dumps(transcript, ensure_ascii=False)
+        qa = "\n".join(message["text"] for message in transcript)
+        with self._lock:
+            row = self._conn.execute("SELECT id, session_key FROM sessions WHERE hash = ?", (digest,)).fetchone()
+            if row is not None and row[1] != session_key:
+                self._conn.execute("UPDATE sessions SET updated = ? WHERE id = ?", (now, row[0]))
+                self._conn.commit()
+                return row[0]
+            self._conn.execute(
+                "INSERT INTO sessions (session_key, hash, idea, transcript, qa, final_prompt, model, language, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (session_key) DO UPDATE SET hash = excluded.hash, idea = excluded.idea, transcript = excluded.transcript, "
+                "qa = excluded.qa, final_prompt = excluded.final_prompt, model = excluded.model, language = excluded.language, updated = excluded.updated",
+                (session_key, digest, idea, data, qa, final_prompt, model, language, now, now),
+            )
+            entry_id = self._conn.execute("SELECT id FROM sessions WHERE session_key = ?", (session_key,)).fetchone()[0]
+            self._conn.commit()
+            return entry_id
+
+    def _entries(self, rows: List[tuple], transcript: bool = False) -> List[LibraryEntry]:
+        """
+        Converts `_COLUMNS` rows into entries, decoding the transcript if requested.
+        """
+        return [
+            LibraryEntry(*row[:8], transcript=json.loads(row[8]) if transcript else None)
+            for row in rows
+        ]
+
+    def search(self, text: str, limit: int = 10) -> List[LibraryEntry]:
+        """
+        Finds the sessions matching every word of the query, best matches first.
+
+        Ideas and final prompts weigh more than the interview transcript.
+
+        Args:
+            text: The search terms. Word prefixes match too when no whole word does.
+            limit: Maximum number of entries returned.
+
+        Returns:
+            The matching entries, without transcript.
+        """
+        if fts_query(text) is None:
+            return self.recent(limit)
+        with self._lock:
+            if self.fts:
+                # Whole words first: a short prefix can expand to most of the
+                # vocabulary and make ranking scan the whole library
+                for prefix in (False, True):
+                    rows = self._conn.execute(
+                        f"SELECT {_COLUMNS} FROM ("
+                        "SELECT rowid, bm25(sessions_fts, 4.0, 2.0, 1.0) AS score FROM sessions_fts "
+                        "WHERE sessions_fts MATCH ? ORDER BY score LIMIT ?"
+                        ") f JOIN sessions s ON s.id = f.rowid ORDER BY f.score",
+                        (fts_query(text, prefix), limit),
+                    ).fetchall()
+                    if rows:
+                        break
+            else:
+                words = re.findall(r"\w+", text.lower())
+                where = " AND ".join(["(lower(s.idea) || ' ' || lower(s.final_prompt)) LIKE ?"] * len(words))
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM sessions s WHERE {where} ORDER BY s.updated DESC LIMIT ?",
+                    [f"%{word}%" for word in words] + [limit],
+                ).fetchall()
+        return self._entries(rows)
+
+    def recent(self, limit: int = 10) -> List[LibraryEntry]:
+        """
+        Lists the most recently updated sessions.
+
+        Args:
+            limit: Maximum number of entries returned.
+
+        Returns:
+            The entries, newest first, without transcript.
+        """
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS} FROM sessions s ORDER BY s.updated DESC LIMIT ?", (limit,)).fetchall()
+        return self._entries(rows)
+
+    def get(self, entry_id: int) -> Optional[LibraryEntry]:
+        """
+        Loads a session with its transcript.
+
+        Args:
+            entry_id: The entry id, as shown by `/search`.
+
+        Returns:
+            The entry, or None if it doesn't exist.
+        """
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS} FROM sessions s WHERE s.id = ?", (entry_id,)).fetchall()
+        entries = self._entries(rows, transcript=True)
+        return entries[0] if entries else None
+
+    def mark_used(self, entry_id: int):
+        """
+        Records that a session was reused.
+
+        Args:
+            entry_id: The entry id.
+        """
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET uses = uses + 1, updated = ? WHERE id = ?", (time.time(), entry_id))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the size of the library.
+
+        Returns:
+            A dictionary with `entries` and `fts` (1 if the full-text index is available).
+        """
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"entries": count, "fts": int(self.fts)}
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,204 @@
+"""
+This module provides per-turn latency and token instrumentation for consultant sessions.
+
+Every `chat` / `start_consultation` call can be recorded as a TurnMetrics entry
+(wall time, time to first token, token counts from `usage_metadata`, model,
+retries and the phase of the turn). MetricsRecorder aggregates them into
+per-model summaries and exports them as JSONL or in the Prometheus textfile format.
+"""
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+@dataclass
+class TurnMetrics:
+    """
+    Measurements of a single consultant turn.
+    """
+    model: str
+    wall_time: float
+    time_to_first_token: Optional[float] = None
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    thinking_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = 0
+    streamed: bool = False
+    cache_hit: bool = False
+    error: bool = False
+    phase: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_usage(cls, model: str, wall_time: float, usage: Any, **kwargs) -> "TurnMetrics":
+        """
+        Builds a TurnMetrics from a response's `usage_metadata`.
+
+        Args:
+            model: The model that answered the turn.
+            wall_time: The turn's wall time in seconds.
+            usage: The `usage_metadata` of the (last) response, or None.
+            **kwargs: Any other TurnMetrics field.
+
+        Returns:
+            The TurnMetrics entry.
+        """
+        if usage is not None:
+            kwargs.setdefault("prompt_tokens", usage.prompt_token_count or 0)
+            kwargs.setdefault("response_tokens", usage.candidates_token_count or 0)
+            kwargs.setdefault("thinking_tokens", usage.thoughts_token_count or 0)
+            kwargs.setdefault("cached_tokens", usage.cached_content_token_count or 0)
+        return cls(model=model, wall_time=wall_time, **kwargs)
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    Computes a nearest-rank percentile.
+
+    Args:
+        values: The samples.
+        q: The percentile, between 0 and 100.
+
+    Returns:
+        The percentile value, or None if there are no samples.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+class MetricsRecorder:
+    """
+    Collects TurnMetrics entries and exports them.
+
+    Safe to share between the consultants of a process.
+    """
+    def __init__(self):
+        """
+        Initializes an empty MetricsRecorder.
+        """
+        self.turns: List[TurnMetrics] = []
+        self._lock = threading.Lock()
+
+    def record(self, turn: TurnMetrics):
+        """
+        Adds a turn measurement.
+
+        Args:
+            turn: The TurnMetrics entry to add.
+        """
+        with self._lock:
+            self.turns.append(turn)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Aggregates the recorded turns per model.
+
+        Turns served from the response cache are excluded from latency figures.
+
+        Returns:
+            A dictionary keyed by model name with `turns`, `errors`, `retries`,
+            `cache_hits`, `p50`/`p95` wall time, `ttft_p50`/`ttft_p95`, token
+            totals and `tokens_per_second` (output plus thinking tokens over wall time).
+        """
+        with self._lock:
+            turns = list(self.turns)
+        by_model: Dict[str, List[TurnMetrics]] = {}
+        for turn in turns:
+            by_model.setdefault(turn.model, []).append(turn)
+
+        summary = {}
+        for model, entries in by_model.items():
+            timed = [t for t in entries if not t.cache_hit and not t.error]
+            wall = [t.wall_time for t in timed]
+            ttft = [t.time_to_first_token for t in timed if t.time_to_first_token is not None]
+            output_tokens = sum(t.response_tokens + t.thinking_tokens for t in timed)
+            summary[model] = {
+                "turns": len(entries),
+                "errors": sum(1 for t in entries if t.error),
+                "retries": sum(t.retries for t in entries),
+                "cache_hits": sum(1 for t in entries if t.cache_hit),
+                "p50": percentile(wall, 50),
+                "p95": percentile(wall, 95),
+                "ttft_p50": percentile(ttft, 50),
+                "ttft_p95": percentile(ttft, 95),
+                "prompt_tokens": sum(t.prompt_tokens for t in entries),
+                "response_tokens": sum(t.response_tokens for t in entries),
+                "thinking_tokens": sum(t.thinking_tokens for t in entries),
+                "tokens_per_second": output_tokens / sum(wall) if sum(wall) else None,
+            }
+        return summary
+
+    def export_jsonl(self, path: str):
+        """
+        Appends every recorded turn to a JSONL file, one object per turn.
+
+        Args:
+            path: The JSONL file to append to.
+        """
+        with self._lock:
+            turns = list(self.turns)
+        with open(path, "a", encoding="utf-8") as f:
+            for turn in turns:
+                f.write(json.dumps(asdict(turn)) + "\n")
+
+    def export_prometheus(self, path: str):
+        """
+        Writes the aggregated metrics in the Prometheus textfile collector format.
+
+        The file is replaced atomically so the collector never reads a partial file.
+
+        Args:
+            path: The `.prom` file to write.
+        """
+        with self._lock:
+            turns = list(self.turns)
+        by_model: Dict[str, List[TurnMetrics]] = {}
+        for turn in turns:
+            by_model.setdefault(turn.model, []).append(turn)
+
+        lines = []
+        for metric, attribute, help_text in (
+            ("prompt_consultant_turn_duration_seconds", "wall_time", "Wall time of consultant turns."),
+            ("prompt_consultant_time_to_first_token_seconds", "time_to_first_token", "Time to the first response token."),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for model, entries in sorted(by_model.items()):
+                values = [getattr(t, attribute) for t in entries if not t.cache_hit and not t.error and getattr(t, attribute) is not None]
+                for quantile in (0.5, 0.95):
+                    value = percentile(values, quantile * 100)
+                    if value is not None:
+                        lines.append(f'{metric}{{model="{model}",quantile="{quantile}"}} {value:.6f}')
+                lines.append(f'{metric}_sum{{model="{model}"}} {sum(values):.6f}')
+                lines.append(f'{metric}_count{{model="{model}"}} {len(values)}')
+
+        lines.append("# HELP prompt_consultant_tokens_total Tokens used by consultant turns.")
+        lines.append("# TYPE prompt_consultant_tokens_total counter")
+        for model, entries in sorted(by_model.items()):
+            for kind in ("prompt", "response", "thinking", "cached"):
+                total = sum(getattr(t, f"{kind}_tokens") for t in entries)
+                lines.append(f'prompt_consultant_tokens_total{{model="{model}",kind="{kind}"}} {total}')
+
+        for metric, attribute, help_text in (
+            ("prompt_consultant_turns_total", None, "Consultant turns."),
+            ("prompt_consultant_turn_errors_total", "error", "Consultant turns that failed."),
+            ("prompt_consultant_turn_retries_total", "retries", "Retries performed by consultant turns."),
+            ("prompt_consultant_cache_hits_total", "cache_hit", "Consultant turns served from the response cache."),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for model, entries in sorted(by_model.items()):
+                total = len(entries) if attribute is None else sum(int(getattr(t, attribute)) for t in entries)
+                lines.append(f'{metric}{{model="{model}"}} {total}')
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
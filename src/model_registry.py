@@ -0,0 +1,279 @@
+"""
+This module provides the ModelRegistry class, a local cache of the metadata of
+the Gemini models available to an API key.
+
+The model list is fetched once with `client.models.list()` and stored in
+`models_cache.json` next to `config.json`. Until the cache expires, model
+menus, validation of model names and capability checks (e.g. context caching)
+are answered locally, without a network round trip; an expired cache keeps
+being used while a refresh runs in the background.
+
+The Gemini SDK is only imported when a refresh actually runs, so reading the
+registry at startup stays cheap.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+CACHE_FILE = "models_cache.json"
+
+# Models offered in the selection menus, in this order, when they are available
+DEFAULT_MODELS = [
+    "gemini-2.5-flash",
+    "gemini-2.5-pro",
+    "gemini-2.5-flash-lite",
+    "gemini-2.0-flash",
+    "gemini-3-flash-preview",
+    "gemma-3-27b-it",
+]
+
+@dataclass
+class ModelInfo:
+    """
+    Metadata of a model, as returned by the Gemini API.
+    """
+    name: str
+    display_name: str = ""
+    input_token_limit: Optional[int] = None
+    output_token_limit: Optional[int] = None
+    supported_actions: List[str] = field(default_factory=list)
+    thinking: Optional[bool] = None
+
+    @property
+    def supports_generation(self) -> bool:
+        """True if the model can answer chat turns."""
+        return "generateContent" in self.supported_actions
+
+    @property
+    def supports_caching(self) -> bool:
+        """True if the model accepts context caches."""
+        return "createCachedContent" in self.supported_actions
+
+    @classmethod
+    def from_model(cls, model: Any) -> "ModelInfo":
+        """
+        Builds a ModelInfo from a `types.Model` returned by the SDK.
+
+        Args:
+            model: The SDK model object.
+
+        Returns:
+            The corresponding ModelInfo, with the `models/` prefix removed from the name.
+        """
+        name = model.name or ""
+        if name.startswith("models/"):
+            name = name[len("models/"):]
+        return cls(
+            name=name,
+            display_name=model.display_name or "",
+            input_token_limit=model.input_token_limit,
+            output_token_limit=model.output_token_limit,
+            supported_actions=list(model.supported_actions or []),
+            thinking=model.thinking,
+        )
+
+class ModelRegistry:
+    """
+    Cached registry of the models available to an API key.
+
+    Safe to share between threads: lookups read the last loaded snapshot while
+    a refresh replaces it.
+    """
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 24 * 3600, debug: bool = False):
+        """
+        Initializes the ModelRegistry and loads the on-disk cache, if any.
+
+        Args:
+            path: Path of the cache file. Defaults to `models_cache.json` next to `config.json`.
+            ttl_seconds: Age in seconds after which the cache is refreshed.
+            debug: If True, prints debug information about refreshes.
+        """
+        self.path = path or os.path.join(os.path.dirname(os.path.dirname(__file__)), CACHE_FILE)
+        self.ttl_seconds = ttl_seconds
+        self.debug = debug
+        self.fetched_at: Optional[float] = None
+        self._models: Dict[str, ModelInfo] = {}
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._load()
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], debug: bool = False) -> "ModelRegistry":
+        """
+        Builds a ModelRegistry from the `model_registry` section of the configuration.
+
+        Args:
+            settings: The settings dictionary (may contain `path` and `ttl_seconds`).
+            debug: If True, prints debug information about refreshes.
+
+        Returns:
+            The configured ModelRegistry.
+        """
+        return cls(path=settings.get("path"), ttl_seconds=float(settings.get("ttl_seconds", 24 * 3600)), debug=debug)
+
+    def _load(self):
+        """
+        Loads the cached model list from disk. A missing or corrupt file leaves the registry empty.
+        """
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            models = {m["name"]: ModelInfo(**m) for m in data.get("models", [])}
+            fetched_at = float(data["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        with self._lock:
+            self._models = models
+            self.fetched_at = fetched_at
+
+    def _save(self):
+        """
+        Writes the model list to disk, replacing the previous file atomically.
+        """
+        with self._lock:
+            data = {"fetched_at": self.fetched_at, "models": [asdict(m) for m in self._models.values()]}
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".models_cache.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def is_stale(self) -> bool:
+        """
+        Checks whether the cache is missing or older than the TTL.
+
+        Returns:
+            True if the model list should be fetched again.
+        """
+        return self.fetched_at is None or time.time() - self.fetched_at > self.ttl_seconds
+
+    def refresh(self, api_key: str) -> bool:
+        """
+        Fetches the model list from the Gemini API and stores it on disk.
+
+        Args:
+            api_key: The API key whose models are listed.
+
+        Returns:
+            True if the list was fetched, False if the request failed (the previous cache is kept).
+        """
+        # Imported here so that reading the cache never loads the SDK
+        from src.client_pool import get_client
+
+        try:
+            models = {info.name: info for info in map(ModelInfo.from_model, get_client(api_key).models.list())}
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] Model list refresh failed: {e}")
+            return False
+        with self._lock:
+            self._models = models
+            self.fetched_at = time.time()
+        try:
+            self._save()
+        except OSError as e:
+            if self.debug:
+                print(f"[DEBUG] Could not write {self.path}: {e}")
+        if self.debug:
+            print(f"[DEBUG] Model list refreshed: {len(models)} models")
+        return True
+
+    def refresh_in_background(self, api_key: str) -> bool:
+        """
+        Starts a refresh on a daemon thread if the cache is stale.
+
+        Lookups keep answering from the current snapshot meanwhile.
+
+        Args:
+            api_key: The API key whose models are listed.
+
+        Returns:
+            True if a refresh was started (or is already running).
+        """
+        if not self.is_stale():
+            return False
+        if self._refresh_thread is None or not self._refresh_thread.is_alive():
+            self._refresh_thread = threading.Thread(target=self.refresh, args=(api_key,), daemon=True)
+            self._refresh_thread.start()
+        return True
+
+    def get(self, name: str) -> Optional[ModelInfo]:
+        """
+        Looks up the metadata of a model.
+
+        Args:
+            name: The model name, with or without the `models/` prefix.
+
+        Returns:
+            The ModelInfo, or None if the model is not in the cache.
+        """
+        if name.startswith("models/"):
+            name = name[len("models/"):]
+        with self._lock:
+            return self._models.get(name)
+
+    def models(self) -> List[ModelInfo]:
+        """
+        Returns the cached models that can answer chat turns.
+
+        Returns:
+            The ModelInfo of every model supporting `generateContent`, sorted by name.
+        """
+        with self._lock:
+            return sorted((m for m in self._models.values() if m.supports_generation), key=lambda m: m.name)
+
+    def menu(self) -> List[str]:
+        """
+        Returns the model names offered in the selection menus.
+
+        These are the DEFAULT_MODELS that are still available, or all of
+        DEFAULT_MODELS while the model list has never been fetched.
+
+        Returns:
+            The model names, in menu order.
+        """
+        with self._lock:
+            if not self._models:
+                return list(DEFAULT_MODELS)
+            available = [name for name in DEFAULT_MODELS if name in self._models]
+        return available or [m.name for m in self.models()]
+
+    def validate(self, name: str) -> Optional[bool]:
+        """
+        Checks a model name against the cached model list, without network access.
+
+        Args:
+            name: The model name to check.
+
+        Returns:
+            True if the model is known and can answer chat turns, False if it is
+            unknown or cannot, None if the model list has never been fetched or
+            the model is served by another backend (`<backend>:<model>`).
+        """
+        with self._lock:
+            if not self._models or ":" in name:
+                return None
+        info = self.get(name)
+        return info is not None and info.supports_generation
+
+    def supports_caching(self, name: str) -> Optional[bool]:
+        """
+        Checks whether a model accepts context caches.
+
+        Args:
+            name: The model name to check.
+
+        Returns:
+            True or False according to the cached metadata, or None if the model is unknown.
+        """
+        info = self.get(name)
+        return None if info is None else info.supports_caching
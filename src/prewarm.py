@@ -0,0 +1,61 @@
+"""
+This module provides BackgroundTask, a small helper to run setup work on a
+background thread while the CLI waits for user input.
+
+The consultant (SDK import, client, chat session and the first TLS connection)
+is built and warmed up this way as soon as the API key and model are known,
+so the first answer only costs the generation itself.
+"""
+import threading
+from typing import Any, Callable, Optional
+
+class BackgroundTask:
+    """
+    Runs a callable on a daemon thread and hands over its result on demand.
+    """
+    def __init__(self, target: Callable[..., Any], *args, **kwargs):
+        """
+        Starts running `target(*args, **kwargs)` in the background.
+
+        Args:
+            target: The callable to run.
+            *args: Positional arguments for the callable.
+            **kwargs: Keyword arguments for the callable.
+        """
+        self._result: Any = None
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, args=(target, args, kwargs), daemon=True)
+        self._thread.start()
+
+    def _run(self, target: Callable[..., Any], args: tuple, kwargs: dict):
+        """
+        Thread body: stores the result or the raised exception.
+        """
+        try:
+            self._result = target(*args, **kwargs)
+        except BaseException as e:
+            self._error = e
+
+    def done(self) -> bool:
+        """
+        Checks whether the background work has finished.
+
+        Returns:
+            True if the callable has returned or raised.
+        """
+        return not self._thread.is_alive()
+
+    def result(self) -> Any:
+        """
+        Waits for the background work to finish and returns its result.
+
+        Returns:
+            The value returned by the callable.
+
+        Raises:
+            BaseException: Whatever the callable raised.
+        """
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
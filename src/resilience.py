@@ -0,0 +1,585 @@
+"""
+This module implements the request policy applied to every model call:
+per-attempt deadlines, retries with exponential backoff and jitter that honour
+the server's retry-after hints, optional hedged requests and a model fallback chain.
+
+Streams get the same deadline until their first chunk arrives; after that,
+only the HTTP client's read timeout applies, as a long reply may take a while.
+
+Calls are made statelessly (the caller passes the full history with every
+attempt and records the winning response itself), so retries, hedges and
+fallbacks never leave duplicate or partial turns in the chat history.
+
+If the policy has a QuotaScheduler, every attempt waits for its share of the
+RPM/TPM quota first (outside of the attempt's deadline), reports its actual
+token usage, and pauses the other callers when it is rate limited.
+"""
+import asyncio
+import itertools
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from google.genai import errors
+
+from src.metrics import percentile
+
+if TYPE_CHECKING:
+    from src.scheduler import QuotaScheduler, QuotaTicket
+
+# HTTP statuses worth retrying: timeouts, rate limits and transient server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Statuses after which the next model of the fallback chain is tried right away
+FALLBACK_STATUS = {404} | RETRYABLE_STATUS
+
+# Shared pool running blocking SDK calls, so they can be timed out, hedged and interrupted
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="gemini-call")
+
+class RequestTimeout(Exception):
+    """
+    Raised when a single attempt exceeds the policy's deadline.
+    """
+
+@dataclass
+class CallResult:
+    """
+    Outcome of a call made through a RequestPolicy.
+    """
+    response: Any
+    model: str
+    retries: int
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Checks whether a failed attempt may succeed if retried.
+
+    Args:
+        error: The exception raised by the attempt.
+
+    Returns:
+        True for timeouts, connection errors, rate limits and transient server errors.
+    """
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    return isinstance(error, (RequestTimeout, asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError, ConnectionError))
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Extracts the server's suggested wait from a failed attempt.
+
+    Looks at the `Retry-After` header and at the `RetryInfo.retryDelay` detail
+    Gemini attaches to 429 responses.
+
+    Args:
+        error: The exception raised by the attempt.
+
+    Returns:
+        The suggested wait in seconds, or None if the server gave none.
+    """
+    if not isinstance(error, errors.APIError):
+        return None
+    headers = getattr(error.response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    details = error.details.get("error", {}).get("details", []) if isinstance(error.details, dict) else []
+    for detail in details:
+        match = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+        if match:
+            return float(match.group(1))
+    return None
+
+class RequestPolicy:
+    """
+    Deadlines, retries, hedging and fallback settings, plus the latency samples used for hedging.
+
+    Safe to share between consultants.
+    """
+    def __init__(self, timeout: Optional[float] = 120.0, max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0, hedge: bool = False, hedge_after: Optional[float] = None, hedge_min_samples: int = 20, fallback_models: Optional[List[str]] = None, scheduler: Optional["QuotaScheduler"] = None):
+        """
+        Initializes the RequestPolicy.
+
+        Args:
+            timeout: Deadline in seconds for each attempt. None means no deadline.
+            max_retries: Retries per model before moving down the fallback chain.
+            backoff_base: Base of the exponential backoff, in seconds.
+            backoff_max: Upper bound of a single backoff wait, in seconds.
+            hedge: If True, a duplicate request is sent when the first one is slow.
+            hedge_after: Fixed delay in seconds before hedging. None uses the
+                observed p95 latency of the model.
+            hedge_min_samples: Latency samples needed before the p95 is trusted.
+            fallback_models: Models tried in order when the primary one keeps failing.
+            scheduler: An optional QuotaScheduler every attempt waits on.
+        """
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.hedge_min_samples = hedge_min_samples
+        self.fallback_models = list(fallback_models or [])
+        self.scheduler = scheduler
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], scheduler: Optional["QuotaScheduler"] = None) -> "RequestPolicy":
+        """
+        Builds a RequestPolicy from the `request_policy` section of the configuration.
+
+        Args:
+            settings: A dictionary with any of the constructor's arguments.
+            scheduler: An optional QuotaScheduler every attempt waits on.
+
+        Returns:
+            A configured RequestPolicy.
+        """
+        keys = ("timeout", "max_retries", "backoff_base", "backoff_max", "hedge", "hedge_after", "hedge_min_samples", "fallback_models")
+        return cls(scheduler=scheduler, **{k: settings[k] for k in keys if k in settings})
+
+    def models(self, primary: str) -> List[str]:
+        """
+        Returns the models to try, in order.
+
+        Args:
+            primary: The consultant's current model.
+
+        Returns:
+            The primary model followed by the fallback chain.
+        """
+        return [primary] + [m for m in self.fallback_models if m != primary]
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """
+        Computes the wait before the next retry.
+
+        Uses "full jitter" exponential backoff, but never waits less than the
+        server's retry-after hint.
+
+        Args:
+            attempt: Zero-based index of the failed attempt.
+            error: The exception raised by the attempt.
+
+        Returns:
+            The wait in seconds.
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        hint = retry_after(error)
+        return max(delay, hint) if hint is not None else delay
+
+    def admit(self, model: str, quota_key: Optional[str], tokens: int) -> Optional["QuotaTicket"]:
+        """
+        Waits for the quota of an attempt, if a scheduler is set.
+
+        Args:
+            model: The model called.
+            quota_key: The API key the call is made with.
+            tokens: Estimated input tokens of the request.
+
+        Returns:
+            The ticket to pass to `settle` and `throttled`, or None.
+        """
+        return self.scheduler.acquire(quota_key, model, tokens) if self.scheduler else None
+
+    async def aadmit(self, model: str, quota_key: Optional[str], tokens: int) -> Optional["QuotaTicket"]:
+        """
+        Asynchronous counterpart of `admit`.
+        """
+        return await self.scheduler.aacquire(quota_key, model, tokens) if self.scheduler else None
+
+    def settle(self, ticket: Optional["QuotaTicket"], usage: Any):
+        """
+        Reports the actual token usage of an admitted attempt.
+
+        Args:
+            ticket: The ticket returned by `admit`, or None.
+            usage: The response's `usage_metadata`, or None.
+        """
+        if ticket is not None:
+            self.scheduler.settle(ticket, usage)
+
+    def throttled(self, ticket: Optional["QuotaTicket"], error: BaseException, delay: float):
+        """
+        Pauses every caller of the model if an attempt was rate limited.
+
+        Args:
+            ticket: The ticket returned by `admit`, or None.
+            error: The exception raised by the attempt.
+            delay: The wait before this caller's retry.
+        """
+        if ticket is not None and isinstance(error, errors.APIError) and error.code == 429:
+            self.scheduler.penalize(ticket, delay)
+
+    def observe(self, model: str, latency: float):
+        """
+        Records the latency of a successful attempt.
+
+        Args:
+            model: The model that answered.
+            latency: The attempt's duration in seconds.
+        """
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=200)).append(latency)
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """
+        Returns how long to wait before sending a hedged duplicate request.
+
+        Args:
+            model: The model being called.
+
+        Returns:
+            The delay in seconds, or None if hedging is off or not enough samples exist yet.
+        """
+        if not self.hedge:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        with self._lock:
+            samples = list(self._latencies.get(model, ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return percentile(samples, 95)
+
+def _first_result(futures: List[Future], timeout: Optional[float]) -> Any:
+    """
+    Waits for the first future that succeeds.
+
+    Args:
+        futures: The running attempts.
+        timeout: Maximum wait in seconds, or None.
+
+    Returns:
+        The result of the first successful future.
+
+    Raises:
+        RequestTimeout: If none succeeds in time.
+        Exception: The error of the last failed future if all of them failed.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = set(futures)
+    error: Optional[BaseException] = None
+    while pending:
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    if pending or error is None:
+        raise RequestTimeout(f"no response within {timeout}s")
+    raise error
+
+def _attempt(policy: RequestPolicy, call: Callable[[str], Any], model: str) -> Any:
+    """
+    Runs one attempt on the thread pool, hedging it if it is slow.
+
+    Args:
+        policy: The request policy.
+        call: Function performing the SDK call for a given model.
+        model: The model to call.
+
+    Returns:
+        The SDK response.
+    """
+    futures = [_executor.submit(call, model)]
+    delay = policy.hedge_delay(model)
+    if delay is not None and (policy.timeout is None or delay < policy.timeout):
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            futures.append(_executor.submit(call, model))
+            timeout = None if policy.timeout is None else policy.timeout - delay
+            return _first_result(futures, timeout)
+    return _first_result(futures, policy.timeout)
+
+def call_with_policy(policy: RequestPolicy, call: Callable[[str], Any], primary_model: str, quota_key: Optional[str] = None, tokens: int = 0) -> CallResult:
+    """
+    Performs a blocking call with deadlines, retries, hedging and fallback.
+
+    The wait happens in the calling thread, so Ctrl-C interrupts it with
+    KeyboardInterrupt without waiting for the HTTP request.
+
+    Args:
+        policy: The request policy.
+        call: Function performing the SDK call for a given model name.
+        primary_model: The consultant's current model.
+        quota_key: The API key the call is made with, for the quota scheduler.
+        tokens: Estimated input tokens of the request, for the quota scheduler.
+
+    Returns:
+        The response, the model that produced it and the number of retries.
+
+    Raises:
+        Exception: The last error if every attempt on every model failed.
+    """
+    retries = 0
+    error: Optional[BaseException] = None
+    for model in policy.models(primary_model):
+        for attempt in range(policy.max_retries + 1):
+            ticket = policy.admit(model, quota_key, tokens)
+            started = time.perf_counter()
+            try:
+                response = _attempt(policy, call, model)
+            except Exception as e:
+                error = e
+                delay = policy.backoff(attempt, e)
+                policy.throttled(ticket, e, delay)
+                if not is_retryable(e) or attempt == policy.max_retries:
+                    break
+                time.sleep(delay)
+                retries += 1
+                continue
+            policy.observe(model, time.perf_counter() - started)
+            policy.settle(ticket, getattr(response, "usage_metadata", None))
+            return CallResult(response, model, retries)
+        if not (isinstance(error, errors.APIError) and error.code in FALLBACK_STATUS) and not is_retryable(error):
+            break
+        retries += 1
+    raise error
+
+def _open_stream(policy: RequestPolicy, open_stream: Callable[[str], Iterator[Any]], model: str) -> Tuple[Iterator[Any], List[Any]]:
+    """
+    Opens a stream on the thread pool and waits for its first chunk within the policy's deadline.
+
+    Args:
+        policy: The request policy.
+        open_stream: Function opening the SDK stream for a given model name.
+        model: The model to call.
+
+    Returns:
+        The stream and a list holding its first chunk (empty if it ended without any).
+
+    Raises:
+        RequestTimeout: If no chunk arrives in time.
+    """
+    def first() -> Tuple[Iterator[Any], List[Any]]:
+        stream = iter(open_stream(model))
+        return stream, list(itertools.islice(stream, 1))
+
+    return _first_result([_executor.submit(first)], policy.timeout)
+
+def stream_with_policy(policy: RequestPolicy, open_stream: Callable[[str], Iterator[Any]], primary_model: str, quota_key: Optional[str] = None, tokens: int = 0) -> Iterator[Tuple[Any, str, int]]:
+    """
+    Streams a response, retrying and falling back only until the first chunk arrives.
+
+    Each attempt must deliver its first chunk within `policy.timeout`. Once a
+    chunk has been yielded, errors are raised as-is: the caller has already
+    shown part of the reply.
+
+    Args:
+        policy: The request policy.
+        open_stream: Function opening the SDK stream for a given model name.
+        primary_model: The consultant's current model.
+        quota_key: The API key the call is made with, for the quota scheduler.
+        tokens: Estimated input tokens of the request, for the quota scheduler.
+
+    Yields:
+        `(chunk, model, retries)` tuples.
+
+    Raises:
+        Exception: The last error if every attempt on every model failed.
+    """
+    retries = 0
+    error: Optional[BaseException] = None
+    for model in policy.models(primary_model):
+        for attempt in range(policy.max_retries + 1):
+            ticket = policy.admit(model, quota_key, tokens)
+            received = False
+            usage = None
+            try:
+                stream, first = _open_stream(policy, open_stream, model)
+                for chunk in itertools.chain(first, stream):
+                    received = True
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    yield chunk, model, retries
+                policy.settle(ticket, usage)
+                return
+            except Exception as e:
+                if received:
+                    raise
+                error = e
+                delay = policy.backoff(attempt, e)
+                policy.throttled(ticket, e, delay)
+                if not is_retryable(e) or attempt == policy.max_retries:
+                    break
+                time.sleep(delay)
+                retries += 1
+        if not (isinstance(error, errors.APIError) and error.code in FALLBACK_STATUS) and not is_retryable(error):
+            break
+        retries += 1
+    raise error
+
+async def _aattempt(policy: RequestPolicy, call: Callable[[str], Awaitable[Any]], model: str) -> Any:
+    """
+    Asynchronous counterpart of `_attempt`.
+
+    Args:
+        policy: The request policy.
+        call: Function returning the SDK coroutine for a given model.
+        model: The model to call.
+
+    Returns:
+        The SDK response.
+    """
+    tasks = [asyncio.ensure_future(call(model))]
+    deadline = None if policy.timeout is None else time.monotonic() + policy.timeout
+    delay = policy.hedge_delay(model)
+    try:
+        if delay is not None and (policy.timeout is None or delay < policy.timeout):
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(call(model)))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        if pending or error is None:
+            raise RequestTimeout(f"no response within {policy.timeout}s")
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def acall_with_policy(policy: RequestPolicy, call: Callable[[str], Awaitable[Any]], primary_model: str, quota_key: Optional[str] = None, tokens: int = 0) -> CallResult:
+    """
+    Asynchronous counterpart of `call_with_policy`.
+
+    Args:
+        policy: The request policy.
+        call: Function returning the SDK coroutine for a given model name.
+        primary_model: The consultant's current model.
+        quota_key: The API key the call is made with, for the quota scheduler.
+        tokens: Estimated input tokens of the request, for the quota scheduler.
+
+    Returns:
+        The response, the model that produced it and the number of retries.
+
+    Raises:
+        Exception: The last error if every attempt on every model failed.
+    """
+    retries = 0
+    error: Optional[BaseException] = None
+    for model in policy.models(primary_model):
+        for attempt in range(policy.max_retries + 1):
+            ticket = await policy.aadmit(model, quota_key, tokens)
+            started = time.perf_counter()
+            try:
+                response = await _aattempt(policy, call, model)
+            except Exception as e:
+                error = e
+                delay = policy.backoff(attempt, e)
+                policy.throttled(ticket, e, delay)
+                if not is_retryable(e) or attempt == policy.max_retries:
+                    break
+                await asyncio.sleep(delay)
+                retries += 1
+                continue
+            policy.observe(model, time.perf_counter() - started)
+            policy.settle(ticket, getattr(response, "usage_metadata", None))
+            return CallResult(response, model, retries)
+        if not (isinstance(error, errors.APIError) and error.code in FALLBACK_STATUS) and not is_retryable(error):
+            break
+        retries += 1
+    raise error
+
+async def _aopen_stream(policy: RequestPolicy, open_stream: Callable[[str], Awaitable[AsyncIterator[Any]]], model: str) -> Tuple[AsyncIterator[Any], List[Any]]:
+    """
+    Asynchronous counterpart of `_open_stream`.
+
+    Args:
+        policy: The request policy.
+        open_stream: Function returning the coroutine that opens the SDK stream for a given model.
+        model: The model to call.
+
+    Returns:
+        The stream and a list holding its first chunk (empty if it ended without any).
+
+    Raises:
+        RequestTimeout: If no chunk arrives in time.
+    """
+    async def first() -> Tuple[AsyncIterator[Any], List[Any]]:
+        stream = (await open_stream(model)).__aiter__()
+        try:
+            return stream, [await stream.__anext__()]
+        except StopAsyncIteration:
+            return stream, []
+
+    try:
+        return await asyncio.wait_for(first(), policy.timeout)
+    except asyncio.TimeoutError:
+        raise RequestTimeout(f"no response within {policy.timeout}s") from None
+
+async def _achain(first: List[Any], stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """
+    Yields the chunks already received, then the rest of the stream.
+    """
+    for chunk in first:
+        yield chunk
+    async for chunk in stream:
+        yield chunk
+
+async def astream_with_policy(policy: RequestPolicy, open_stream: Callable[[str], Awaitable[AsyncIterator[Any]]], primary_model: str, quota_key: Optional[str] = None, tokens: int = 0) -> AsyncIterator[Tuple[Any, str, int]]:
+    """
+    Asynchronous counterpart of `stream_with_policy`.
+
+    Args:
+        policy: The request policy.
+        open_stream: Function returning the coroutine that opens the SDK stream for a given model.
+        primary_model: The consultant's current model.
+        quota_key: The API key the call is made with, for the quota scheduler.
+        tokens: Estimated input tokens of the request, for the quota scheduler.
+
+    Yields:
+        `(chunk, model, retries)` tuples.
+
+    Raises:
+        Exception: The last error if every attempt on every model failed.
+    """
+    retries = 0
+    error: Optional[BaseException] = None
+    for model in policy.models(primary_model):
+        for attempt in range(policy.max_retries + 1):
+            ticket = await policy.aadmit(model, quota_key, tokens)
+            received = False
+            usage = None
+            try:
+                stream, first = await _aopen_stream(policy, open_stream, model)
+                async for chunk in _achain(first, stream):
+                    received = True
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    yield chunk, model, retries
+                policy.settle(ticket, usage)
+                return
+            except Exception as e:
+                if received:
+                    raise
+                error = e
+                delay = policy.backoff(attempt, e)
+                policy.throttled(ticket, e, delay)
+                if not is_retryable(e) or attempt == policy.max_retries:
+                    break
+                await asyncio.sleep(delay)
+                retries += 1
+        if not (isinstance(error, errors.APIError) and error.code in FALLBACK_STATUS) and not is_retryable(error):
+            break
+        retries += 1
+    raise error
@@ -0,0 +1,180 @@
+"""
+This module provides the ResponseCache class, a persistent on-disk cache of
+consultant replies backed by SQLite.
+
+Entries are keyed by a hash of everything that determines a reply: the model
+name, the generation config (including the system instruction), the full
+conversation history and the new user message. The cache is bounded by entry
+count, total size and age; when over budget, the least recently used entries
+are evicted first.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+CACHE_FILE = "response_cache.sqlite3"
+
+def make_cache_key(model_name: str, config: Dict[str, Any], history: List[Dict[str, Any]], user_text: str) -> str:
+    """
+    Computes the cache key of a conversation turn.
+
+    Args:
+        model_name: The name of the model answering the turn.
+        config: The JSON-serializable generation config, including the system instruction.
+        history: The JSON-serializable conversation history preceding the turn.
+        user_text: The user's message for this turn.
+
+    Returns:
+        A hex SHA-256 digest identifying the turn.
+    """
+    payload = json.dumps(
+        {"model": model_name, "config": config, "history": history, "message": user_text},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    SQLite-backed LRU cache of model replies with TTL and size limits.
+
+    Safe to share between threads of a process; several processes can use the
+    same file, relying on SQLite's own locking.
+    """
+    def __init__(self, path: Optional[str] = None, max_entries: int = 5000, max_bytes: int = 50 * 1024 * 1024, ttl_seconds: float = 7 * 24 * 3600):
+        """
+        Initializes the ResponseCache, creating the database if needed.
+
+        Args:
+            path: Path of the SQLite file. Defaults to `response_cache.sqlite3` next to `config.json`.
+            max_entries: Maximum number of cached replies.
+            max_bytes: Maximum total size in bytes of the cached replies.
+            ttl_seconds: Age in seconds after which an entry is no longer served.
+        """
+        self.path = path or os.path.join(os.path.dirname(os.path.dirname(__file__)), CACHE_FILE)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "ResponseCache":
+        """
+        Builds a ResponseCache from the `response_cache` section of the configuration.
+
+        Args:
+            settings: A dictionary that may contain `path`, `max_entries`, `max_bytes` and `ttl_seconds`.
+
+        Returns:
+            A configured ResponseCache.
+        """
+        keys = ("path", "max_entries", "max_bytes", "ttl_seconds")
+        return cls(**{k: settings[k] for k in keys if k in settings})
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Looks up a cached reply and marks it as recently used.
+
+        Args:
+            key: The cache key, as returned by `make_cache_key`.
+
+        Returns:
+            The cached reply, or None on a miss or if the entry has expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        """
+        Stores a reply and evicts entries until the cache is within its limits.
+
+        Args:
+            key: The cache key, as returned by `make_cache_key`.
+            value: The reply to cache.
+        """
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """
+        Removes expired entries, then least recently used ones until within limits.
+
+        Must be called with the lock held; the caller commits.
+
+        Args:
+            now: The current timestamp.
+        """
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def clear(self):
+        """
+        Removes every cached reply and resets the counters.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters and current size.
+
+        Returns:
+            A dictionary with `hits`, `misses`, `entries` and `bytes`.
+        """
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total}
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._conn.close()
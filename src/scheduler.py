@@ -0,0 +1,316 @@
+"""
+This module provides the QuotaScheduler, which keeps model calls under the
+per-minute quotas of an API key.
+
+Every (API key, model) pair has two token buckets: requests per minute (RPM)
+and tokens per minute (TPM). Each attempt made through a RequestPolicy
+(retries and fallbacks included) first takes one request and its estimated
+tokens from the buckets, waiting for them to refill if needed; when the
+response arrives the estimate is replaced by the actual token usage. A 429
+pauses the pair for every caller until the retry delay has passed.
+
+The buckets are stored in a small SQLite file and updated in `BEGIN IMMEDIATE`
+transactions, so every interactive session, batch run and server on the host
+draws from the same buckets: their combined throughput stays just under the
+quota instead of bursting into 429s and backing off together. Buckets hold
+`burst_seconds` worth of quota, so no caller can spend a minute's quota at once.
+
+Interactive turns go first: batch calls leave `batch_reserve` of each bucket
+untouched, and hold back while an interactive call is waiting for quota.
+Hedged duplicate requests are not charged separately.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+STATE_FILE = "quota_state.sqlite3"
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Longest single sleep: waiting callers re-check the shared state at least this often
+MAX_POLL = 2.0
+
+def key_id(api_key: Optional[str]) -> str:
+    """
+    Derives the identifier of an API key used in the state file, so the key itself isn't stored.
+
+    Args:
+        api_key: The API key, or None.
+
+    Returns:
+        A short hex digest.
+    """
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+@dataclass
+class QuotaLimit:
+    """
+    Per-minute limits of a model. None means unlimited.
+    """
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+
+@dataclass
+class QuotaTicket:
+    """
+    Quota taken by one attempt, to be settled once its usage is known.
+    """
+    bucket: str
+    limit: QuotaLimit
+    tokens: int
+
+class QuotaScheduler:
+    """
+    RPM/TPM token buckets per API key and model, shared by every process on the host.
+
+    Safe to share between threads of a process.
+    """
+    def __init__(self, limits: Dict[str, Dict[str, float]], path: Optional[str] = None, priority: str = INTERACTIVE, burst_seconds: float = 10.0, batch_reserve: float = 0.2, output_tokens: int = 1024, debug: bool = False):
+        """
+        Initializes the QuotaScheduler, creating the state file if needed.
+
+        Args:
+            limits: Maps model names to {"rpm": ..., "tpm": ...}. The "default"
+                entry applies to Gemini models without an entry of their own;
+                models of other backends (`local:...`) are only limited if listed.
+            path: Path of the SQLite state file. Defaults to `quota_state.sqlite3` next to `config.json`.
+            priority: INTERACTIVE or BATCH, the priority of this process' calls.
+            burst_seconds: Capacity of the buckets, in seconds of quota.
+            batch_reserve: Fraction of each bucket batch calls leave to interactive ones.
+            output_tokens: Tokens reserved for the reply of each call, on top of
+                the estimated input, until the actual usage is known.
+            debug: If True, prints every wait.
+        """
+        self.limits = {
+            model: QuotaLimit(limit.get("rpm"), limit.get("tpm"))
+            for model, limit in limits.items()
+            if limit.get("rpm") or limit.get("tpm")
+        }
+        self.path = path or os.path.join(os.path.dirname(os.path.dirname(__file__)), STATE_FILE)
+        self.priority = priority
+        self.burst_seconds = max(1.0, burst_seconds)
+        self.batch_reserve = min(max(batch_reserve, 0.0), 0.9)
+        self.output_tokens = output_tokens
+        self.debug = debug
+        self.waits = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+        # Transactions are managed explicitly
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "bucket TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL, "
+            "blocked_until REAL NOT NULL DEFAULT 0, urgent_until REAL NOT NULL DEFAULT 0)"
+        )
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], priority: str = INTERACTIVE, debug: bool = False) -> Optional["QuotaScheduler"]:
+        """
+        Builds a QuotaScheduler from the `quota` section of the configuration.
+
+        Args:
+            settings: A dictionary that may contain `limits`, `path`,
+                `burst_seconds`, `batch_reserve` and `output_tokens`.
+            priority: INTERACTIVE or BATCH.
+            debug: If True, prints every wait.
+
+        Returns:
+            A configured QuotaScheduler, or None if no limit is set.
+        """
+        if not settings.get("limits"):
+            return None
+        keys = ("path", "burst_seconds", "batch_reserve", "output_tokens")
+        return cls(settings["limits"], priority=priority, debug=debug, **{k: settings[k] for k in keys if k in settings})
+
+    def limit(self, model: str) -> Optional[QuotaLimit]:
+        """
+        Returns the limits applying to a model.
+
+        Args:
+            model: The model name, optionally prefixed with its backend.
+
+        Returns:
+            The QuotaLimit, or None if the model is unlimited.
+        """
+        if model in self.limits:
+            return self.limits[model]
+        return None if ":" in model else self.limits.get("default")
+
+    def _take(self, ticket: QuotaTicket, now: float) -> float:
+        """
+        Takes a ticket's request and tokens from its buckets if they hold enough.
+
+        Returns:
+            0 if the quota was taken, else the seconds to wait before trying again.
+        """
+        limit, priority = ticket.limit, self.priority
+        rates = {"requests": limit.rpm, "tokens": limit.tpm}
+        costs = {"requests": 1.0, "tokens": float(ticket.tokens)}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT requests, tokens, updated, blocked_until, urgent_until FROM buckets WHERE bucket = ?", (ticket.bucket,)
+                ).fetchone()
+                levels, wait = {}, 0.0
+                for i, (name, rate) in enumerate(rates.items()):
+                    if not rate:
+                        levels[name] = 0.0
+                        continue
+                    capacity = rate / 60 * self.burst_seconds
+                    # A new bucket starts full
+                    level = capacity if row is None else min(capacity, row[i] + max(0.0, now - row[2]) * rate / 60)
+                    levels[name] = level
+                    # A call costing more than the bucket holds waits for a full bucket, then goes into debt
+                    reserve = self.batch_reserve * capacity if priority == BATCH else 0.0
+                    needed = min(costs[name], capacity - reserve) + reserve
+                    if level < needed:
+                        wait = max(wait, (needed - level) * 60 / rate)
+                blocked_until = row[3] if row else 0.0
+                urgent_until = row[4] if row else 0.0
+                wait = max(wait, blocked_until - now)
+                if priority == BATCH:
+                    wait = max(wait, urgent_until - now)
+                if wait > 0:
+                    if priority == INTERACTIVE:
+                        # Batch callers hold back until this call has been served
+                        urgent_until = max(urgent_until, now + wait)
+                else:
+                    for name in levels:
+                        levels[name] -= costs[name] if rates[name] else 0.0
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets (bucket, requests, tokens, updated, blocked_until, urgent_until) VALUES (?, ?, ?, ?, ?, ?)",
+                    (ticket.bucket, levels["requests"], levels["tokens"], now, blocked_until, urgent_until),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return max(wait, 0.0)
+
+    def _ticket(self, api_key: Optional[str], model: str, input_tokens: int) -> Optional[QuotaTicket]:
+        """
+        Builds the ticket of a call, or returns None if the model is unlimited.
+        """
+        limit = self.limit(model)
+        if limit is None:
+            return None
+        return QuotaTicket(f"{key_id(api_key)}:{model}", limit, max(0, input_tokens) + self.output_tokens)
+
+    def _sleep_time(self, ticket: QuotaTicket, wait: float) -> float:
+        """
+        Records a wait and returns how long to sleep before trying again.
+        """
+        with self._lock:
+            self.waits += 1
+        if self.debug:
+            print(f"[DEBUG] Quota: waiting {wait:.2f}s for {ticket.bucket.split(':', 1)[1]} ({self.priority})")
+        # A little jitter keeps the waiting callers from all waking at once
+        return min(wait, MAX_POLL) + random.uniform(0, 0.02)
+
+    def acquire(self, api_key: Optional[str], model: str, input_tokens: int = 0) -> Optional[QuotaTicket]:
+        """
+        Waits until a call to a model fits in the quota, then takes it.
+
+        Args:
+            api_key: The API key the call is made with.
+            model: The model called.
+            input_tokens: Estimated tokens of the request.
+
+        Returns:
+            The ticket to settle once the call completes, or None if the model is unlimited.
+        """
+        ticket = self._ticket(api_key, model, input_tokens)
+        if ticket is None:
+            return None
+        started = time.monotonic()
+        while True:
+            wait = self._take(ticket, time.time())
+            if not wait:
+                with self._lock:
+                    self.waited += time.monotonic() - started
+                return ticket
+            time.sleep(self._sleep_time(ticket, wait))
+
+    async def aacquire(self, api_key: Optional[str], model: str, input_tokens: int = 0) -> Optional[QuotaTicket]:
+        """
+        Asynchronous counterpart of `acquire`.
+
+        Args:
+            api_key: The API key the call is made with.
+            model: The model called.
+            input_tokens: Estimated tokens of the request.
+
+        Returns:
+            The ticket to settle once the call completes, or None if the model is unlimited.
+        """
+        ticket = self._ticket(api_key, model, input_tokens)
+        if ticket is None:
+            return None
+        started = time.monotonic()
+        while True:
+            # BEGIN IMMEDIATE may wait for other processes holding the database: keep it off the event loop
+            wait = await asyncio.to_thread(self._take, ticket, time.time())
+            if not wait:
+                with self._lock:
+                    self.waited += time.monotonic() - started
+                return ticket
+            await asyncio.sleep(self._sleep_time(ticket, wait))
+
+    def settle(self, ticket: Optional[QuotaTicket], usage: Any):
+        """
+        Replaces a ticket's token estimate with the actual usage of the call.
+
+        Args:
+            ticket: The ticket returned by `acquire`, or None.
+            usage: The response's `usage_metadata`, or None if unknown.
+        """
+        used = getattr(usage, "total_token_count", None)
+        if ticket is None or not ticket.limit.tpm or used is None or used == ticket.tokens:
+            return
+        capacity = ticket.limit.tpm / 60 * self.burst_seconds
+        with self._lock:
+            self._conn.execute(
+                "UPDATE buckets SET tokens = MIN(?, tokens + ?) WHERE bucket = ?",
+                (capacity, ticket.tokens - used, ticket.bucket),
+            )
+
+    def penalize(self, ticket: Optional[QuotaTicket], seconds: float):
+        """
+        Pauses a ticket's buckets for every caller after a rate-limit error.
+
+        Args:
+            ticket: The ticket of the rejected call, or None.
+            seconds: How long to pause.
+        """
+        if ticket is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE buckets SET blocked_until = MAX(blocked_until, ?) WHERE bucket = ?",
+                (time.time() + seconds, ticket.bucket),
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns how often and how long this process waited for quota.
+
+        Returns:
+            A dictionary with `waits` and `waited` (seconds).
+        """
+        with self._lock:
+            return {"waits": self.waits, "waited": round(self.waited, 3)}
+
+    def close(self):
+        """
+        Closes the state database connection.
+        """
+        with self._lock:
+            self._conn.close()
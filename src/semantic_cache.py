@@ -0,0 +1,509 @@
+"""
+This module provides the SemanticCache class, a cache of first consultant
+replies keyed by the meaning of the initial idea rather than its exact text.
+
+Paraphrased ideas ("SEO article prompt" / "prompt for an SEO blog article")
+get the same opening interview, so when a new idea is close enough to a stored
+one (cosine similarity above a threshold), its first reply is served from the
+cache and seeds the session instead of calling the model.
+
+Ideas are embedded either offline, by a hashing vectorizer over words, word
+pairs, word prefixes and direction and negation markers, or with the Gemini
+embeddings API. Vectors live
+in a fixed-size float32 matrix in a memory-mapped file, scanned with NumPy
+when it is installed (a pure-Python scan over the same file is used
+otherwise); the ideas and replies are stored in SQLite next to it. Entries
+are scoped by model and system prompt, expire after a TTL, and the least
+recently used one is evicted when the matrix is full.
+"""
+import array
+import hashlib
+import math
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CACHE_DIR = "semantic_cache"
+
+# Words that say nothing about what an idea is about, in both supported languages
+STOPWORDS = frozenset(
+    "a an the of for to in on and or with about my me i we our your is are be that this it "
+    "prompt prompts write writes create make want need help please "
+    "un una uno il lo la i gli le di da per in su con e o sul sulla mio mia "
+    "scrivi crea creare fare voglio vorrei serve aiutami s t".split()
+)
+# Words negating the next content word ("without emojis", "non formale")
+NEGATIONS = frozenset("not no without never don doesn isn aren avoid non senza mai nessun nessuna evita evitare".split())
+# Words introducing the target or the source of a direction ("english to french", "dall'inglese al francese")
+TO_MARKERS = frozenset("to into towards verso al allo alla all ai agli alle".split())
+FROM_MARKERS = frozenset("from da dal dallo dalla dall dai dagli dalle".split())
+# Common synonyms folded into one word, so paraphrases share their features
+SYNONYMS = {
+    "post": "article", "blog": "article", "blogpost": "article", "articolo": "article", "articoli": "article",
+    "mail": "email", "emails": "email",
+    "translation": "translate", "traduci": "translate", "tradurre": "translate", "traduzione": "translate",
+    "summarize": "summary", "summarise": "summary", "riassunto": "summary", "riassumi": "summary", "riassumere": "summary",
+    "codice": "code", "coding": "code", "funzione": "function",
+    "english": "english", "inglese": "english", "french": "french", "francese": "french",
+    "italian": "italian", "italiano": "italian", "spanish": "spanish", "spagnolo": "spanish",
+    "german": "german", "tedesco": "german",
+    "crescente": "ascending", "decrescente": "descending", "ordina": "sort", "ordinare": "sort",
+}
+
+def scope_key(model_name: str, system_prompt: str) -> str:
+    """
+    Identifies the settings a cached first reply is valid for.
+
+    Args:
+        model_name: The model that produced the reply.
+        system_prompt: The system prompt of the session (it depends on the language).
+
+    Returns:
+        A short hex digest.
+    """
+    return hashlib.sha256(f"{model_name}\n{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+class HashingVectorizer:
+    """
+    Offline text embedder: hashed, sign-balanced bag of words, word pairs, word prefixes and markers.
+
+    Term frequencies are log-scaled and the vector is L2-normalized, so dot
+    products are cosine similarities. Word prefixes make inflections overlap
+    ("article"/"articles", "articolo"/"articoli") without matching opposites
+    that share a suffix ("ascending"/"descending"); a negated word ("without
+    emojis") and the direction of "X to Y" are features of their own, so ideas
+    with the same words but opposite meaning stay apart. Only wording is
+    compared, so the default threshold is lower than for API embeddings; it was
+    calibrated on paraphrases and near-miss pairs (see tests/test_semantic_cache.py).
+    """
+    default_threshold = 0.76
+
+    def __init__(self, dimensions: int = 512):
+        """
+        Args:
+            dimensions: Size of the vectors.
+        """
+        self.dimensions = dimensions
+        self.name = f"hashing-v2-{dimensions}"
+
+    @staticmethod
+    def _word(token: str) -> str:
+        """
+        Folds a content word: synonyms to one word, English plurals to the singular.
+        """
+        if token in SYNONYMS:
+            return SYNONYMS[token]
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        return SYNONYMS.get(token, token)
+
+    def features(self, text: str) -> List[Tuple[str, float]]:
+        """
+        Extracts the weighted features of a text.
+
+        Args:
+            text: The text.
+
+        Returns:
+            (feature, weight) pairs; words and directions weigh more than pairs and prefixes.
+        """
+        text = unicodedata.normalize("NFKD", text.lower())
+        text = "".join(c for c in text if not unicodedata.combining(c))
+        words: List[str] = []
+        features: List[Tuple[str, float]] = []
+        negate, marker, target = False, None, None
+        for token in re.findall(r"\w+", text):
+            if token in NEGATIONS:
+                negate = True
+                continue
+            if token in TO_MARKERS or token in FROM_MARKERS:
+                marker = "to" if token in TO_MARKERS else "from"
+                continue
+            if token in STOPWORDS:
+                continue
+            word = self._word(token)
+            previous = words[-1] if words else None
+            if marker == "to" and previous:
+                # "english to french": the word before the marker is the source
+                features.append((f"d:{previous}>{word}", 1.0))
+                target = word
+            elif marker == "from" and previous and previous == target:
+                # "to french from english"
+                features.append((f"d:{word}>{previous}", 1.0))
+            marker = None
+            if negate:
+                # "without emojis" shares nothing with "emojis"
+                word, negate = f"!{word}", False
+            words.append(word)
+        features += [(f"w:{w}", 1.0) for w in words]
+        features += [(f"p:{a}_{b}", 0.25) for a, b in zip(words, words[1:])]
+        for w in words:
+            features += [(f"s:{w[:n]}", 0.15) for n in range(4, min(len(w), 6) + 1)]
+        return features
+
+    def embed_sparse(self, text: str) -> Dict[int, float]:
+        """
+        Embeds a text as a sparse vector.
+
+        Args:
+            text: The text.
+
+        Returns:
+            The non-zero components, by index. Empty if the text has no content word.
+        """
+        counts: Dict[int, float] = {}
+        for feature, weight in self.features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            index = digest % self.dimensions
+            sign = 1.0 if (digest >> 63) & 1 else -1.0
+            counts[index] = counts.get(index, 0.0) + sign * weight
+        vector = {i: math.copysign(1.0 + math.log(abs(v)), v) if abs(v) >= 1.0 else v for i, v in counts.items() if v}
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        return {i: v / norm for i, v in vector.items()} if norm else {}
+
+    def embed(self, text: str) -> List[float]:
+        """
+        Embeds a text as a dense, L2-normalized vector.
+
+        Args:
+            text: The text.
+
+        Returns:
+            The vector; all zeros if the text has no content word.
+        """
+        dense = [0.0] * self.dimensions
+        for i, v in self.embed_sparse(text).items():
+            dense[i] = v
+        return dense
+
+class GeminiEmbedder:
+    """
+    Text embedder calling the Gemini embeddings API.
+    """
+    default_threshold = 0.92
+
+    def __init__(self, client: Any, model: str = "gemini-embedding-001", dimensions: int = 768):
+        """
+        Args:
+            client: The `genai.Client` to call.
+            model: The embedding model.
+            dimensions: Size of the vectors requested from the API.
+        """
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+        self.name = f"{model}-{dimensions}"
+
+    def embed(self, text: str) -> List[float]:
+        """
+        Embeds a text with the API.
+
+        Args:
+            text: The text.
+
+        Returns:
+            The L2-normalized vector.
+        """
+        from google.genai import types
+
+        response = self.client.models.embed_content(
+            model=self.model,
+            contents=text,
+            config=types.EmbedContentConfig(task_type="SEMANTIC_SIMILARITY", output_dimensionality=self.dimensions),
+        )
+        values = list(response.embeddings[0].values)
+        norm = math.sqrt(sum(v * v for v in values))
+        return [v / norm for v in values] if norm else values
+
+@dataclass
+class SemanticHit:
+    """
+    A cached first reply close enough to the looked-up idea.
+    """
+    idea: str
+    reply: str
+    similarity: float
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of first replies over a memory-mapped vector matrix.
+
+    Safe to share between threads of a process. Several processes can share
+    the same directory: changes made by others are picked up on the next lookup.
+    """
+    def __init__(self, embedder: Any = None, path: Optional[str] = None, threshold: Optional[float] = None, max_entries: int = 5000, ttl_seconds: float = 30 * 24 * 3600, debug: bool = False):
+        """
+        Initializes the SemanticCache, creating its files if needed.
+
+        If the stored vectors were produced by another embedder (or with
+        another size), the cache is emptied.
+
+        Args:
+            embedder: The text embedder. Defaults to a 512-dimension HashingVectorizer.
+            path: Directory of the cache files. Defaults to `semantic_cache/` next to `config.json`.
+            threshold: Minimum cosine similarity for a hit, between 0 and 1.
+                Defaults to the embedder's `default_threshold`.
+            max_entries: Capacity of the vector matrix.
+            ttl_seconds: Age in seconds after which an entry is no longer served.
+            debug: If True, prints the similarity of every lookup.
+        """
+        self.embedder = embedder or HashingVectorizer()
+        self.path = path or os.path.join(os.path.dirname(os.path.dirname(__file__)), CACHE_DIR)
+        self.threshold = threshold if threshold is not None else self.embedder.default_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.debug = debug
+        self.dimensions = self.embedder.dimensions
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        os.makedirs(self.path, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(self.path, "index.sqlite3"), timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "slot INTEGER PRIMARY KEY, scope TEXT NOT NULL, idea TEXT NOT NULL, reply TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        layout = f"{self.embedder.name}:{self.max_entries}"
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        vectors_path = os.path.join(self.path, "vectors.f32")
+        if row is None or row[0] != layout:
+            # Vectors from another embedder or matrix size can't be compared: start over
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('layout', ?)", (layout,))
+            if os.path.exists(vectors_path):
+                os.remove(vectors_path)
+        self._conn.commit()
+
+        size = self.max_entries * self.dimensions * 4
+        with open(vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        if np is not None:
+            self._matrix = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(self.max_entries, self.dimensions))
+        else:
+            self._file = open(vectors_path, "r+b")
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+            self._matrix = memoryview(self._mmap).cast("f")
+        self._data_version = None
+        self._load_slots()
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], client: Any = None, debug: bool = False) -> "SemanticCache":
+        """
+        Builds a SemanticCache from the `semantic_cache` section of the configuration.
+
+        Args:
+            settings: A dictionary that may contain `path`, `threshold`, `max_entries`,
+                `ttl_seconds`, `embeddings` ("local" or "api"), `embedding_model` and `dimensions`.
+            client: The `genai.Client` used when `embeddings` is "api".
+            debug: If True, prints the similarity of every lookup.
+
+        Returns:
+            A configured SemanticCache.
+        """
+        if settings.get("embeddings") == "api":
+            embedder = GeminiEmbedder(client, settings.get("embedding_model", "gemini-embedding-001"), settings.get("dimensions", 768))
+        else:
+            embedder = HashingVectorizer(settings.get("dimensions", 512))
+        keys = ("path", "threshold", "max_entries", "ttl_seconds")
+        return cls(embedder, debug=debug, **{k: settings[k] for k in keys if k in settings})
+
+    def _load_slots(self):
+        """
+        Reloads the slot table from SQLite if another connection changed it.
+
+        `data_version` only changes on commits from other connections, so this
+        costs a single pragma when the cache isn't shared.
+
+        Must be called with the lock held.
+        """
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._data_version = version
+        self._scopes: List[Optional[str]] = [None] * self.max_entries
+        self._created: Dict[int, float] = {}
+        self._accessed: Dict[int, float] = {}
+        for slot, scope, created, accessed in self._conn.execute("SELECT slot, scope, created, accessed FROM entries"):
+            self._scopes[slot] = scope
+            self._created[slot] = created
+            self._accessed[slot] = accessed
+
+    def _embed(self, text: str) -> Any:
+        """
+        Embeds a text for the matrix scan: a NumPy array, or a sparse dict without NumPy.
+        """
+        if np is None and isinstance(self.embedder, HashingVectorizer):
+            return self.embedder.embed_sparse(text)
+        vector = self.embedder.embed(text)
+        if np is not None:
+            return np.asarray(vector, dtype=np.float32)
+        return dict(enumerate(vector))
+
+    def _similarities(self, query: Any, slots: List[int]) -> List[float]:
+        """
+        Computes the cosine similarity of the query with the given slots.
+        """
+        if np is not None:
+            # One pass over the whole matrix is cheaper than gathering the rows first
+            return (self._matrix @ query)[slots].tolist()
+        matrix, dims = self._matrix, self.dimensions
+        # Sparse query: only its non-zero components are multiplied
+        return [sum(matrix[slot * dims + i] * v for i, v in query.items()) for slot in slots]
+
+    def lookup(self, idea: str, scope: str) -> Optional[SemanticHit]:
+        """
+        Finds the stored idea most similar to `idea` within a scope.
+
+        Args:
+            idea: The new initial idea.
+            scope: The scope, as returned by `scope_key`.
+
+        Returns:
+            The closest entry if its similarity reaches the threshold, else None.
+        """
+        query = self._embed(idea)
+        now = time.time()
+        with self._lock:
+            self._load_slots()
+            oldest = now - self.ttl_seconds
+            slots = [slot for slot, s in enumerate(self._scopes) if s == scope and self._created[slot] >= oldest]
+            best, similarity = None, 0.0
+            if slots and len(query):
+                scores = self._similarities(query, slots)
+                index = max(range(len(scores)), key=scores.__getitem__)
+                best, similarity = slots[index], scores[index]
+            if self.debug and best is not None:
+                print(f"[DEBUG] Semantic cache: best similarity {similarity:.3f} (threshold {self.threshold})")
+            if best is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            # A slot being rewritten by another process is reserved with an empty scope
+            row = self._conn.execute("SELECT idea, reply FROM entries WHERE slot = ? AND scope = ?", (best, scope)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE slot = ?", (now, best))
+            self._conn.commit()
+            self._accessed[best] = now
+            self.hits += 1
+            return SemanticHit(row[0], row[1], similarity)
+
+    def put(self, idea: str, scope: str, reply: str):
+        """
+        Stores the first reply to an idea.
+
+        The same idea replaces its previous entry; otherwise a free slot is
+        used, then an expired one, then the least recently used one.
+
+        The slot is chosen from the table in a `BEGIN IMMEDIATE` transaction
+        and reserved with an empty scope before its vector is written, so
+        processes sharing the directory never pick the same slot, and lookups
+        never pair the new vector with the slot's previous idea.
+
+        Args:
+            idea: The initial idea.
+            scope: The scope, as returned by `scope_key`.
+            reply: The consultant's first reply.
+        """
+        vector = self.embedder.embed(idea)
+        if not any(vector):
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                free = self._choose_slot(idea, scope, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (slot, scope, idea, reply, created, accessed) VALUES (?, '', '', '', ?, ?)",
+                    (free, now, now),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            if np is not None:
+                self._matrix[free] = np.asarray(vector, dtype=np.float32)
+                self._matrix.flush()
+            else:
+                self._matrix[free * self.dimensions:(free + 1) * self.dimensions] = array.array("f", vector)
+                self._mmap.flush()
+            self._conn.execute("UPDATE entries SET scope = ?, idea = ?, reply = ? WHERE slot = ?", (scope, idea, reply, free))
+            self._conn.commit()
+            self._load_slots()
+            self._scopes[free] = scope
+            self._created[free] = now
+            self._accessed[free] = now
+
+    def _choose_slot(self, idea: str, scope: str, now: float) -> int:
+        """
+        Picks the slot of a new entry from the table, not from the in-process state.
+
+        Must be called with the lock held, inside the `BEGIN IMMEDIATE` transaction of `put`.
+
+        Returns:
+            The slot of the same idea, else a free one, else the oldest expired
+            one, else the least recently used one.
+        """
+        row = self._conn.execute("SELECT slot FROM entries WHERE scope = ? AND idea = ?", (scope, idea)).fetchone()
+        if row:
+            return row[0]
+        used = {slot for (slot,) in self._conn.execute("SELECT slot FROM entries")}
+        free = next((slot for slot in range(self.max_entries) if slot not in used), None)
+        if free is not None:
+            return free
+        row = self._conn.execute("SELECT slot FROM entries WHERE created < ? ORDER BY created LIMIT 1", (now - self.ttl_seconds,)).fetchone()
+        if row is None:
+            row = self._conn.execute("SELECT slot FROM entries ORDER BY accessed LIMIT 1").fetchone()
+        return row[0]
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._data_version = None
+            self._load_slots()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters and current size.
+
+        Returns:
+            A dictionary with `hits`, `misses` and `entries`.
+        """
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": count}
+
+    def close(self):
+        """
+        Closes the database connection and unmaps the vector file.
+        """
+        with self._lock:
+            self._conn.close()
+            if np is None:
+                self._matrix.release()
+                self._mmap.close()
+                self._file.close()
+            else:
+                del self._matrix
@@ -0,0 +1,974 @@
+"""
+This module implements the `serve` command: consultation sessions exposed to
+several users over HTTP and WebSocket, from a single process.
+
+The server is built on asyncio streams only (no web framework). Each session
+is an AsyncPromptConsultant held in a SessionStore and addressed by a random
+id; all sessions share the pooled Gemini client and the caches.
+
+Endpoints (JSON bodies and responses):
+    GET    /health                    Counters and limits.
+    GET    /models                    Models offered by `/set-model`.
+    POST   /sessions                  {"model"?, "language"?}: creates a session.
+    GET    /sessions/{id}             Session details and transcript.
+    DELETE /sessions/{id}             Ends a session.
+    POST   /sessions/{id}/messages    {"text"}: sends a message; the first one is the initial idea.
+    PUT    /sessions/{id}/model       {"model"}: `/set-model`, starts a new conversation.
+    PUT    /sessions/{id}/language    {"language"}: `/set-language`, starts a new conversation.
+    GET    /sessions/{id}/stream      WebSocket: send {"text"} (or {"type": "cancel"}), receive
+                                      {"type": "chunk"} messages then {"type": "done"} or {"type": "error"}.
+
+Resources are bounded so a busy server degrades by refusing work instead of
+running out of memory:
+- At most `max_sessions` sessions are kept: the least recently used idle one
+  is evicted to make room, and sessions idle for `idle_timeout` are dropped.
+- Each session's transcript is capped at `max_session_bytes`, each message at
+  `max_message_bytes`, and a session runs one turn at a time (409 otherwise).
+- At most `max_concurrency` turns call the model at once and `max_queue` more
+  wait for a slot; beyond that requests get a 503 with `Retry-After`.
+- Streamed chunks wait for the client's socket to drain, so a slow reader
+  slows down its own stream only; one that stops reading for `send_timeout`
+  is disconnected.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import struct
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from src.agent import is_error_reply
+from src.async_agent import AsyncPromptConsultant
+from src.evaluate import extract_final_prompt
+from src.history import content_text
+from src.library import session_transcript
+from src.translation import LOCALES_PATH, TranslationManager
+
+if TYPE_CHECKING:
+    from src.model_registry import ModelRegistry
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 401: "Unauthorized",
+    404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 411: "Length Required",
+    413: "Payload Too Large", 426: "Upgrade Required", 431: "Request Header Fields Too Large",
+    502: "Bad Gateway", 503: "Service Unavailable",
+}
+
+def available_languages() -> List[str]:
+    """
+    Lists the languages that have a locale file.
+
+    Returns:
+        The language codes, e.g. ["en", "it"].
+    """
+    return sorted(name[:-len(".json")] for name in os.listdir(LOCALES_PATH) if name.endswith(".json"))
+
+class HTTPError(Exception):
+    """
+    Raised by request handlers to answer with an error status.
+    """
+    def __init__(self, status: int, message: str, retry_after: Optional[int] = None):
+        """
+        Args:
+            status: The HTTP status code.
+            message: The error message returned as `{"error": message}`.
+            retry_after: Seconds suggested to the client in a `Retry-After` header.
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+@dataclass
+class Session:
+    """
+    A consultation held by the server.
+    """
+    id: str
+    consultant: AsyncPromptConsultant
+    created: float
+    last_used: float
+    # Initial idea of the current conversation; None until the first successful turn
+    idea: Optional[str] = None
+    turns: int = 0
+    # Identifies the conversation in the prompt library; renewed when it restarts
+    archive_key: str = field(default_factory=lambda: os.urandom(16).hex())
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def language(self) -> str:
+        return self.consultant.translation_manager.language
+
+    def history_bytes(self) -> int:
+        """
+        Returns the size of the session's history text, in UTF-8 bytes.
+        """
+        return sum(len(content_text(content).encode("utf-8")) for content in self.consultant.chat_session.get_history())
+
+    def restart(self):
+        """
+        Marks the start of a new conversation in the same session.
+        """
+        self.idea = None
+        self.turns = 0
+        self.archive_key = os.urandom(16).hex()
+
+    def to_dict(self, history: bool = False) -> Dict[str, Any]:
+        """
+        Serializes the session for the API.
+
+        Args:
+            history: If True, includes the transcript.
+
+        Returns:
+            A JSON-serializable dictionary.
+        """
+        data = {
+            "id": self.id,
+            "model": self.consultant.model_name,
+            "language": self.language,
+            "idea": self.idea,
+            "turns": self.turns,
+            "busy": self.lock.locked(),
+            "created": self.created,
+            "last_used": self.last_used,
+        }
+        if history:
+            messages = self.consultant.chat_session.get_history()
+            data["bytes"] = self.history_bytes()
+            data["history"] = session_transcript(messages) if self.idea else []
+        return data
+
+class SessionStore:
+    """
+    Bounded LRU store of sessions with idle expiry.
+
+    Sessions running a turn are never evicted.
+    """
+    def __init__(self, max_sessions: int = 200, idle_timeout: float = 1800):
+        """
+        Initializes the SessionStore.
+
+        Args:
+            max_sessions: Maximum number of sessions kept.
+            idle_timeout: Seconds of inactivity after which a session is dropped.
+        """
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.evicted = 0
+        self.expired = 0
+        # Least recently used first
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def add(self, consultant: AsyncPromptConsultant) -> Session:
+        """
+        Stores a new session, evicting the least recently used idle one if full.
+
+        Args:
+            consultant: The consultant of the session.
+
+        Returns:
+            The new session.
+
+        Raises:
+            HTTPError: 503 if the store is full of sessions running a turn.
+        """
+        if len(self._sessions) >= self.max_sessions:
+            victim = next((s for s in self._sessions.values() if not s.lock.locked()), None)
+            if victim is None:
+                raise HTTPError(503, "Too many active sessions.", retry_after=5)
+            del self._sessions[victim.id]
+            self.evicted += 1
+        now = time.time()
+        session = Session(os.urandom(16).hex(), consultant, now, now)
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Session:
+        """
+        Looks up a session and marks it as recently used.
+
+        Args:
+            session_id: The session id.
+
+        Returns:
+            The session.
+
+        Raises:
+            HTTPError: 404 if the session doesn't exist or was evicted.
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, "Unknown or expired session.")
+        self._sessions.move_to_end(session_id)
+        session.last_used = time.time()
+        return session
+
+    def remove(self, session_id: str):
+        """
+        Deletes a session.
+
+        Args:
+            session_id: The session id.
+
+        Raises:
+            HTTPError: 404 if the session doesn't exist.
+        """
+        session = self.get(session_id)
+        session.consultant.cancel()
+        del self._sessions[session_id]
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Drops the sessions idle for longer than `idle_timeout`.
+
+        Args:
+            now: The current time. Defaults to `time.time()`.
+
+        Returns:
+            The number of sessions dropped.
+        """
+        oldest = (now or time.time()) - self.idle_timeout
+        # Ordered by last use: stop at the first recent session
+        idle = []
+        for session in self._sessions.values():
+            if session.last_used >= oldest:
+                break
+            if not session.lock.locked():
+                idle.append(session.id)
+        for session_id in idle:
+            del self._sessions[session_id]
+        self.expired += len(idle)
+        return len(idle)
+
+class WebSocket:
+    """
+    Server side of an RFC 6455 WebSocket connection, text messages only.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_message_bytes: int, send_timeout: float):
+        """
+        Args:
+            reader: The connection's reader, after the handshake.
+            writer: The connection's writer, after the handshake.
+            max_message_bytes: Larger messages close the connection (status 1009).
+            send_timeout: Seconds a send may wait for the client to read.
+        """
+        self.reader = reader
+        self.writer = writer
+        self.max_message_bytes = max_message_bytes
+        self.send_timeout = send_timeout
+        self.closed = False
+        self._send_lock = asyncio.Lock()
+
+    @staticmethod
+    def _unmask(data: bytes, mask: bytes) -> bytes:
+        """
+        XORs a client payload with its masking key, as one big-integer operation.
+        """
+        size = len(data)
+        key = (mask * (size // 4 + 1))[:size]
+        return (int.from_bytes(data, "big") ^ int.from_bytes(key, "big")).to_bytes(size, "big")
+
+    async def receive(self) -> Optional[str]:
+        """
+        Waits for the next text message, answering pings on the way.
+
+        Returns:
+            The message, or None once the connection is closed.
+        """
+        fragments: List[bytes] = []
+        size = 0
+        try:
+            while True:
+                head = await self.reader.readexactly(2)
+                final, opcode = head[0] & 0x80, head[0] & 0x0F
+                masked, length = head[1] & 0x80, head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+                if not masked:
+                    await self.close(1002)
+                    return None
+                if size + length > self.max_message_bytes:
+                    await self.close(1009)
+                    return None
+                mask = await self.reader.readexactly(4)
+                payload = self._unmask(await self.reader.readexactly(length), mask)
+                if opcode == 0x8:
+                    await self.close()
+                    return None
+                if opcode == 0x9:
+                    await self._send_frame(0xA, payload)
+                    continue
+                if opcode == 0xA:
+                    continue
+                if opcode not in (0x0, 0x1):
+                    await self.close(1003)
+                    return None
+                fragments.append(payload)
+                size += length
+                if final:
+                    return b"".join(fragments).decode("utf-8", errors="replace")
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.TimeoutError):
+            self.closed = True
+            return None
+
+    async def _send_frame(self, opcode: int, data: bytes):
+        """
+        Sends a single unfragmented frame and waits until the client read it.
+
+        Raises:
+            ConnectionError: If the connection is closed.
+            asyncio.TimeoutError: If the client doesn't read within `send_timeout`.
+        """
+        size = len(data)
+        if size < 126:
+            header = struct.pack("!BB", 0x80 | opcode, size)
+        elif size < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, size)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, size)
+        async with self._send_lock:
+            if self.closed:
+                raise ConnectionResetError("WebSocket closed")
+            self.writer.write(header + data)
+            await asyncio.wait_for(self.writer.drain(), self.send_timeout)
+
+    async def send_json(self, payload: Dict[str, Any]):
+        """
+        Sends a JSON text message.
+
+        Args:
+            payload: The message.
+        """
+        await self._send_frame(0x1, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    async def close(self, code: int = 1000):
+        """
+        Sends a close frame, if the connection is still open.
+
+        Args:
+            code: The close status code.
+        """
+        if self.closed:
+            return
+        with suppress(ConnectionError, asyncio.TimeoutError):
+            await self._send_frame(0x8, struct.pack("!H", code))
+        self.closed = True
+
+class ConsultantServer:
+    """
+    HTTP and WebSocket server hosting consultation sessions.
+    """
+    def __init__(self, api_key: str, model_name: str, language: str = "en", consultant_options: Optional[Dict[str, Any]] = None, registry: Optional["ModelRegistry"] = None, on_turn: Optional[Callable[[Session], None]] = None, max_sessions: int = 200, idle_timeout: float = 1800, max_concurrency: int = 16, max_queue: int = 64, max_connections: int = 512, max_session_bytes: int = 512 * 1024, max_message_bytes: int = 32 * 1024, send_timeout: float = 30, timeout: Optional[float] = 120, token: Optional[str] = None, debug: bool = False):
+        """
+        Initializes the ConsultantServer.
+
+        Args:
+            api_key: The API key shared by every session.
+            model_name: The default model of new sessions.
+            language: The default language of new sessions.
+            consultant_options: Extra keyword arguments for every AsyncPromptConsultant,
+                such as `response_cache` or `history_manager`.
+            registry: An optional ModelRegistry listing the models and checking model names.
+            on_turn: Optional callable run on a worker thread after every successful turn,
+                e.g. to archive the session in the prompt library.
+            max_sessions: Maximum number of sessions kept in memory.
+            idle_timeout: Seconds of inactivity after which a session is dropped.
+            max_concurrency: Maximum number of turns calling the model at the same time.
+            max_queue: Maximum number of turns waiting for a slot; more get a 503.
+            max_connections: Maximum number of open connections; more get a 503.
+            max_session_bytes: Maximum size of a session's history text.
+            max_message_bytes: Maximum size of a request body or WebSocket message.
+            send_timeout: Seconds a response may wait for a slow client before it is disconnected.
+            timeout: Deadline in seconds for each turn, retries included. None means no deadline.
+            token: If set, requests must carry `Authorization: Bearer <token>` (except `/health`).
+            debug: If True, prints every request and enables debug output for the consultants.
+        """
+        self.api_key = api_key
+        self.model_name = model_name
+        self.language = language
+        self.consultant_options = consultant_options or {}
+        self.registry = registry
+        self.on_turn = on_turn
+        self.store = SessionStore(max_sessions, idle_timeout)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_connections = max(1, max_connections)
+        self.max_session_bytes = max_session_bytes
+        self.max_message_bytes = max_message_bytes
+        self.send_timeout = send_timeout
+        self.timeout = timeout
+        self.token = token
+        self.debug = debug
+        self.languages = available_languages()
+        self.connections = 0
+        self.active_turns = 0
+        self.waiting_turns = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], **kwargs) -> "ConsultantServer":
+        """
+        Builds a ConsultantServer from the `server` section of the configuration.
+
+        Args:
+            settings: A dictionary that may contain the limits accepted by the
+                constructor (`max_sessions`, `idle_timeout`, `max_concurrency`,
+                `max_queue`, `max_connections`, `max_session_bytes`,
+                `max_message_bytes`, `send_timeout`, `timeout`) and `token`.
+            **kwargs: The other constructor arguments; they take precedence over `settings`.
+
+        Returns:
+            A configured ConsultantServer.
+        """
+        keys = ("max_sessions", "idle_timeout", "max_concurrency", "max_queue", "max_connections", "max_session_bytes", "max_message_bytes", "send_timeout", "timeout", "token")
+        options = {k: settings[k] for k in keys if k in settings}
+        options.update({k: v for k, v in kwargs.items() if v is not None})
+        return cls(**options)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the server counters and limits, as served by `/health`.
+        """
+        return {
+            "status": "ok",
+            "sessions": len(self.store),
+            "connections": self.connections,
+            "active_turns": self.active_turns,
+            "waiting_turns": self.waiting_turns,
+            "rejected": self.rejected,
+            "evicted": self.store.evicted,
+            "expired": self.store.expired,
+            "limits": {
+                "max_sessions": self.store.max_sessions,
+                "idle_timeout": self.store.idle_timeout,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "max_session_bytes": self.max_session_bytes,
+                "max_message_bytes": self.max_message_bytes,
+            },
+        }
+
+    # --- Sessions ---
+
+    def _new_consultant(self, model_name: str, language: str) -> AsyncPromptConsultant:
+        """
+        Builds the consultant of a new session. Blocking: run on a worker thread.
+        """
+        return AsyncPromptConsultant(
+            api_key=self.api_key,
+            model_name=model_name,
+            debug=self.debug,
+            translation_manager=TranslationManager(language),
+            timeout=self.timeout,
+            **self.consultant_options,
+        )
+
+    def _check_model(self, data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Reads the `model` field of a request body.
+
+        Returns:
+            The model (None if absent) and a warning if it isn't in the cached model list.
+        """
+        model = data.get("model")
+        if model is None:
+            return None, None
+        if not isinstance(model, str) or not model.strip():
+            raise HTTPError(400, "'model' must be a non-empty string.")
+        model = model.strip()
+        # Like the CLI, an unknown model is used anyway: the cached list may be out of date
+        if self.registry and self.registry.validate(model) is False:
+            return model, f"Model '{model}' is not in the cached model list."
+        return model, None
+
+    def _check_language(self, data: Dict[str, Any]) -> Optional[str]:
+        """
+        Reads the `language` field of a request body.
+        """
+        language = data.get("language")
+        if language is not None and language not in self.languages:
+            raise HTTPError(400, f"'language' must be one of: {', '.join(self.languages)}.")
+        return language
+
+    async def create_session(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handles `POST /sessions`.
+
+        Args:
+            data: The request body, with optional `model` and `language`.
+
+        Returns:
+            The new session, with a `warning` if the model is unknown.
+        """
+        model, warning = self._check_model(data)
+        language = self._check_language(data) or self.language
+        consultant = await asyncio.to_thread(self._new_consultant, model or self.model_name, language)
+        session = self.store.add(consultant)
+        result = session.to_dict()
+        if warning:
+            result["warning"] = warning
+        return result
+
+    def _idle_session(self, session_id: str) -> Session:
+        """
+        Looks up a session that isn't running a turn.
+
+        Raises:
+            HTTPError: 404 if unknown, 409 if busy.
+        """
+        session = self.store.get(session_id)
+        if session.lock.locked():
+            raise HTTPError(409, "A turn is already running in this session.")
+        return session
+
+    async def set_model(self, session_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handles `PUT /sessions/{id}/model`, the counterpart of `/set-model`.
+
+        Like `update_model`, the session restarts on the new model: the next
+        message is a new initial idea.
+
+        Args:
+            session_id: The session id.
+            data: The request body, with `model`.
+
+        Returns:
+            The updated session, with a `warning` if the model is unknown.
+        """
+        model, warning = self._check_model(data)
+        if model is None:
+            raise HTTPError(400, "Missing 'model'.")
+        session = self._idle_session(session_id)
+        async with session.lock:
+            await asyncio.to_thread(session.consultant.update_model, model)
+            session.restart()
+        result = session.to_dict()
+        if warning:
+            result["warning"] = warning
+        return result
+
+    async def set_language(self, session_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handles `PUT /sessions/{id}/language`, the counterpart of `/set-language`.
+
+        The session restarts with the system prompt of the new language.
+
+        Args:
+            session_id: The session id.
+            data: The request body, with `language`.
+
+        Returns:
+            The updated session.
+        """
+        language = self._check_language(data)
+        if language is None:
+            raise HTTPError(400, "Missing 'language'.")
+        session = self._idle_session(session_id)
+        async with session.lock:
+            session.consultant.translation_manager = TranslationManager(language)
+            await asyncio.to_thread(session.consultant.start_new_session)
+            session.restart()
+        return session.to_dict()
+
+    # --- Turns ---
+
+    @asynccontextmanager
+    async def _turn_slot(self) -> AsyncIterator[None]:
+        """
+        Waits for one of the `max_concurrency` turn slots.
+
+        Raises:
+            HTTPError: 503 if no slot is free and `max_queue` turns are already waiting.
+        """
+        if self._slots.locked() and self.waiting_turns >= self.max_queue:
+            self.rejected += 1
+            raise HTTPError(503, "The server is busy, retry later.", retry_after=1)
+        self.waiting_turns += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting_turns -= 1
+        self.active_turns += 1
+        try:
+            yield
+        finally:
+            self.active_turns -= 1
+            self._slots.release()
+
+    def _check_turn(self, session: Session, text: Any):
+        """
+        Validates a message before it is queued.
+
+        Raises:
+            HTTPError: 400 for an empty message, 409 if the session is busy,
+                413 if the message or the session is too large.
+        """
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(400, "Missing 'text'.")
+        size = len(text.encode("utf-8"))
+        if size > self.max_message_bytes:
+            raise HTTPError(413, f"The message exceeds {self.max_message_bytes} bytes.")
+        if session.lock.locked():
+            raise HTTPError(409, "A turn is already running in this session.")
+        if session.history_bytes() + size > self.max_session_bytes:
+            raise HTTPError(413, "The session is too long: start a new one.")
+
+    async def _finish_turn(self, session: Session, text: str, reply: str) -> Dict[str, Any]:
+        """
+        Records a successful turn and builds its result.
+        """
+        if session.idea is None:
+            session.idea = text
+        session.turns += 1
+        session.last_used = time.time()
+        if self.on_turn:
+            try:
+                await asyncio.to_thread(self.on_turn, session)
+            except Exception as e:
+                if self.debug:
+                    print(f"[DEBUG] Turn hook failed: {e}")
+        return {"reply": reply, "final_prompt": extract_final_prompt(reply), "turns": session.turns}
+
+    async def send_message(self, session_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handles `POST /sessions/{id}/messages`.
+
+        The first message of a conversation starts the consultation.
+
+        Args:
+            session_id: The session id.
+            data: The request body, with `text`.
+
+        Returns:
+            The reply, the final prompt it contains (or None) and the turn count.
+
+        Raises:
+            HTTPError: 502 if the model call failed, or any error of `_check_turn`.
+        """
+        session = self.store.get(session_id)
+        text = data.get("text")
+        self._check_turn(session, text)
+        async with session.lock, self._turn_slot():
+            if session.idea is None:
+                reply = await session.consultant.start_consultation(text)
+            else:
+                reply = await session.consultant.chat(text)
+            if is_error_reply(reply):
+                raise HTTPError(502, reply)
+            # Still under the session lock: the hook sees the history of this turn
+            return await self._finish_turn(session, text, reply)
+
+    async def _stream_turn(self, socket: WebSocket, session_id: str, text: Any):
+        """
+        Runs a turn for a WebSocket client, sending the reply chunk by chunk.
+        """
+        try:
+            session = self.store.get(session_id)
+            self._check_turn(session, text)
+            parts, error = [], None
+            async with session.lock, self._turn_slot():
+                consultant = session.consultant
+                chunks = consultant.start_consultation_stream(text) if session.idea is None else consultant.chat_stream(text)
+                async for chunk in chunks:
+                    if is_error_reply(chunk):
+                        error = chunk
+                        continue
+                    parts.append(chunk)
+                    # Waits for the client to read: a slow client throttles its own stream
+                    await socket.send_json({"type": "chunk", "text": chunk})
+                result = None if error else await self._finish_turn(session, text, "".join(parts))
+            if error:
+                await socket.send_json({"type": "error", "status": 502, "error": error})
+            else:
+                await socket.send_json({"type": "done", **result})
+        except HTTPError as e:
+            with suppress(ConnectionError, asyncio.TimeoutError):
+                await socket.send_json({"type": "error", "status": e.status, "error": e.message})
+        except (ConnectionError, asyncio.TimeoutError):
+            # The client went away or stopped reading
+            socket.closed = True
+            socket.writer.close()
+
+    async def _websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: Dict[str, str], session_id: str):
+        """
+        Completes the WebSocket handshake and serves the session's messages.
+        """
+        self.store.get(session_id)
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            raise HTTPError(426, "This endpoint requires a WebSocket connection.")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        await writer.drain()
+        socket = WebSocket(reader, writer, self.max_message_bytes, self.send_timeout)
+        turn: Optional[asyncio.Task] = None
+        try:
+            while not socket.closed:
+                try:
+                    message = await asyncio.wait_for(socket.receive(), self.store.idle_timeout)
+                except asyncio.TimeoutError:
+                    await socket.close(1001)
+                    break
+                if message is None:
+                    break
+                try:
+                    data = json.loads(message)
+                except json.JSONDecodeError:
+                    data = None
+                if not isinstance(data, dict):
+                    await socket.send_json({"type": "error", "status": 400, "error": "Messages must be JSON objects."})
+                    continue
+                if data.get("type") == "cancel":
+                    if turn is not None and not turn.done():
+                        self.store.get(session_id).consultant.cancel()
+                    continue
+                if turn is not None and not turn.done():
+                    await socket.send_json({"type": "error", "status": 409, "error": "A turn is already running in this session."})
+                    continue
+                turn = asyncio.create_task(self._stream_turn(socket, session_id, data.get("text")))
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            if turn is not None and not turn.done():
+                turn.cancel()
+                with suppress(asyncio.CancelledError):
+                    await turn
+
+    # --- HTTP ---
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, str, Dict[str, str], bytes]]:
+        """
+        Reads one HTTP/1.1 request.
+
+        Returns:
+            The method, path, version, lowercased headers and body, or None if
+            the client closed the connection.
+
+        Raises:
+            HTTPError: For malformed, chunked or oversized requests.
+        """
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HTTPError(400, "Incomplete request.")
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Request headers too large.")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        if "transfer-encoding" in headers:
+            raise HTTPError(411, "Chunked request bodies are not supported.")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length.")
+        if length > self.max_message_bytes + 1024:
+            raise HTTPError(413, f"The request body exceeds {self.max_message_bytes} bytes.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path.split("?", 1)[0], version, headers, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Optional[Dict[str, Any]], keep_alive: bool = True, retry_after: Optional[int] = None):
+        """
+        Writes a JSON response and waits until it is sent.
+        """
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        lines = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if retry_after is not None:
+            lines.append(f"Retry-After: {retry_after}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await asyncio.wait_for(writer.drain(), self.send_timeout)
+
+    def _authorize(self, path: str, headers: Dict[str, str]):
+        """
+        Checks the bearer token, if one is configured.
+
+        Raises:
+            HTTPError: 401 if the token is missing or wrong.
+        """
+        if not self.token or path == "/health":
+            return
+        # compare_digest rejects non-ASCII str, so compare bytes: the header as received
+        # (it was decoded as latin-1) against the UTF-8 token
+        if not hmac.compare_digest(headers.get("authorization", "").encode("latin-1"), f"Bearer {self.token}".encode("utf-8")):
+            raise HTTPError(401, "Missing or invalid bearer token.")
+
+    @staticmethod
+    def _json_body(body: bytes) -> Dict[str, Any]:
+        """
+        Decodes a JSON object request body; an empty body is an empty object.
+
+        Raises:
+            HTTPError: 400 if the body isn't a JSON object.
+        """
+        if not body.strip():
+            return {}
+        try:
+            data = json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise HTTPError(400, "The request body must be JSON.")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "The request body must be a JSON object.")
+        return data
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        Routes a (non-WebSocket) request to its handler.
+
+        Returns:
+            The status code and the response payload.
+        """
+        parts = [part for part in path.split("/") if part]
+        routes: Dict[str, Callable[[], Any]] = {}
+        if parts == ["health"]:
+            routes["GET"] = lambda: self.stats()
+        elif parts == ["models"]:
+            routes["GET"] = lambda: {"default": self.model_name, "models": self.registry.menu() if self.registry else [self.model_name]}
+        elif parts == ["sessions"]:
+            routes["POST"] = lambda: self.create_session(self._json_body(body))
+        elif len(parts) == 2 and parts[0] == "sessions":
+            routes["GET"] = lambda: self.store.get(parts[1]).to_dict(history=True)
+            routes["DELETE"] = lambda: self.store.remove(parts[1])
+        elif len(parts) == 3 and parts[0] == "sessions":
+            handler = {"messages": ("POST", self.send_message), "model": ("PUT", self.set_model), "language": ("PUT", self.set_language)}.get(parts[2])
+            if handler is not None:
+                routes[handler[0]] = lambda: handler[1](parts[1], self._json_body(body))
+            elif parts[2] == "stream":
+                raise HTTPError(426, "This endpoint requires a WebSocket connection.")
+        if not routes:
+            raise HTTPError(404, "Not found.")
+        if method not in routes:
+            raise HTTPError(405, f"Use {' or '.join(routes)}.")
+        result = routes[method]()
+        if asyncio.iscoroutine(result):
+            result = await result
+        if method == "DELETE":
+            return 204, None
+        return (201 if method == "POST" and parts == ["sessions"] else 200), result
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves the requests of one client connection (keep-alive supported).
+        """
+        if self.connections >= self.max_connections:
+            self.rejected += 1
+            with suppress(ConnectionError, asyncio.TimeoutError):
+                await self._respond(writer, 503, {"error": "Too many connections."}, keep_alive=False, retry_after=1)
+            writer.close()
+            return
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    # Idle keep-alive connections are closed after a while
+                    request = await asyncio.wait_for(self._read_request(reader), self.send_timeout * 2)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (version != "HTTP/1.0" or connection == "keep-alive")
+                if self.debug:
+                    print(f"[DEBUG] {method} {path}")
+                try:
+                    self._authorize(path, headers)
+                    parts = [part for part in path.split("/") if part]
+                    if method == "GET" and len(parts) == 3 and parts[0] == "sessions" and parts[2] == "stream" and "upgrade" in connection:
+                        await self._websocket(reader, writer, headers, parts[1])
+                        break
+                    status, payload = await self._dispatch(method, path, body)
+                    await self._respond(writer, status, payload, keep_alive)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, {"error": e.message}, keep_alive, e.retry_after)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+            with suppress(Exception):
+                await writer.wait_closed()
+
+    async def _expire_sessions(self):
+        """
+        Periodically drops idle sessions.
+        """
+        interval = max(1.0, min(60.0, self.store.idle_timeout / 4))
+        while True:
+            await asyncio.sleep(interval)
+            dropped = self.store.expire()
+            if dropped and self.debug:
+                print(f"[DEBUG] Expired {dropped} idle sessions")
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8090, ready: Optional[Callable[[List[Tuple[str, int]]], None]] = None):
+        """
+        Listens for connections until cancelled.
+
+        Args:
+            host: The interface to listen on.
+            port: The port to listen on; 0 picks a free one.
+            ready: Optional callable receiving the bound addresses once listening.
+        """
+        # The reader limit caps the request head; bodies are bounded separately
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=64 * 1024, backlog=256)
+        sweeper = asyncio.create_task(self._expire_sessions())
+        try:
+            if ready:
+                ready([sock.getsockname()[:2] for sock in server.sockets])
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+def run_server(api_key: str, model_name: str, language: str, host: str, port: int, settings: Optional[Dict[str, Any]] = None, ready: Optional[Callable[[List[Tuple[str, int]]], None]] = None, **options):
+    """
+    Runs a ConsultantServer until interrupted.
+
+    Args:
+        api_key: The API key shared by every session.
+        model_name: The default model of new sessions.
+        language: The default language of new sessions.
+        host: The interface to listen on.
+        port: The port to listen on.
+        settings: The `server` section of the configuration.
+        ready: Optional callable receiving the bound addresses once listening.
+        **options: Other ConsultantServer arguments, overriding `settings`.
+    """
+    async def main():
+        server = ConsultantServer.from_settings(settings or {}, api_key=api_key, model_name=model_name, language=language, **options)
+        await server.serve(host, port, ready)
+
+    asyncio.run(main())
@@ -1,10 +1,143 @@
 """
 This module provides the TranslationManager class for handling internationalization (i18n)
 within the application. It loads and manages translated strings from JSON locale files.
+
+Locale files are compiled once per process into catalogs shared by every
+TranslationManager: the strings of a language and its fallbacks are merged
+into a single dictionary, and format templates are pre-parsed so `get()` does
+not re-parse them on every call. A catalog is recompiled when the modification
+time or size of one of its files changes.
+
+Missing keys are resolved per key through a fallback chain: `en-GB` looks in
+`en-GB.json`, then `en.json`, then `it.json`.
 """
 import json
 import os
-from typing import Dict, Optional
+import string
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+DEFAULT_LANGUAGE = "it"
+LOCALES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "locales")
+
+# A pre-parsed format template: (literal text, field name or None) pairs
+Template = Tuple[Tuple[str, Optional[str]], ...]
+
+class _Catalog(NamedTuple):
+    """
+    Compiled strings of one or more locale files.
+    """
+    signature: tuple
+    messages: Dict[str, str]
+    templates: Dict[str, Template]
+
+_files: Dict[str, _Catalog] = {}
+_chains: Dict[Tuple[str, ...], _Catalog] = {}
+_lock = threading.Lock()
+_formatter = string.Formatter()
+
+def fallback_chain(language: str) -> List[str]:
+    """
+    Lists the locales searched, in order, for the keys of a language.
+
+    Args:
+        language: The language code, e.g. "en", "en-GB" or "en_GB".
+
+    Returns:
+        The language, its parent languages and DEFAULT_LANGUAGE, without duplicates.
+    """
+    parts = (language or DEFAULT_LANGUAGE).replace("_", "-").split("-")
+    chain = ["-".join(parts[:i]) for i in range(len(parts), 0, -1)]
+    if DEFAULT_LANGUAGE not in chain:
+        chain.append(DEFAULT_LANGUAGE)
+    return chain
+
+def compile_template(text: str) -> Optional[Template]:
+    """
+    Pre-parses a translated string used as a `str.format` template.
+
+    Only plain `{name}` fields are compiled; strings using positional fields,
+    attribute or index access, conversions or format specs are left to `str.format`.
+
+    Args:
+        text: The translated string.
+
+    Returns:
+        The parsed template, or None if the string has to go through `str.format`.
+    """
+    template = []
+    try:
+        for literal, field, spec, conversion in _formatter.parse(text):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                return None
+            template.append((literal, field))
+    except ValueError:
+        return None
+    return tuple(template)
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Returns the modification time and size of a file, or None if it doesn't exist.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _load_file(language: str) -> Optional[_Catalog]:
+    """
+    Returns the compiled catalog of a single locale file, recompiling it if the file changed.
+
+    Must be called with `_lock` held.
+
+    Args:
+        language: The language code of the file.
+
+    Returns:
+        The catalog, or None if there is no locale file for the language.
+    """
+    path = os.path.join(LOCALES_PATH, f"{language}.json")
+    signature = _file_signature(path)
+    catalog = _files.get(language)
+    if catalog is not None and catalog.signature == signature:
+        return catalog
+    if signature is None:
+        _files.pop(language, None)
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        messages = json.load(f)
+    templates = {key: template for key, template in ((key, compile_template(text)) for key, text in messages.items()) if template is not None}
+    catalog = _Catalog(signature, messages, templates)
+    _files[language] = catalog
+    return catalog
+
+def load_catalog(language: str) -> Tuple[_Catalog, bool]:
+    """
+    Returns the shared catalog of a language with its fallbacks merged in.
+
+    Args:
+        language: The language code.
+
+    Returns:
+        The merged catalog, and whether a locale file exists for the language itself.
+    """
+    chain = tuple(fallback_chain(language))
+    with _lock:
+        catalogs = [_load_file(lang) for lang in chain]
+        signature = tuple(c.signature if c else None for c in catalogs)
+        merged = _chains.get(chain)
+        if merged is None or merged.signature != signature:
+            messages: Dict[str, str] = {}
+            templates: Dict[str, Template] = {}
+            # Most specific locale last, so its keys win
+            for catalog in reversed(catalogs):
+                if catalog:
+                    messages.update(catalog.messages)
+                    templates.update(catalog.templates)
+            merged = _Catalog(signature, messages, templates)
+            _chains[chain] = merged
+    return merged, catalogs[0] is not None
 
 class TranslationManager:
     """
@@ -22,32 +155,30 @@ class TranslationManager:
         """
         self.language = language
         self.translations: Dict[str, str] = {}
-        self.locales_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "locales")
+        self._templates: Dict[str, Template] = {}
+        self.locales_path = LOCALES_PATH
         self.load_translations(language)
 
     def load_translations(self, language: str):
         """
-        Loads translations from a JSON file for the given language.
+        Loads translations for the given language.
 
-        If the specific language file is not found, it attempts to fall back to 'it.json'.
-        If neither is found, the translations dictionary remains empty.
+        Keys missing from the language file are looked up along its fallback
+        chain (e.g. `en-GB` → `en` → `it`). The compiled catalog is shared with
+        every other TranslationManager using the same language, and only
+        re-read if a locale file changed.
 
         Args:
             language: The language code (e.g., "en", "it") for which to load translations.
         """
         self.language = language
-        file_path = os.path.join(self.locales_path, f"{language}.json")
-        
-        if not os.path.exists(file_path):
-            # Fallback to IT if file doesn't exist, or just empty if nothing found
-            print(f"Warning: Locale file not found for {language}, trying 'it'")
-            file_path = os.path.join(self.locales_path, "it.json")
-        
-        if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as f:
-                self.translations = json.load(f)
-        else:
-            self.translations = {}
+        catalog, found = load_catalog(language)
+        fallbacks = fallback_chain(language)[1:]
+        if not found and fallbacks:
+            print(f"Warning: Locale file not found for {language}, trying {', '.join(repr(lang) for lang in fallbacks)}")
+        # Shared between instances: never modified in place
+        self.translations = catalog.messages
+        self._templates = catalog.templates
 
     def get(self, key: str, **kwargs) -> str:
         """
@@ -65,8 +196,11 @@ class TranslationManager:
         """
         text = self.translations.get(key, key)
         if kwargs:
+            template = self._templates.get(key)
             try:
-                return text.format(**kwargs)
+                if template is None:
+                    return text.format(**kwargs)
+                return "".join(literal if field is None else literal + format(kwargs[field], "") for literal, field in template)
             except KeyError:
                 return text
         return text
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# Make `src` and `benchmarks` importable when pytest is run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_gemini import FakeGemini  # noqa: E402
+
+@pytest.fixture
+def fake_gemini():
+    """A local stand-in for the Gemini API, see `benchmarks/fake_gemini.py`."""
+    with FakeGemini() as server:
+        yield server
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+from src.agent import ERROR_PREFIX
+from src.async_agent import AsyncPromptConsultant
+
+def consultant(fake_gemini, **options):
+    return AsyncPromptConsultant("fake-key", client=fake_gemini.client(), **options)
+
+def test_concurrent_sessions_overlap(fake_gemini):
+    fake_gemini.latency = 0.3
+    consultants = [consultant(fake_gemini) for _ in range(8)]
+
+    async def main():
+        return await asyncio.gather(*(c.start_consultation(f"idea {i}") for i, c in enumerate(consultants)))
+
+    started = time.perf_counter()
+    replies = asyncio.run(main())
+    assert time.perf_counter() - started < 8 * 0.3 / 2
+    assert all(reply.startswith("word0") for reply in replies)
+    assert [len(c.chat_session.get_history()) for c in consultants] == [2] * 8
+    assert fake_gemini.counters["generate"] == 8
+
+def test_turn_deadline_leaves_history_unchanged(fake_gemini):
+    session = consultant(fake_gemini, timeout=0.1)
+
+    async def main():
+        fake_gemini.latency = 1.0
+        started = time.perf_counter()
+        reply = await session.start_consultation("An idea")
+        elapsed = time.perf_counter() - started
+        fake_gemini.latency = 0.0
+        # A longer deadline for this call only
+        return reply, elapsed, await session.chat("Once more", timeout=5)
+
+    timed_out, elapsed, reply = asyncio.run(main())
+    assert timed_out == f"{ERROR_PREFIX} the request timed out."
+    assert elapsed < 0.5
+    assert reply.startswith("word0")
+    assert [content.role for content in session.chat_session.get_history()] == ["user", "model"]
+
+def test_cancel_interrupts_only_its_session(fake_gemini):
+    fake_gemini.latency = 0.5
+    cancelled, other = consultant(fake_gemini), consultant(fake_gemini)
+
+    async def main():
+        tasks = [asyncio.create_task(c.start_consultation("An idea")) for c in (cancelled, other)]
+        await asyncio.sleep(0.1)
+        cancelled.cancel()
+        return await asyncio.gather(*tasks)
+
+    replies = asyncio.run(main())
+    assert replies[0] == f"{ERROR_PREFIX} the request was cancelled."
+    assert replies[1].startswith("word0")
+    assert cancelled.chat_session.get_history() == []
+    assert len(other.chat_session.get_history()) == 2
+
+def test_sessions_survive_a_new_event_loop(fake_gemini):
+    session = consultant(fake_gemini)
+    first = asyncio.run(session.start_consultation("An idea"))
+    second = asyncio.run(session.chat("More details"))
+    assert first.startswith("word0") and second.startswith("word0")
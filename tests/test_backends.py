@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from google.genai import types
+
+from src.agent import PromptConsultant
+from src.async_agent import AsyncPromptConsultant
+from src.backends import BackendRouter, GeminiBackend, OpenAICompatibleBackend
+from src.history import SUMMARY_HEADER, HistoryManager
+
+LOCAL_MODEL = "local:bench-local"
+
+def local_settings(fake_gemini):
+    return {"local": {"base_url": f"{fake_gemini.url}/v1"}}
+
+def test_router_resolves_backends_by_prefix(fake_gemini):
+    router = BackendRouter(fake_gemini.client(), local_settings(fake_gemini))
+    backend, model = router.resolve("gemini-2.5-flash")
+    assert isinstance(backend, GeminiBackend) and model == "gemini-2.5-flash"
+    backend, model = router.resolve(LOCAL_MODEL)
+    assert isinstance(backend, OpenAICompatibleBackend) and model == "bench-local"
+    with pytest.raises(ValueError):
+        router.resolve("nowhere:model")
+
+def test_payload_converts_contents_to_chat_messages():
+    backend = OpenAICompatibleBackend("local", "http://127.0.0.1:1/v1")
+    contents = [
+        types.Content(role="user", parts=[types.Part(text="An idea")]),
+        types.Content(role="model", parts=[types.Part(text="thinking", thought=True), types.Part(text="A question?")]),
+    ]
+    payload = backend._payload("bench-local", contents, types.GenerateContentConfig(system_instruction="Be helpful", temperature=0.2, max_output_tokens=64), False)
+    assert payload["messages"] == [
+        {"role": "system", "content": "Be helpful"},
+        {"role": "user", "content": "An idea"},
+        {"role": "assistant", "content": "A question?"},
+    ]
+    assert payload["temperature"] == 0.2 and payload["max_tokens"] == 64
+
+def compacted_summary(consultant):
+    summaries = [entry for entry in consultant.chat_session.get_history() if HistoryManager.is_summary(entry)]
+    assert len(summaries) == 1
+    return summaries[0].parts[0].text
+
+def test_local_model_summarizes_the_history(fake_gemini):
+    consultant = PromptConsultant("fake-key", model_name=LOCAL_MODEL, client=fake_gemini.client(), backends=local_settings(fake_gemini), history_manager=HistoryManager(token_budget=100, keep_recent_turns=1))
+    consultant.start_consultation("An idea")
+    for turn in range(3):
+        assert consultant.chat(f"Answer {turn}").startswith("word0")
+    # A model summary, not the local fallback transcript
+    assert compacted_summary(consultant).startswith(f"{SUMMARY_HEADER}\nword0")
+
+def test_async_local_model_summarizes_the_history(fake_gemini):
+    consultant = AsyncPromptConsultant("fake-key", model_name=LOCAL_MODEL, client=fake_gemini.client(), backends=local_settings(fake_gemini), history_manager=HistoryManager(token_budget=100, keep_recent_turns=1))
+
+    async def main():
+        await consultant.start_consultation("An idea")
+        for turn in range(3):
+            await consultant.chat(f"Answer {turn}")
+
+    asyncio.run(main())
+    assert compacted_summary(consultant).startswith(f"{SUMMARY_HEADER}\nword0")
+
+def test_local_backend_works_from_several_event_loops(fake_gemini):
+    consultant = AsyncPromptConsultant("fake-key", model_name=LOCAL_MODEL, client=fake_gemini.client(), backends=local_settings(fake_gemini))
+
+    async def stream(text):
+        return "".join([chunk async for chunk in consultant.chat_stream(text)])
+
+    assert asyncio.run(consultant.start_consultation("An idea")).startswith("word0")
+    assert asyncio.run(consultant.chat("Some details")).startswith("word0")
+    assert asyncio.run(stream("More details")).startswith("word0")
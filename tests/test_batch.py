@@ -0,0 +1,39 @@
+import json
+
+from src.batch import run_batch
+from src.translation import TranslationManager
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_resume_skips_completed_and_invalid_lines(fake_gemini, tmp_path):
+    source = tmp_path / "ideas.jsonl"
+    source.write_text('A prompt to write SEO articles\n{"id": "broken"\n{"id": "no-idea"}\n', encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+    options = {"client": fake_gemini.client()}
+
+    counts = run_batch(str(source), str(output), "fake-key", "gemini-2.5-flash", TranslationManager("en"), consultant_options=options)
+    assert counts == {"ok": 1, "failed": 2, "skipped": 0}
+    results = read_results(output)
+    assert sorted(result.get("invalid", False) for result in results) == [False, True, True]
+    assert all("Invalid input on line" in result["error"] for result in results if result.get("invalid"))
+
+    counts = run_batch(str(source), str(output), "fake-key", "gemini-2.5-flash", TranslationManager("en"), consultant_options=options)
+    assert counts == {"ok": 0, "failed": 0, "skipped": 3}
+    assert len(read_results(output)) == 3
+    assert fake_gemini.counters["generate"] == 1
+
+def test_resume_retries_failed_consultations(fake_gemini, tmp_path):
+    source = tmp_path / "ideas.jsonl"
+    source.write_text('{"id": "seo", "idea": "A prompt to write SEO articles", "answers": ["Bloggers"]}\n', encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+    options = {"client": fake_gemini.client()}
+
+    fake_gemini.error_rate, fake_gemini.error_code = 1.0, 400
+    assert run_batch(str(source), str(output), "fake-key", "gemini-2.5-flash", TranslationManager("en"), consultant_options=options)["failed"] == 1
+    fake_gemini.error_rate = 0.0
+    assert run_batch(str(source), str(output), "fake-key", "gemini-2.5-flash", TranslationManager("en"), consultant_options=options)["ok"] == 1
+
+    first, second = read_results(output)
+    assert not first["ok"] and "invalid" not in first
+    assert second["ok"] and len(second["turns"]) == 2
@@ -0,0 +1,36 @@
+import httpx
+
+from benchmarks.fake_gemini import FakeGemini
+from benchmarks.suite import bench_turns, compare
+from src.agent import PromptConsultant
+
+def test_compare_flags_regressions_beyond_the_tolerance():
+    baseline = {"turn_chat_p50_ms": 10.0, "get_per_s": 1000.0, "new_metric": 0}
+    results = {"turn_chat_p50_ms": 14.0, "get_per_s": 400.0, "new_metric": 5.0, "unknown": 1.0}
+    assert [line.split(":")[0] for line in compare(results, baseline, 0.5)] == ["get_per_s"]
+    assert [line.split(":")[0] for line in compare(results, baseline, 0.3)] == ["turn_chat_p50_ms", "get_per_s"]
+    # Faster or higher throughput is never a regression
+    assert compare({"turn_chat_p50_ms": 1.0, "get_per_s": 5000.0}, baseline, 0.0) == []
+
+def test_fake_server_streams_and_injects_errors(fake_gemini):
+    fake_gemini.reply_tokens, fake_gemini.tokens_per_chunk = 12, 5
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client())
+    chunks = list(consultant.chat_stream("An idea"))
+    assert "".join(chunks).split() == [f"word{i}" for i in range(12)]
+    assert len(chunks) == 3
+
+    with FakeGemini(error_rate=1.0, error_code=429, retry_delay=0.25) as failing:
+        response = httpx.post(f"{failing.url}/v1beta/models/gemini-2.5-flash:generateContent", json={"contents": []})
+    assert response.status_code == 429
+    assert response.json()["error"]["details"][0]["retryDelay"] == "0.25s"
+
+def test_fake_server_serves_the_local_backend_api(fake_gemini):
+    models = httpx.get(f"{fake_gemini.url}/v1/models").json()
+    assert [model["id"] for model in models["data"]] == ["bench-local"]
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client(), backends={"local": {"base_url": f"{fake_gemini.url}/v1"}}, model_name="local:bench-local")
+    assert consultant.start_consultation("An idea").startswith("word0")
+
+def test_turn_benchmark_reports_every_metric():
+    metrics = bench_turns(quick=True)
+    assert {"turn_chat_p50_ms", "turn_stream_p95_ms", "turn_retry_chat_p50_ms"} <= set(metrics)
+    assert all(value > 0 for value in metrics.values())
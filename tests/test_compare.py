@@ -0,0 +1,54 @@
+import time
+
+from src.agent import PromptConsultant
+from src.async_agent import AsyncPromptConsultant
+from src.compare import compare_models, parse_models
+
+def test_parse_models_drops_blanks_and_duplicates():
+    assert parse_models(" gemini-2.5-flash, ,gemini-2.5-pro,gemini-2.5-flash ") == ["gemini-2.5-flash", "gemini-2.5-pro"]
+
+def test_forks_are_isolated(fake_gemini):
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client())
+    consultant.start_consultation("An idea")
+    fork = consultant.fork("gemini-2.5-pro")
+    assert fork.model_name == "gemini-2.5-pro" and consultant.model_name == "gemini-2.5-flash"
+    assert fork.chat_session.get_history() == consultant.chat_session.get_history()
+
+    fork.chat("Details for the fork")
+    assert len(fork.chat_session.get_history()) == 4
+    assert len(consultant.chat_session.get_history()) == 2
+    consultant.chat("Details for the original")
+    assert fork.chat_session.get_history()[2].parts[0].text == "Details for the fork"
+    assert consultant.chat_session.get_history()[2].parts[0].text == "Details for the original"
+
+def test_async_fork_keeps_the_turn_deadline(fake_gemini):
+    consultant = AsyncPromptConsultant("fake-key", client=fake_gemini.client(), timeout=12)
+    fork = consultant.fork()
+    assert isinstance(fork, AsyncPromptConsultant) and fork.timeout == 12
+
+def test_models_answer_concurrently_on_forks(fake_gemini):
+    fake_gemini.latency = 0.3
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client(), backends={"local": {"base_url": f"{fake_gemini.url}/v1"}})
+    consultant.start_consultation("An idea")
+    history = consultant.chat_session.get_history()
+    updates = []
+
+    started = time.perf_counter()
+    results = compare_models(consultant, ["gemini-2.5-flash", "gemini-2.5-pro", "local:bench-local", "nowhere:model"], "Some details", on_update=lambda results: updates.append(sum(r.done for r in results)))
+    assert time.perf_counter() - started < 3 * 0.3
+
+    assert [result.model for result in results] == ["gemini-2.5-flash", "gemini-2.5-pro", "local:bench-local", "nowhere:model"]
+    assert [result.error for result in results] == [False, False, False, True]
+    for result in results[:3]:
+        assert result.reply.startswith("word0") and result.response_tokens == 60
+        assert result.consultant.model_name == result.model
+        assert len(result.consultant.chat_session.get_history()) == 4
+    assert updates[0] == 0 and updates[-1] == 4
+    # The compared session itself is untouched
+    assert consultant.chat_session.get_history() == history
+
+def test_first_turn_is_compared_from_an_empty_session(fake_gemini):
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client())
+    results = compare_models(consultant, ["gemini-2.5-flash", "gemini-2.5-pro"], "An idea", first_turn=True)
+    assert all(len(result.consultant.chat_session.get_history()) == 2 for result in results)
+    assert consultant.chat_session.get_history() == []
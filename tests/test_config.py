@@ -0,0 +1,70 @@
+import json
+import multiprocessing
+
+import pytest
+
+from src.config import ConfigManager
+
+def write_settings(path, key, count):
+    manager = ConfigManager(str(path))
+    for i in range(count):
+        getattr(manager, f"set_{key}")(f"{key}-{i}")
+
+def test_concurrent_processes_keep_each_others_updates(tmp_path):
+    path = tmp_path / "config.json"
+    ConfigManager(str(path))
+    processes = [multiprocessing.Process(target=write_settings, args=(path, key, 30)) for key in ("model", "language", "api_key")]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    assert json.loads(path.read_text()) == {"model": "model-29", "language": "language-29", "api_key": "api_key-29"}
+    assert not list(tmp_path.glob(".config.*.tmp"))
+
+def test_transaction_writes_once_on_exit(tmp_path, monkeypatch):
+    manager = ConfigManager(str(tmp_path / "config.json"))
+    writes = []
+    write_atomic = manager._write_atomic
+    monkeypatch.setattr(manager, "_write_atomic", lambda config: writes.append(dict(config)) or write_atomic(config))
+    with manager.transaction():
+        manager.set_model("gemini-2.5-pro")
+        with manager.transaction():
+            manager.set_language("en")
+        assert manager.get_model() == "gemini-2.5-pro"
+        assert json.loads((tmp_path / "config.json").read_text()) == {}
+    assert writes == [{"model": "gemini-2.5-pro", "language": "en"}]
+
+def test_failed_transaction_is_discarded(tmp_path):
+    manager = ConfigManager(str(tmp_path / "config.json"))
+    manager.set_model("gemini-2.5-flash")
+    with pytest.raises(RuntimeError):
+        with manager.transaction():
+            manager.set_model("gemini-2.5-pro")
+            raise RuntimeError("abort")
+    assert manager.get_model() == "gemini-2.5-flash"
+    assert json.loads((tmp_path / "config.json").read_text()) == {"model": "gemini-2.5-flash"}
+
+def test_clear_in_a_transaction_resets_several_settings_at_once(tmp_path):
+    manager = ConfigManager(str(tmp_path / "config.json"))
+    manager.set_model("gemini-2.5-flash")
+    manager.set_api_key("secret")
+    with manager.transaction():
+        manager.clear_config()
+        manager.set_language("it")
+    assert json.loads((tmp_path / "config.json").read_text()) == {"language": "it"}
+
+def test_changes_from_another_process_are_reloaded_on_mtime(tmp_path, monkeypatch):
+    path = str(tmp_path / "config.json")
+    reader, writer = ConfigManager(path), ConfigManager(path)
+    reads = []
+    read_config = reader._read_config
+    monkeypatch.setattr(reader, "_read_config", lambda: reads.append(1) or read_config())
+    assert reader.get_model() is None
+    assert reader.get_language() is None
+    assert reads == []
+
+    writer.set_model("gemini-2.5-pro")
+    assert reader.get_model() == "gemini-2.5-pro"
+    assert reader.get_model() == "gemini-2.5-pro"
+    assert len(reads) == 1
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from google.genai import errors
+
+from src.agent import PromptConsultant
+from src.async_agent import AsyncPromptConsultant
+from src.context_cache import SystemPromptCache, is_unsupported_error
+
+def test_cache_is_created_once_and_extended_near_expiry(fake_gemini):
+    client = fake_gemini.client()
+    fresh = SystemPromptCache(client, ttl_seconds=3600, refresh_margin_seconds=300)
+    name = fresh.get("gemini-2.5-flash", "en", "System prompt")
+    assert fresh.get("gemini-2.5-flash", "en", "System prompt") == name
+    assert fake_gemini.counters["cached_contents"] == 1
+    assert "update_cached_content" not in fake_gemini.counters
+
+    # Entries expiring within the margin are extended before use
+    expiring = SystemPromptCache(client, ttl_seconds=60, refresh_margin_seconds=300)
+    name = expiring.get("gemini-2.5-flash", "en", "System prompt")
+    assert expiring.get("gemini-2.5-flash", "en", "System prompt") == name
+    assert fake_gemini.counters["update_cached_content"] == 1
+
+def test_cache_expired_while_extending_is_recreated(fake_gemini):
+    cache = SystemPromptCache(fake_gemini.client(), ttl_seconds=60, refresh_margin_seconds=300)
+    name = cache.get("gemini-2.5-flash", "en", "System prompt")
+    fake_gemini.deleted_caches.add(name)
+    assert cache.get("gemini-2.5-flash", "en", "System prompt") not in (None, name)
+    assert fake_gemini.counters["cached_contents"] == 2
+
+@pytest.mark.parametrize("error, unsupported", [
+    (errors.ClientError(400, {"error": {"message": "Cached content is too small. min_total_token_count=1024"}}), True),
+    (errors.ClientError(404, {"error": {"message": "Model does not support createCachedContent"}}), True),
+    (errors.ClientError(400, {"error": {"message": "Invalid ttl"}}), False),
+    (errors.ClientError(429, {"error": {"message": "Resource exhausted"}}), False),
+    (errors.ServerError(503, {"error": {"message": "Unavailable"}}), False),
+    (ConnectionError("reset"), False),
+])
+def test_only_unsupported_errors_disable_caching(error, unsupported):
+    assert is_unsupported_error(error) is unsupported
+
+def test_turn_recovers_from_a_lost_cache(fake_gemini):
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client(), context_cache=True)
+    assert consultant.start_consultation("An idea").startswith("word0")
+    lost = consultant._session_cached_content
+    assert lost is not None
+    fake_gemini.deleted_caches.add(lost)
+
+    assert consultant.chat("Some details").startswith("word0")
+    assert consultant._session_cached_content not in (None, lost)
+    assert len(consultant.chat_session.get_history()) == 4
+    # The failed attempt and its retry on the new cache
+    assert fake_gemini.counters["generate"] == 3
+
+def test_streamed_turn_recovers_from_a_lost_cache(fake_gemini):
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client(), context_cache=True)
+    consultant.start_consultation("An idea")
+    fake_gemini.deleted_caches.add(consultant._session_cached_content)
+    assert "".join(consultant.chat_stream("Some details")).startswith("word0")
+    assert len(consultant.chat_session.get_history()) == 4
+    assert fake_gemini.counters["generate"] == 3
+
+def test_async_turns_recover_from_a_lost_cache(fake_gemini):
+    consultant = AsyncPromptConsultant("fake-key", client=fake_gemini.client(), context_cache=True)
+
+    async def main():
+        await consultant.start_consultation("An idea")
+        fake_gemini.deleted_caches.add(consultant._session_cached_content)
+        reply = await consultant.chat("Some details")
+        fake_gemini.deleted_caches.add(consultant._session_cached_content)
+        streamed = "".join([chunk async for chunk in consultant.chat_stream("More details")])
+        return reply, streamed
+
+    reply, streamed = asyncio.run(main())
+    assert reply.startswith("word0") and streamed.startswith("word0")
+    assert len(consultant.chat_session.get_history()) == 6
+    assert fake_gemini.counters["cached_contents"] == 3
+    assert fake_gemini.counters["generate"] == 5
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+from src.backends import BackendRouter
+from src.evaluate import Check, Evaluator, read_dataset, run_evaluation
+
+def write_dataset(path, samples):
+    path.write_text("".join(json.dumps(sample) + "\n" for sample in samples), encoding="utf-8")
+    return str(path)
+
+@pytest.mark.parametrize("check", [
+    {"type": "regex", "pattern": "("},
+    {"type": "regex"},
+    {"type": "unknown"},
+    "word0",
+])
+def test_invalid_sample_check_aborts_before_any_call(fake_gemini, tmp_path, check):
+    dataset = write_dataset(tmp_path / "dataset.jsonl", [
+        {"input": "first"},
+        {"input": "second", "checks": [check]},
+    ])
+    backends = BackendRouter(fake_gemini.client())
+    with pytest.raises(ValueError, match=r"dataset\.jsonl:2:"):
+        run_evaluation(["Answer briefly."], dataset, backends, "gemini-2.5-flash")
+    assert fake_gemini.counters.get("generate", 0) == 0
+
+def test_non_string_input_reports_its_line(tmp_path):
+    dataset = write_dataset(tmp_path / "dataset.jsonl", [{"input": "first"}, {"input": ["not", "text"]}])
+    with pytest.raises(ValueError, match=r"dataset\.jsonl:2: .*'input' not a string"):
+        read_dataset(dataset)
+
+@pytest.mark.parametrize("model_name", ["gemini-2.5-flash", "local:bench-local"])
+def test_evaluation_runs_twice_in_one_process(fake_gemini, tmp_path, model_name):
+    dataset = write_dataset(tmp_path / "dataset.jsonl", [{"input": "first"}, {"input": "second"}])
+    backends = BackendRouter(fake_gemini.client(), {"local": {"base_url": f"{fake_gemini.url}/v1"}})
+    # Each run has its own event loop: connections of the first must not be reused
+    for _ in range(2):
+        [summary] = run_evaluation(["Answer briefly."], dataset, backends, model_name)
+        assert summary["samples"] == 2 and summary["errors"] == 0
+
+def test_evaluation_scores_sample_checks(fake_gemini, tmp_path):
+    dataset = write_dataset(tmp_path / "dataset.jsonl", [
+        {"id": "hit", "input": "first", "checks": [{"type": "regex", "pattern": "word0"}]},
+        {"id": "miss", "input": "second", "checks": [{"type": "regex", "pattern": "nothing"}]},
+    ])
+    output = tmp_path / "results.jsonl"
+    [summary] = run_evaluation(["Answer briefly."], dataset, BackendRouter(fake_gemini.client()), "gemini-2.5-flash", output_path=str(output))
+    assert summary["samples"] == 2 and summary["errors"] == 0 and summary["pass_rate"] == 0.5
+    results = {row["id"]: row["passed"] for row in map(json.loads, output.read_text(encoding="utf-8").splitlines())}
+    assert results == {"hit": True, "miss": False}
+    assert fake_gemini.counters["generate"] == 2
+
+class CrashingCheck(Check):
+    async def run(self, sample, output, evaluator):
+        raise KeyError("boom")
+
+def test_crashing_check_fails_its_sample_only(fake_gemini, tmp_path):
+    dataset = write_dataset(tmp_path / "dataset.jsonl", [{"input": "first"}, {"input": "second"}])
+    evaluator = Evaluator(BackendRouter(fake_gemini.client()), "gemini-2.5-flash", [CrashingCheck("crash")])
+    results = asyncio.run(evaluator.run("Answer briefly.", read_dataset(dataset)))
+    assert len(results) == 2
+    for result in results:
+        assert result.output and "crash" in result.error and not result.passed
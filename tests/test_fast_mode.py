@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from src.agent import ERROR_PREFIX, PromptConsultant
+from src.async_agent import AsyncPromptConsultant
+from src.evaluate import extract_final_prompt
+from src.fast_mode import ConsultationDraft
+from src.history import content_text
+from src.library import PromptLibrary
+from src.translation import TranslationManager
+
+DRAFT = {
+    "analysis": "A prompt for SEO articles.",
+    "questions": [
+        {"question": "Who reads them?", "default_answer": "Small business owners"},
+        {"question": "Which tone?", "default_answer": "Friendly"},
+    ],
+    "draft_prompt": "You write SEO articles.",
+}
+FINAL_REPLY = "Here it is:\n\n```markdown\nYou write friendly SEO articles for small business owners.\n```"
+
+def consultant(fake_gemini, cls=PromptConsultant, **options):
+    return cls("fake-key", client=fake_gemini.client(), translation_manager=TranslationManager("en"), **options)
+
+def test_draft_round_trip():
+    draft = ConsultationDraft.parse("```json\n" + json.dumps(DRAFT) + "\n```")
+    assert draft.draft_prompt == "You write SEO articles."
+    assert [item.default_answer for item in draft.questions] == ["Small business owners", "Friendly"]
+    assert "*Proposed answer: Friendly*" in draft.to_markdown("Questions", "Proposed answer")
+    message = draft.answers_message(["Developers", "  "])
+    assert "1. Who reads them?\n   Developers" in message and "2. Which tone?\n   Friendly" in message
+    with pytest.raises(ValueError):
+        ConsultationDraft.parse('{"questions": []}')
+
+def test_sync_and_async_drafts_match(fake_gemini):
+    fake_gemini.replies = [json.dumps(DRAFT), json.dumps(DRAFT)]
+    sync = consultant(fake_gemini)
+    reply, draft = sync.start_fast_consultation("SEO articles")
+    async_reply, async_draft = asyncio.run(consultant(fake_gemini, AsyncPromptConsultant).start_fast_consultation("SEO articles"))
+    assert draft is not None and draft == async_draft
+    assert reply == async_reply
+    assert content_text(sync.chat_session.get_history()[-1]) == reply
+
+def test_async_free_text_reply_continues_as_interview(fake_gemini):
+    session = consultant(fake_gemini, AsyncPromptConsultant)
+    reply, draft = asyncio.run(session.start_fast_consultation("SEO articles"))
+    assert draft is None and reply.startswith("word0")
+    assert len(session.chat_session.get_history()) == 2
+
+def test_async_fast_consultation_deadline(fake_gemini):
+    fake_gemini.latency = 1.0
+    session = consultant(fake_gemini, AsyncPromptConsultant, timeout=0.1)
+    reply, draft = asyncio.run(session.start_fast_consultation("SEO articles"))
+    assert (reply, draft) == (f"{ERROR_PREFIX} the request timed out.", None)
+    assert session.chat_session.get_history() == []
+
+def accept_defaults(fake_gemini, fail):
+    def ask(*args, **kwargs):
+        if fail:
+            fake_gemini.error_rate, fake_gemini.error_code = 1.0, 400
+        return kwargs["default"]
+    return ask
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_answered_draft_is_archived(fake_gemini, tmp_path, monkeypatch, stream):
+    monkeypatch.setattr(main.Prompt, "ask", accept_defaults(fake_gemini, fail=False))
+    fake_gemini.replies = [json.dumps(DRAFT), FINAL_REPLY]
+    session = consultant(fake_gemini)
+    assert main.fast_consultation(session, "SEO articles", stream, TranslationManager("en")) is True
+    library = PromptLibrary(str(tmp_path / "library.sqlite3"))
+    main.archive_session(library, "key", "SEO articles", session, "en")
+    [entry] = library.recent()
+    library.close()
+    assert entry.final_prompt == "You write friendly SEO articles for small business owners."
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_unanswered_draft_is_not_archived(fake_gemini, monkeypatch, stream):
+    monkeypatch.setattr(main.Prompt, "ask", accept_defaults(fake_gemini, fail=True))
+    fake_gemini.replies = [json.dumps(DRAFT)]
+    session = consultant(fake_gemini)
+    assert main.fast_consultation(session, "SEO articles", stream, TranslationManager("en")) is False
+    # The session ends on the draft, which would pass for a final prompt
+    assert extract_final_prompt(content_text(session.chat_session.get_history()[-1])) == "You write SEO articles."
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from google.genai import types
+
+from src.agent import PromptConsultant
+from src.async_agent import AsyncPromptConsultant
+from src.generation import FINAL, INTERVIEW, GenerationPolicy
+from src.translation import TranslationManager
+
+def history(*replies):
+    contents = []
+    for reply in replies:
+        contents.append(types.Content(role="user", parts=[types.Part(text="An answer")]))
+        contents.append(types.Content(role="model", parts=[types.Part(text=reply)]))
+    return contents
+
+QUESTIONS = "Who is the audience?"
+PROMPT = "Here it is:\n```markdown\nYou write articles.\n```"
+
+@pytest.mark.parametrize("interview_turns, replies, phase", [
+    (1, [], INTERVIEW),
+    (1, [QUESTIONS], FINAL),
+    # The model kept asking: the turn after is still final
+    (1, [QUESTIONS, QUESTIONS], FINAL),
+    (2, [QUESTIONS], INTERVIEW),
+    (2, [QUESTIONS, QUESTIONS], FINAL),
+    (0, [], FINAL),
+    # Replies without questions (e.g. a summary acknowledgement) don't count
+    (1, ["Noted."], INTERVIEW),
+    (3, [PROMPT], FINAL),
+])
+def test_phase(interview_turns, replies, phase):
+    assert GenerationPolicy(interview_turns=interview_turns).phase(history(*replies), "An idea") == phase
+
+def test_detailed_idea_starts_final():
+    policy = GenerationPolicy(detailed_idea_chars=20)
+    assert policy.phase([], "A short idea") == INTERVIEW
+    assert policy.phase([], "A very detailed idea, with audience, tone and format") == FINAL
+    # Only the first turn is judged by its length
+    assert policy.phase(history("Noted."), "A very detailed answer, with audience, tone and format") == INTERVIEW
+
+def test_settings_merge_model_overrides():
+    policy = GenerationPolicy(
+        phases={INTERVIEW: {"max_output_tokens": 1024}},
+        models={"gemini-2.5-pro": {INTERVIEW: {"thinking_budget": 128, "model": "local:qwen"}}},
+    )
+    assert policy.settings("gemini-2.5-flash", INTERVIEW) == {"thinking_budget": 512, "max_output_tokens": 1024}
+    assert policy.settings("gemini-2.5-pro", INTERVIEW)["thinking_budget"] == 128
+    assert policy.model("gemini-2.5-pro", INTERVIEW) == "local:qwen"
+    assert policy.model("gemini-2.5-pro", FINAL) is None
+    update = policy.config_update("gemini-2.5-flash", FINAL, thinking=False, output_limit=4096)
+    assert update == {"max_output_tokens": 4096}
+
+def consultant(fake_gemini, cls, sent, monkeypatch):
+    session = cls(
+        "fake-key",
+        client=fake_gemini.client(),
+        translation_manager=TranslationManager("en"),
+        generation_policy=GenerationPolicy(phases={INTERVIEW: {"max_output_tokens": 10}}),
+    )
+    generate = session._generate
+
+    def spy(method, model, contents, config):
+        sent.append(contents)
+        return generate(method, model, contents, config)
+
+    monkeypatch.setattr(session, "_generate", spy)
+    return session
+
+def test_truncated_stream_continues_in_session_language(fake_gemini, monkeypatch):
+    fake_gemini.reply_tokens = 30
+    sent = []
+    session = consultant(fake_gemini, PromptConsultant, sent, monkeypatch)
+    reply = "".join(session.start_consultation_stream("An idea"))
+    # The cut interview reply, then the whole reply of the final turn
+    assert len(reply.split()) == 10 + 30
+    assert len(sent) == 2
+    assert sent[-1][-1].parts[0].text == "Continue exactly where you left off, without repeating anything."
+
+def test_truncated_async_stream_continues_in_session_language(fake_gemini, monkeypatch):
+    fake_gemini.reply_tokens = 30
+    sent = []
+    session = consultant(fake_gemini, AsyncPromptConsultant, sent, monkeypatch)
+
+    async def main():
+        return "".join([chunk async for chunk in session.start_consultation_stream("An idea")])
+
+    asyncio.run(main())
+    assert len(sent) == 2
+    assert sent[-1][-1].parts[0].text == "Continue exactly where you left off, without repeating anything."
@@ -0,0 +1,81 @@
+import asyncio
+
+from google.genai import types
+
+from src.agent import PromptConsultant
+from src.async_agent import AsyncPromptConsultant
+from src.history import SUMMARY_HEADER, HistoryManager, estimate_tokens
+
+def content(role, text):
+    return types.Content(role=role, parts=[types.Part(text=text)])
+
+def exchanges(count, size=40):
+    history = []
+    for turn in range(count):
+        history += [content("user", f"question {turn} " + "u" * size), content("model", f"answer {turn} " + "m" * size)]
+    return history
+
+def test_history_within_budget_or_too_short_is_kept():
+    manager = HistoryManager(token_budget=10_000, keep_recent_turns=2)
+    assert manager.split(exchanges(10)) is None
+    assert HistoryManager(token_budget=1, keep_recent_turns=2).split(exchanges(3)) is None
+
+def test_split_keeps_the_initial_idea_and_the_latest_turns():
+    history = exchanges(6)
+    head, middle, tail = HistoryManager(token_budget=100, keep_recent_turns=2).split(history)
+    assert head == history[:2]
+    assert middle == history[2:8]
+    assert tail == history[8:]
+
+def test_split_uses_the_given_token_counter():
+    manager = HistoryManager(token_budget=100, keep_recent_turns=2)
+    assert manager.split(exchanges(6), count_tokens=lambda contents: 0) is None
+    assert manager.split(exchanges(6, size=1), count_tokens=lambda contents: 1000) is not None
+
+def test_previous_summary_alone_is_not_folded_again():
+    manager = HistoryManager(token_budget=50, keep_recent_turns=2)
+    head, middle, tail = manager.split(exchanges(6))
+    compacted = manager.build(head, "summary", tail)
+    assert manager.is_summary(compacted[2])
+    assert compacted[2].parts[0].text.startswith(SUMMARY_HEADER)
+    # Still over budget, but only the summary sits between the kept parts
+    assert estimate_tokens(compacted) > manager.token_budget
+    assert manager.split(compacted) is None
+
+def test_turns_are_folded_in_batches_when_the_kept_parts_exceed_the_budget():
+    manager = HistoryManager(token_budget=50, keep_recent_turns=2)
+    head, middle, tail = manager.split(exchanges(6))
+    compacted = manager.build(head, "summary", tail)
+    # One new turn to fold: not worth a summarization call yet
+    one_more = compacted + exchanges(1)
+    assert manager.split(one_more) is None
+    head, middle, tail = manager.split(one_more + exchanges(1))
+    assert sum(1 for entry in middle if entry.role == "user" and not manager.is_summary(entry)) == 2
+    assert manager.is_summary(middle[0])
+
+def test_consultant_compacts_with_a_model_summary(fake_gemini):
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client(), history_manager=HistoryManager(token_budget=100, keep_recent_turns=1))
+    consultant.start_consultation("An idea")
+    for turn in range(3):
+        consultant.chat(f"Answer {turn}")
+    history = consultant.chat_session.get_history()
+    summaries = [entry for entry in history if HistoryManager.is_summary(entry)]
+    assert len(summaries) == 1
+    # The summary comes from the model, not from the local fallback
+    assert summaries[0].parts[0].text.startswith(f"{SUMMARY_HEADER}\nword0")
+    assert "An idea" in history[0].parts[0].text
+    assert history[-2].parts[0].text == "Answer 2"
+    # Four turns and the summarization call
+    assert fake_gemini.counters["generate"] == 5
+
+def test_async_consultant_compacts_with_a_model_summary(fake_gemini):
+    consultant = AsyncPromptConsultant("fake-key", client=fake_gemini.client(), history_manager=HistoryManager(token_budget=100, keep_recent_turns=1))
+
+    async def main():
+        await consultant.start_consultation("An idea")
+        for turn in range(3):
+            await consultant.chat(f"Answer {turn}")
+
+    asyncio.run(main())
+    summaries = [entry for entry in consultant.chat_session.get_history() if HistoryManager.is_summary(entry)]
+    assert len(summaries) == 1 and summaries[0].parts[0].text.startswith(f"{SUMMARY_HEADER}\nword0")
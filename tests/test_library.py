@@ -0,0 +1,77 @@
+import pytest
+
+from src.library import PromptLibrary, fts_query, prompt_hash
+
+TRANSCRIPT = [
+    {"role": "consultant", "text": "Who reads the articles?"},
+    {"role": "user", "text": "Small business owners"},
+]
+
+@pytest.fixture
+def library(tmp_path):
+    library = PromptLibrary(str(tmp_path / "library.sqlite3"))
+    yield library
+    library.close()
+
+def save(library, key, idea, final_prompt):
+    return library.save(key, idea, TRANSCRIPT, final_prompt, "gemini-2.5-flash", "en")
+
+def test_prompt_hash_ignores_case_and_whitespace():
+    assert prompt_hash("Write  an\nSEO article") == prompt_hash("write an seo article ")
+    assert prompt_hash("Write an SEO article") != prompt_hash("Write a SEO article")
+
+def test_fts_query():
+    assert fts_query("SEO, articles!") == '"seo" "articles"'
+    assert fts_query("seo art", prefix=True) == '"seo"* "art"*'
+    assert fts_query(" ?! ") is None
+
+def test_search_ranks_ideas_above_transcript(library):
+    assert library.fts
+    in_transcript = save(library, "a", "Newsletter copy", "You write newsletters.")
+    in_idea = save(library, "b", "Articles for owners", "You write blog posts.")
+    assert [entry.id for entry in library.search("owners")] == [in_idea, in_transcript]
+    assert [entry.id for entry in library.search("owners newsletter")] == [in_transcript]
+    assert library.search("nothing") == []
+
+def test_search_falls_back_to_prefixes(library):
+    entry_id = save(library, "a", "SEO articles", "You write search-optimized articles.")
+    quiz_id = save(library, "b", "Art history quiz", "You ask questions on art.")
+    # Whole words win: "art" doesn't also bring up "articles"
+    assert [entry.id for entry in library.search("art")] == [quiz_id]
+    assert [entry.id for entry in library.search("optim")] == [entry_id]
+
+def test_blank_query_lists_recent_entries(library):
+    older = save(library, "a", "First idea", "First prompt.")
+    newer = save(library, "b", "Second idea", "Second prompt.")
+    assert [entry.id for entry in library.search("  ")] == [newer, older]
+
+def test_same_final_prompt_is_stored_once(library):
+    first = save(library, "a", "SEO articles", "You write SEO articles.")
+    second = save(library, "b", "Blog posts", "you write  SEO articles.")
+    assert first == second
+    assert library.stats()["entries"] == 1
+    assert library.get(first).idea == "SEO articles"
+
+def test_revisions_update_the_session_entry(library):
+    entry_id = save(library, "a", "SEO articles", "You write SEO articles.")
+    assert save(library, "a", "SEO articles", "You write SEO articles for owners.") == entry_id
+    assert library.stats()["entries"] == 1
+    entry = library.get(entry_id)
+    assert entry.final_prompt == "You write SEO articles for owners."
+    assert entry.transcript == TRANSCRIPT
+    # The index follows the update
+    assert [e.id for e in library.search("owners")] == [entry_id]
+    assert [e.id for e in library.search("SEO articles")] == [entry_id]
+
+def test_mark_used(library):
+    entry_id = save(library, "a", "SEO articles", "You write SEO articles.")
+    library.mark_used(entry_id)
+    assert library.get(entry_id).uses == 1
+    assert library.get(entry_id + 1) is None
+
+def test_substring_search_without_fts(library):
+    entry_id = save(library, "a", "SEO articles", "You write search-optimized articles.")
+    save(library, "b", "Art history quiz", "You ask questions.")
+    library.fts = False
+    assert [entry.id for entry in library.search("optim seo")] == [entry_id]
+    assert library.search("owners") == []
@@ -0,0 +1,67 @@
+import json
+
+from src.agent import PromptConsultant
+from src.metrics import MetricsRecorder, TurnMetrics, percentile
+
+def test_percentile_is_nearest_rank():
+    assert percentile([], 50) is None
+    assert percentile([3.0, 1.0, 2.0], 50) == 2.0
+    assert percentile([float(i) for i in range(1, 101)], 95) == 95.0
+
+def test_consultant_turns_are_recorded(fake_gemini):
+    metrics = MetricsRecorder()
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client(), metrics=metrics)
+    consultant.start_consultation("An idea")
+    "".join(consultant.chat_stream("Some details"))
+    first, second = metrics.turns
+    assert first.model == second.model == "gemini-2.5-flash"
+    assert first.response_tokens == second.response_tokens == 60
+    assert first.prompt_tokens > 0 and not first.streamed
+    assert second.streamed and 0 < second.time_to_first_token <= second.wall_time
+    summary = metrics.summary()["gemini-2.5-flash"]
+    assert summary["turns"] == 2 and summary["errors"] == 0 and summary["response_tokens"] == 120
+
+def test_failed_turns_are_counted_but_not_timed(fake_gemini):
+    metrics = MetricsRecorder()
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client(), metrics=metrics)
+    consultant.start_consultation("An idea")
+    fake_gemini.error_rate, fake_gemini.error_code = 1.0, 400
+    consultant.chat("Some details")
+    summary = metrics.summary()["gemini-2.5-flash"]
+    assert summary["turns"] == 2 and summary["errors"] == 1
+    assert summary["p95"] == metrics.turns[0].wall_time
+
+def test_jsonl_export_appends_one_object_per_turn(tmp_path):
+    metrics = MetricsRecorder()
+    metrics.record(TurnMetrics(model="gemini-2.5-flash", wall_time=0.5, response_tokens=10, phase="interview"))
+    metrics.record(TurnMetrics(model="local:qwen", wall_time=1.5, error=True))
+    path = tmp_path / "metrics.jsonl"
+    metrics.export_jsonl(str(path))
+    metrics.export_jsonl(str(path))
+    rows = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(rows) == 4
+    assert rows[0]["model"] == "gemini-2.5-flash" and rows[0]["phase"] == "interview" and rows[0]["response_tokens"] == 10
+    assert rows[1]["error"] is True
+
+def test_prometheus_export(tmp_path):
+    metrics = MetricsRecorder()
+    for wall_time in (1.0, 2.0, 3.0):
+        metrics.record(TurnMetrics(model="gemini-2.5-flash", wall_time=wall_time, time_to_first_token=wall_time / 2, prompt_tokens=100, response_tokens=10, retries=1))
+    metrics.record(TurnMetrics(model="gemini-2.5-flash", wall_time=0.01, cache_hit=True))
+    metrics.record(TurnMetrics(model="gemini-2.5-flash", wall_time=9.0, error=True))
+    path = tmp_path / "consultant.prom"
+    metrics.export_prometheus(str(path))
+    lines = path.read_text(encoding="utf-8").splitlines()
+    samples = dict(line.rsplit(" ", 1) for line in lines if not line.startswith("#"))
+    model = 'model="gemini-2.5-flash"'
+    # Cache hits and errors are left out of the latency summaries
+    assert samples[f'prompt_consultant_turn_duration_seconds{{{model},quantile="0.5"}}'] == "2.000000"
+    assert samples[f"prompt_consultant_turn_duration_seconds_count{{{model}}}"] == "3"
+    assert samples[f'prompt_consultant_time_to_first_token_seconds{{{model},quantile="0.95"}}'] == "1.500000"
+    assert samples[f'prompt_consultant_tokens_total{{{model},kind="prompt"}}'] == "300"
+    assert samples[f"prompt_consultant_turns_total{{{model}}}"] == "5"
+    assert samples[f"prompt_consultant_turn_errors_total{{{model}}}"] == "1"
+    assert samples[f"prompt_consultant_turn_retries_total{{{model}}}"] == "3"
+    assert samples[f"prompt_consultant_cache_hits_total{{{model}}}"] == "1"
+    assert "# TYPE prompt_consultant_tokens_total counter" in lines
+    assert not list(tmp_path.glob("*.tmp"))
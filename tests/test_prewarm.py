@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+from main import swap_session
+from src.agent import PromptConsultant
+from src.prewarm import BackgroundTask
+
+def test_background_task_hands_over_its_result():
+    release = threading.Event()
+    task = BackgroundTask(lambda value: release.wait(5) and value, 42)
+    assert not task.done()
+    release.set()
+    assert task.result() == 42 and task.done()
+
+def test_background_task_reraises_errors():
+    def fail():
+        raise KeyError("missing")
+
+    task = BackgroundTask(fail)
+    with pytest.raises(KeyError):
+        task.result()
+
+def test_warm_up_opens_the_connection(fake_gemini):
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client())
+    consultant.warm_up()
+    assert fake_gemini.counters["get"] == 1
+    assert consultant.start_consultation("An idea").startswith("word0")
+
+def test_warm_up_failures_are_ignored(fake_gemini):
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client())
+    fake_gemini.stop()
+    consultant.warm_up()
+
+def test_sessions_are_swapped_in_the_background(fake_gemini):
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client())
+    consultant.start_consultation("An idea")
+    swapped = BackgroundTask(swap_session, consultant, "gemini-2.5-pro").result()
+    assert swapped is consultant and consultant.model_name == "gemini-2.5-pro"
+    assert consultant.chat_session.get_history() == []
+    assert fake_gemini.counters["get"] == 1
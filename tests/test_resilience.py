@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from google.genai import errors
+
+from src.agent import ERROR_PREFIX, PromptConsultant
+from src.resilience import RequestPolicy, RequestTimeout, acall_with_policy, astream_with_policy, call_with_policy, retry_after, stream_with_policy
+
+def server_error(code=503, headers=None):
+    return errors.ServerError(code, {"error": {"code": code, "message": "Unavailable"}}, httpx.Response(code, headers=headers or {}))
+
+class Flaky:
+    """Fails with `errors` in turn, then answers with the model name."""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def __call__(self, model):
+        self.calls.append(model)
+        if self.errors:
+            raise self.errors.pop(0)
+        return model
+
+def test_transient_errors_are_retried_with_backoff():
+    policy = RequestPolicy(max_retries=3, backoff_base=0.01)
+    call = Flaky(server_error(), server_error(429))
+    result = call_with_policy(policy, call, "gemini-2.5-flash")
+    assert (result.response, result.model, result.retries) == ("gemini-2.5-flash", "gemini-2.5-flash", 2)
+
+def test_backoff_is_bounded_and_honours_retry_after():
+    policy = RequestPolicy(backoff_base=0.5, backoff_max=1.0)
+    assert all(0 <= policy.backoff(attempt, server_error()) <= min(1.0, 0.5 * 2 ** attempt) for attempt in range(6))
+    hinted = server_error(429, {"retry-after": "2.5"})
+    assert retry_after(hinted) == 2.5
+    assert policy.backoff(0, hinted) == 2.5
+    delay = errors.ClientError(429, {"error": {"details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "0.3s"}]}})
+    assert retry_after(delay) == 0.3
+
+def test_retry_waits_for_the_retry_after_hint():
+    policy = RequestPolicy(max_retries=1, backoff_base=0.0)
+    started = time.monotonic()
+    call_with_policy(policy, Flaky(server_error(429, {"retry-after": "0.3"})), "gemini-2.5-flash")
+    assert time.monotonic() - started >= 0.3
+
+def test_client_errors_are_not_retried():
+    policy = RequestPolicy(max_retries=3, fallback_models=["gemini-2.5-flash-lite"])
+    call = Flaky(errors.ClientError(400, {"error": {"message": "Bad request"}}))
+    with pytest.raises(errors.ClientError):
+        call_with_policy(policy, call, "gemini-2.5-flash")
+    assert call.calls == ["gemini-2.5-flash"]
+
+def test_failing_model_falls_back_down_the_chain():
+    policy = RequestPolicy(max_retries=1, backoff_base=0.0, fallback_models=["gemini-2.5-flash-lite"])
+    call = Flaky(errors.ClientError(404, {"error": {"message": "Not found"}}), server_error())
+    result = call_with_policy(policy, call, "gemini-2.5-pro")
+    assert result.model == "gemini-2.5-flash-lite" and result.retries == 2
+    assert call.calls == ["gemini-2.5-pro", "gemini-2.5-flash-lite", "gemini-2.5-flash-lite"]
+
+def test_async_calls_retry_and_fall_back():
+    policy = RequestPolicy(max_retries=0, fallback_models=["gemini-2.5-flash-lite"])
+    call = Flaky(server_error())
+
+    async def acall(model):
+        return call(model)
+
+    result = asyncio.run(acall_with_policy(policy, acall, "gemini-2.5-flash"))
+    assert result.model == "gemini-2.5-flash-lite"
+
+def slow_stream(delays):
+    """Opens streams whose first chunk takes the next delay of `delays`."""
+    def open_stream(model):
+        delay = delays.pop(0)
+        time.sleep(delay)
+        yield f"{model}:{delay}"
+        yield "rest"
+    return open_stream
+
+def test_stream_first_chunk_has_a_deadline():
+    policy = RequestPolicy(timeout=0.2, max_retries=1, backoff_base=0.0)
+    started = time.monotonic()
+    chunks = list(stream_with_policy(policy, slow_stream([1.0, 0.0]), "gemini-2.5-flash"))
+    assert time.monotonic() - started < 0.8
+    assert chunks == [("gemini-2.5-flash:0.0", "gemini-2.5-flash", 1), ("rest", "gemini-2.5-flash", 1)]
+
+    with pytest.raises(RequestTimeout):
+        list(stream_with_policy(RequestPolicy(timeout=0.1, max_retries=0), slow_stream([0.5]), "gemini-2.5-flash"))
+
+def test_async_stream_first_chunk_has_a_deadline():
+    delays = [1.0, 0.0]
+
+    async def open_stream(model):
+        async def chunks():
+            delay = delays.pop(0)
+            await asyncio.sleep(delay)
+            yield f"{model}:{delay}"
+            yield "rest"
+        return chunks()
+
+    async def main(policy):
+        return [chunk async for chunk, _, _ in astream_with_policy(policy, open_stream, "gemini-2.5-flash")]
+
+    started = time.monotonic()
+    assert asyncio.run(main(RequestPolicy(timeout=0.2, max_retries=1, backoff_base=0.0))) == ["gemini-2.5-flash:0.0", "rest"]
+    assert time.monotonic() - started < 0.8
+    delays[:] = [0.5]
+    with pytest.raises(RequestTimeout):
+        asyncio.run(main(RequestPolicy(timeout=0.1, max_retries=0)))
+
+def test_failed_turn_leaves_the_history_unchanged(fake_gemini):
+    consultant = PromptConsultant("fake-key", client=fake_gemini.client(), request_policy=RequestPolicy(timeout=0.3, max_retries=1, backoff_base=0.0))
+    consultant.start_consultation("An idea")
+    history = consultant.chat_session.get_history()
+
+    fake_gemini.error_rate = 1.0
+    assert consultant.chat("Some details").startswith(ERROR_PREFIX)
+    assert fake_gemini.counters["errors"] == 2
+    fake_gemini.error_rate, fake_gemini.latency = 0.0, 1.0
+    started = time.monotonic()
+    assert "".join(consultant.chat_stream("Some details")).startswith(ERROR_PREFIX)
+    assert time.monotonic() - started < 1.0
+    assert consultant.chat_session.get_history() == history
+
+    fake_gemini.latency = 0.0
+    assert consultant.chat("Some details").startswith("word0")
+    assert len(consultant.chat_session.get_history()) == 4
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from src.scheduler import BATCH, QuotaScheduler
+
+# Buckets of one second: 2 requests, refilled at 2 per second
+LIMITS = {"default": {"rpm": 120}}
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "quota.sqlite3")
+
+def scheduler(path, limits=LIMITS, **options):
+    return QuotaScheduler(limits, path=path, burst_seconds=1, output_tokens=0, **options)
+
+def test_schedulers_share_their_buckets(state_path):
+    first, second = scheduler(state_path), scheduler(state_path)
+    assert first.acquire("key", "gemini-2.5-flash") and first.acquire("key", "gemini-2.5-flash")
+    started = time.monotonic()
+    second.acquire("key", "gemini-2.5-flash")
+    assert time.monotonic() - started >= 0.4
+    assert second.stats()["waits"] >= 1 and second.stats()["waited"] >= 0.4
+    assert first.stats() == {"waits": 0, "waited": 0.0}
+    # Other keys and backends have buckets of their own, or none
+    assert first._take(first._ticket("other", "gemini-2.5-flash", 0), time.time()) == 0
+    assert first.acquire("key", "local:qwen") is None
+
+def test_batch_holds_back_while_interactive_call_waits(state_path):
+    limits = {"default": {"rpm": 600, "tpm": 60000}}
+    interactive = scheduler(state_path, limits)
+    batch = scheduler(state_path, limits, priority=BATCH)
+    now = time.time()
+    assert interactive._take(interactive._ticket("key", "gemini-2.5-flash", 700), now) == 0
+    # 300 of 1000 tokens left: the interactive call waits for 600 more
+    wait = interactive._take(interactive._ticket("key", "gemini-2.5-flash", 900), now)
+    assert wait == pytest.approx(0.6)
+    small = batch._ticket("key", "gemini-2.5-flash", 10)
+    # The batch call would fit in the bucket, but gives way until the interactive one is served
+    assert batch._take(small, now) == pytest.approx(0.6)
+    assert batch._take(small, now + 0.7) == 0
+
+def test_batch_leaves_a_reserve(state_path):
+    interactive = scheduler(state_path, {"default": {"rpm": 600}})
+    batch = scheduler(state_path, {"default": {"rpm": 600}}, priority=BATCH, batch_reserve=0.2)
+    ticket = batch._ticket("key", "gemini-2.5-flash", 0)
+    now = time.time()
+    # 10 requests per bucket, 2 reserved to interactive calls
+    assert [batch._take(ticket, now) for _ in range(8)] == [0] * 8
+    assert batch._take(ticket, now) > 0
+    assert interactive._take(interactive._ticket("key", "gemini-2.5-flash", 0), now) == 0
+
+def test_penalize_pauses_every_scheduler(state_path):
+    first, second = scheduler(state_path), scheduler(state_path)
+    ticket = first.acquire("key", "gemini-2.5-flash")
+    first.penalize(ticket, 0.5)
+    first.penalize(None, 10)
+    wait = second._take(second._ticket("key", "gemini-2.5-flash", 0), time.time())
+    assert 0.3 < wait <= 0.5
+    started = time.monotonic()
+    second.acquire("key", "gemini-2.5-flash")
+    assert time.monotonic() - started >= 0.3
+
+def test_waits_are_counted_across_threads(state_path):
+    shared = scheduler(state_path, {"default": {"rpm": 600}})
+    threads = [threading.Thread(target=shared.acquire, args=("key", "gemini-2.5-flash")) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 10 calls fit in the bucket; the others waited at least once
+    assert shared.stats()["waits"] >= 6
@@ -0,0 +1,91 @@
+import pytest
+
+from src.agent import PromptConsultant
+from src.semantic_cache import HashingVectorizer, SemanticCache
+
+# Paraphrases of one idea: the first reply can be shared
+PARAPHRASES = [
+    ("SEO article prompt", "prompt for SEO blog post"),
+    ("SEO article prompt", "prompt for an SEO blog article"),
+    ("customer support chatbot for an e-commerce store", "chatbot for customer support of an online store"),
+    ("translate english to french", "english to french translation"),
+    ("summarize meeting notes", "summary of meeting notes"),
+    ("python code review", "review python code"),
+    ("sort a list in ascending order", "sort list ascending"),
+    ("generate unit tests for python functions", "python unit test generation for functions"),
+    ("prompt per articoli SEO", "scrivi un articolo SEO"),
+]
+# Same words, different idea: the first reply must not be shared
+NEAR_MISSES = [
+    ("translate english to french", "translate french to english"),
+    ("traduci dall'inglese al francese", "traduci dal francese all'inglese"),
+    ("convert celsius to fahrenheit", "convert fahrenheit to celsius"),
+    ("sort a list ascending", "sort a list descending"),
+    ("marketing email with emojis", "marketing email without emojis"),
+    ("formal email to a client", "informal email to a client"),
+    ("encrypt a file", "decrypt a file"),
+    ("SEO article prompt", "SEO keyword research"),
+]
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SemanticCache(path=str(tmp_path), max_entries=16)
+    yield cache
+    cache.close()
+
+@pytest.mark.parametrize("stored, asked", PARAPHRASES)
+def test_paraphrase_hits(cache, stored, asked):
+    cache.put(stored, "scope", "first reply")
+    hit = cache.lookup(asked, "scope")
+    assert hit is not None and hit.reply == "first reply"
+
+@pytest.mark.parametrize("stored, asked", NEAR_MISSES)
+def test_near_miss_misses(cache, stored, asked):
+    cache.put(stored, "scope", "first reply")
+    assert cache.lookup(asked, "scope") is None
+
+def test_threshold_separates_calibration_pairs():
+    vectorizer = HashingVectorizer()
+
+    def similarity(a, b):
+        x, y = vectorizer.embed_sparse(a), vectorizer.embed_sparse(b)
+        return sum(value * y.get(i, 0.0) for i, value in x.items())
+
+    assert min(similarity(a, b) for a, b in PARAPHRASES) >= HashingVectorizer.default_threshold
+    assert max(similarity(a, b) for a, b in NEAR_MISSES) < HashingVectorizer.default_threshold
+
+def test_put_reuses_the_slot_of_the_same_idea(cache):
+    cache.put("python code review", "scope", "old")
+    cache.put("python code review", "scope", "new")
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup("python code review", "scope").reply == "new"
+
+def test_instances_sharing_a_directory_pick_distinct_slots(tmp_path):
+    first = SemanticCache(path=str(tmp_path), max_entries=16)
+    second = SemanticCache(path=str(tmp_path), max_entries=16)
+    try:
+        # `second` hasn't seen the entry stored by `first` when it picks its slot
+        first.put("python code review", "scope", "review")
+        second.put("translate english to french", "scope", "translation")
+        assert first.stats()["entries"] == 2
+        assert first.lookup("review python code", "scope").reply == "review"
+        assert first.lookup("english to french translation", "scope").reply == "translation"
+    finally:
+        first.close()
+        second.close()
+
+def test_consultant_serves_paraphrase_from_cache(fake_gemini, cache):
+    client = fake_gemini.client()
+    first = PromptConsultant("fake-key", client=client, semantic_cache=cache)
+    reply = first.start_consultation("SEO article prompt")
+    assert fake_gemini.counters["generate"] == 1
+
+    paraphrase = PromptConsultant("fake-key", client=client, semantic_cache=cache)
+    assert paraphrase.start_consultation("prompt for SEO blog post") == reply
+    assert fake_gemini.counters["generate"] == 1
+
+    different = PromptConsultant("fake-key", client=client, semantic_cache=cache)
+    different.start_consultation("translate english to french")
+    reversed_direction = PromptConsultant("fake-key", client=client, semantic_cache=cache)
+    reversed_direction.start_consultation("translate french to english")
+    assert fake_gemini.counters["generate"] == 3
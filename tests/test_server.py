@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from src.server import ConsultantServer
+
+async def request(port, method, path, headers=b"", body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: test\r\nConnection: close\r\nContent-Length: {len(body)}\r\n".encode()
+        + headers + b"\r\n" + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload) if payload else None
+
+def run_with_server(fake_gemini, scenario):
+    async def main():
+        server = ConsultantServer("fake-key", "gemini-2.5-flash", consultant_options={"client": fake_gemini.client()}, token="s3cret")
+        addresses = []
+        task = asyncio.create_task(server.serve("127.0.0.1", 0, ready=addresses.extend))
+        while not addresses:
+            await asyncio.sleep(0.01)
+        try:
+            return await scenario(addresses[0][1])
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    return asyncio.run(main())
+
+def test_non_ascii_authorization_header_is_rejected(fake_gemini):
+    async def scenario(port):
+        return [
+            await request(port, "POST", "/sessions", "Authorization: Bearer sécret\r\n".encode("utf-8")),
+            await request(port, "POST", "/sessions", "Authorization: Bearer s3creté\r\n".encode("latin-1")),
+            await request(port, "POST", "/sessions"),
+        ]
+
+    assert [status for status, _ in run_with_server(fake_gemini, scenario)] == [401, 401, 401]
+
+def test_valid_token_opens_a_session(fake_gemini):
+    async def scenario(port):
+        auth = b"Authorization: Bearer s3cret\r\n"
+        status, session = await request(port, "POST", "/sessions", auth, b'{"language": "en"}')
+        assert status == 201
+        return await request(port, "POST", f"/sessions/{session['id']}/messages", auth, b'{"text": "A prompt to write SEO articles"}')
+
+    status, reply = run_with_server(fake_gemini, scenario)
+    assert status == 200 and reply["reply"].startswith("word0")
+    assert fake_gemini.counters["generate"] == 1
@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+from benchmarks.startup import ROOT, import_time
+
+def test_main_imports_no_lazy_module():
+    assert import_time(runs=1)["eager_modules"] == []
+
+def test_help_does_not_load_the_sdk():
+    # typer renders the help with rich's own table and markdown: only the SDK side is checked here
+    code = (
+        "import runpy, sys\n"
+        "sys.argv = ['main.py', '--help']\n"
+        "try:\n    runpy.run_path('main.py', run_name='__main__')\nexcept SystemExit:\n    pass\n"
+        "print([name for name in ('google.genai', 'src.agent') if name in sys.modules])"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert "Usage" in result.stdout
+    assert result.stdout.strip().splitlines()[-1] == "[]"
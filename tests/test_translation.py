@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from src import translation
+from src.translation import TranslationManager, fallback_chain
+
+@pytest.fixture
+def locales(tmp_path, monkeypatch):
+    monkeypatch.setattr(translation, "LOCALES_PATH", str(tmp_path))
+    monkeypatch.setattr(translation, "_files", {})
+    monkeypatch.setattr(translation, "_chains", {})
+
+    def write(language, messages):
+        (tmp_path / f"{language}.json").write_text(json.dumps(messages), encoding="utf-8")
+
+    write("it", {"greeting": "Ciao {name}", "only_it": "solo italiano", "colour": "colore"})
+    write("en", {"greeting": "Hello {name}", "colour": "color", "score": "Score: {value:.1f}"})
+    write("en-GB", {"colour": "colour"})
+    return write
+
+def test_fallback_chain():
+    assert fallback_chain("en_GB") == ["en-GB", "en", "it"]
+    assert fallback_chain("it") == ["it"]
+    assert fallback_chain(None) == ["it"]
+
+def test_missing_keys_fall_back_per_key(locales):
+    t = TranslationManager("en-GB")
+    assert t.get("colour") == "colour"
+    assert t.get("greeting", name="Ada") == "Hello Ada"
+    assert t.get("only_it") == "solo italiano"
+    assert t.get("unknown") == "unknown"
+
+def test_missing_language_uses_its_fallbacks(locales, capsys):
+    t = TranslationManager("fr")
+    assert "Locale file not found for fr" in capsys.readouterr().out
+    assert t.get("greeting", name="Ada") == "Ciao Ada"
+
+def test_templates_and_format_specs(locales):
+    t = TranslationManager("en")
+    assert t.get("score", value=2) == "Score: 2.0"
+    # A missing field leaves the string unformatted instead of raising
+    assert t.get("greeting", other="x") == "Hello {name}"
+
+def test_catalogs_are_shared_and_recompiled_on_change(locales):
+    first, second = TranslationManager("en"), TranslationManager("en")
+    assert first.translations is second.translations
+    locales("en", {"greeting": "Hi there {name}", "colour": "color"})
+    first.load_translations("en")
+    assert first.get("greeting", name="Ada") == "Hi there Ada"
+    assert first.translations is not second.translations
+    assert second.get("greeting", name="Ada") == "Hello Ada"
+
+def test_shipped_locales_have_the_same_keys():
+    with open(f"{translation.LOCALES_PATH}/en.json", encoding="utf-8") as f:
+        english = json.load(f)
+    with open(f"{translation.LOCALES_PATH}/it.json", encoding="utf-8") as f:
+        italian = json.load(f)
+    assert set(english) == set(italian)